@@ -0,0 +1,347 @@
+"""
+Mergeable aggregate statistics
+Aggregates are kept as plain counts plus player sets (a "state") that is persisted per demo and can be
+merged across demos in any order. Frequencies and percentages are only derived at read time, so adding a
+demo to a corpus is an O(new demo) merge instead of a re-extraction of every demo.
+Positions are counted per side ({side: {area: stats}}), and every area remembers its site.
+Position heatmaps are tick counts per grid cell ({side: {site: {buy_type: {cell: ticks}}}}, see heatmaps.py)
+and merge the same way between demos on the same grid (which includes the tickrate), as does the filter cube:
+player-site records counted per (side, site, area, buy type, entry point, player), so any combination of
+filters is a sum over a few cells.
+Team setups are counted per side and fingerprint (see setups.py) with their wins and buy types, so the
+most common setups of a corpus are a sort over the merged counts.
+"""
+
+import os
+import json
+from heatmaps import add_counts, to_sparse, from_sparse
+from shards import demo_id_for
+
+STATE_VERSION = 7
+
+CUBE_DIMENSIONS = ['side', 'site', 'area', 'buy_type', 'entry_point', 'player']
+
+# Most common setups per side in the finalized output
+TOP_SETUPS = 20
+
+def new_state():
+    """Empty aggregate state"""
+    return {
+        'version': STATE_VERSION,
+        'demos': [],
+        'total_rounds': 0,
+        'positions': {},
+        'heatmap_grid': None,
+        'heatmaps': {},
+        'cube': {},
+        'setups': {}
+    }
+
+def _position(state, side, area, site):
+    return state['positions'].setdefault(side, {}).setdefault(area, {
+        'site': site,
+        'total_count': 0,
+        'by_buy_type': {},
+        'entry_points': {},
+        'players': set()
+    })
+
+def _iter_positions(state):
+    """(side, area, stats) of every counted position"""
+    for side, positions in state['positions'].items():
+        for area, stats in positions.items():
+            yield side, area, stats
+
+def state_from_rounds(rounds_data, total_rounds, demo_id):
+    """Build the aggregate state of one demo from its extracted rounds"""
+    state = new_state()
+    state['demos'].append(demo_id)
+    state['total_rounds'] = int(total_rounds)
+    for round_data in rounds_data:
+        add_round(state, round_data)
+    return state
+
+def add_round(state, round_data):
+    """Count one extracted round into a demo's state in place (rounds can be added as they are produced)"""
+    for player in round_data['players']:
+        stats = _position(state, player['side'], player['primary_position'], player['site'])
+        stats['total_count'] += 1
+        stats['by_buy_type'][player['buy_type']] = stats['by_buy_type'].get(player['buy_type'], 0) + 1
+        stats['entry_points'][player['entry_point']] = stats['entry_points'].get(player['entry_point'], 0) + 1
+        stats['players'].add(player['name'])
+        cell = (player['side'], player['site'], player['primary_position'], player['buy_type'], player['entry_point'],
+                player['name'])
+        state['cube'][cell] = state['cube'].get(cell, 0) + 1
+    return state
+
+def _heatmap(state, side, site, buy_type):
+    return state['heatmaps'].setdefault(side, {}).setdefault(site, {}).setdefault(buy_type, {})
+
+def _iter_heatmaps(state):
+    """(side, site, buy_type, {cell: ticks}) of every heatmap"""
+    for side, sites in state['heatmaps'].items():
+        for site, buy_types in sites.items():
+            for buy_type, counts in buy_types.items():
+                yield side, site, buy_type, counts
+
+def _check_grid(state, grid):
+    if state['heatmap_grid'] is None:
+        state['heatmap_grid'] = grid
+    elif grid is not None and grid != state['heatmap_grid']:
+        raise ValueError(f"Heatmap grids differ: {grid} vs {state['heatmap_grid']}")
+
+def add_heatmaps(state, counts, grid):
+    """Add occupancy counts ({(side, site, buy_type): {cell: ticks}}, see heatmaps.py) to a state in place"""
+    _check_grid(state, grid)
+    for (side, site, buy_type), cell_counts in counts.items():
+        add_counts(_heatmap(state, side, site, buy_type), cell_counts)
+    return state
+
+def _setup(state, side, fingerprint, offsets, zones):
+    # Fingerprints are kept as strings, the form they take as JSON object keys
+    return state['setups'].setdefault(side, {}).setdefault(str(fingerprint), {
+        'offsets': list(offsets),
+        'zones': [list(offset_zones) for offset_zones in zones],
+        'rounds': 0,
+        'wins': 0,
+        'decided': 0,
+        'by_buy_type': {}
+    })
+
+def _add_setup_counts(stats, rounds, wins, decided):
+    stats['rounds'] += rounds
+    stats['wins'] += wins
+    stats['decided'] += decided
+
+def add_setups(state, setups, offsets):
+    """Count a setup table (see setups.build_setups) into a state in place; None (no round data) adds nothing"""
+    if setups is None:
+        return state
+    for row in setups.iter_rows(named=True):
+        won = row['won']
+        counts = (1, int(bool(won)), int(won is not None))
+        stats = _setup(state, row['side'], row['fingerprint'], offsets, row['zones'])
+        _add_setup_counts(stats, *counts)
+        by_buy_type = stats['by_buy_type'].setdefault(row['buy_type'] or 'unknown', {'rounds': 0, 'wins': 0, 'decided': 0})
+        _add_setup_counts(by_buy_type, *counts)
+    return state
+
+def merge_states(target, other):
+    """Merge `other` into `target` in place; a demo can only be counted once"""
+    if set(other['demos']) & set(target['demos']):
+        raise ValueError(f"Demos already aggregated: {sorted(set(other['demos']) & set(target['demos']))}")
+    target['demos'].extend(other['demos'])
+    target['total_rounds'] += other['total_rounds']
+    for side, positions in other['positions'].items():
+        for area, stats in positions.items():
+            merged = _position(target, side, area, stats['site'])
+            merged['total_count'] += stats['total_count']
+            for key in ('by_buy_type', 'entry_points'):
+                for name, count in stats[key].items():
+                    merged[key][name] = merged[key].get(name, 0) + count
+            merged['players'] |= set(stats['players'])
+    if other['heatmaps']:
+        _check_grid(target, other['heatmap_grid'])
+    for side, site, buy_type, counts in _iter_heatmaps(other):
+        add_counts(_heatmap(target, side, site, buy_type), counts)
+    add_counts(target['cube'], other['cube'])
+    for side, setups in other['setups'].items():
+        for fingerprint, stats in setups.items():
+            merged = _setup(target, side, fingerprint, stats['offsets'], stats['zones'])
+            _add_setup_counts(merged, stats['rounds'], stats['wins'], stats['decided'])
+            for buy_type, counts in stats['by_buy_type'].items():
+                merged_counts = merged['by_buy_type'].setdefault(buy_type, {'rounds': 0, 'wins': 0, 'decided': 0})
+                _add_setup_counts(merged_counts, counts['rounds'], counts['wins'], counts['decided'])
+    return target
+
+def finalize(state):
+    """Derive the aggregate output (frequencies, by_buy_type percentages, unique players) from a state"""
+    total_rounds = state['total_rounds']
+    aggregate_stats = {
+        'total_rounds': total_rounds,
+        'position_stats': []
+    }
+
+    for side, area, stats in _iter_positions(state):
+        total_count = stats['total_count']
+
+        buy_type_breakdown = {}
+        for buy_type, count in stats['by_buy_type'].items():
+            buy_type_breakdown[buy_type] = {
+                'count': count,
+                'percentage': round(count / total_count, 3) if total_count > 0 else 0
+            }
+
+        aggregate_stats['position_stats'].append({
+            'area': area,
+            'side': side,
+            'site': stats['site'],
+            'overall_frequency': round(total_count / total_rounds, 3) if total_rounds > 0 else 0,
+            'total_occurrences': total_count,
+            'by_buy_type': buy_type_breakdown,
+            'entry_points': dict(stats['entry_points']),
+            'unique_players': len(stats['players'])
+        })
+
+    # Sort by frequency
+    aggregate_stats['position_stats'].sort(key=lambda x: x['overall_frequency'], reverse=True)
+
+    if state['heatmap_grid'] is not None:
+        maps = {}
+        for side, site, buy_type, counts in _iter_heatmaps(state):
+            maps.setdefault(side, {}).setdefault(site, {})[buy_type] = to_sparse(counts)
+        aggregate_stats['heatmaps'] = {'grid': state['heatmap_grid'], 'maps': maps}
+
+    aggregate_stats['cube'] = cube_output(state['cube'])
+    aggregate_stats['setups'] = {side: top_setups(setups) for side, setups in state['setups'].items()}
+
+    return aggregate_stats
+
+def _win_rate(counts):
+    return round(counts['wins'] / counts['decided'], 3) if counts['decided'] > 0 else None
+
+def top_setups(setups, top=TOP_SETUPS):
+    """
+    The most common setups of one side: fingerprint, zones per offset, rounds, share of the side's rounds,
+    win rate (of rounds with a known winner) and the same per buy type
+    """
+    total = sum(stats['rounds'] for stats in setups.values())
+    ranked = sorted(setups.items(), key=lambda item: (-item[1]['rounds'], item[0]))[:top]
+    return [{
+        'fingerprint': int(fingerprint),
+        'offsets': stats['offsets'],
+        'zones': stats['zones'],
+        'rounds': stats['rounds'],
+        'frequency': round(stats['rounds'] / total, 3) if total > 0 else 0,
+        'win_rate': _win_rate(stats),
+        'by_buy_type': {
+            buy_type: {'rounds': counts['rounds'], 'win_rate': _win_rate(counts)}
+            for buy_type, counts in sorted(stats['by_buy_type'].items())
+        }
+    } for fingerprint, stats in ranked]
+
+def cube_output(cube):
+    """
+    Dictionary-encoded sparse cube: the sorted values of every dimension, and one
+    [side, site, area, buy_type, entry_point, player, count] row of value indices per non-empty cell
+    """
+    values = [sorted({str(cell[i]) for cell in cube}) for i in range(len(CUBE_DIMENSIONS))]
+    index = [{value: i for i, value in enumerate(dimension)} for dimension in values]
+    return {
+        'dimensions': CUBE_DIMENSIONS,
+        'values': dict(zip(CUBE_DIMENSIONS, values)),
+        'cells': sorted([*(index[i][str(value)] for i, value in enumerate(cell)), count] for cell, count in cube.items())
+    }
+
+def cube_position_stats(cube, total_rounds, filters=None):
+    """
+    position_stats (as in finalize) of the records matching `filters`, computed from a cube_output cube
+    filters maps dimensions to a value or a list of values; None and 'all' leave a dimension unfiltered
+    """
+    dimensions = cube['dimensions']
+    allowed = {}
+    for dimension, wanted in (filters or {}).items():
+        if wanted is None or wanted == 'all':
+            continue
+        wanted = {wanted} if isinstance(wanted, str) else set(wanted)
+        allowed[dimensions.index(dimension)] = {i for i, value in enumerate(cube['values'][dimension])
+                                                if value in wanted}
+    side, site, area, buy_type, entry_point, player = (dimensions.index(d) for d in CUBE_DIMENSIONS)
+    values = [cube['values'][dimension] for dimension in dimensions]
+
+    positions = {}
+    for cell in cube['cells']:
+        if not all(cell[d] in indices for d, indices in allowed.items()):
+            continue
+        count = cell[-1]
+        key = (values[side][cell[side]], values[area][cell[area]])
+        stats = positions.setdefault(key, {'site': values[site][cell[site]], 'total_count': 0, 'by_buy_type': {},
+                                           'entry_points': {}, 'players': set()})
+        stats['total_count'] += count
+        for field, value in (('by_buy_type', values[buy_type][cell[buy_type]]),
+                             ('entry_points', values[entry_point][cell[entry_point]])):
+            stats[field][value] = stats[field].get(value, 0) + count
+        stats['players'].add(values[player][cell[player]])
+
+    state = new_state()
+    state['total_rounds'] = total_rounds
+    for (side_value, area_value), stats in positions.items():
+        state['positions'].setdefault(side_value, {})[area_value] = stats
+    return finalize(state)['position_stats']
+
+def state_path_for(output_dir, demo_id):
+    """Per-demo state file stored next to the demo's output"""
+    return os.path.join(output_dir, f'{demo_id}.stats.json')
+
+def save_state(state, path):
+    """Persist a state as JSON (player sets are stored as sorted lists); written atomically"""
+    serializable = dict(state)
+    serializable['positions'] = {
+        side: {area: dict(stats, players=sorted(stats['players'])) for area, stats in positions.items()}
+        for side, positions in state['positions'].items()
+    }
+    serializable['heatmaps'] = {}
+    for side, site, buy_type, counts in _iter_heatmaps(state):
+        serializable['heatmaps'].setdefault(side, {}).setdefault(site, {})[buy_type] = to_sparse(counts)
+    serializable['cube'] = [[*cell, count] for cell, count in state['cube'].items()]
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f'{path}.tmp-{os.getpid()}'
+    with open(tmp_path, 'w') as f:
+        json.dump(serializable, f)
+    os.replace(tmp_path, path)
+
+def load_state(path):
+    """Load a persisted state, or an empty one if the file does not exist"""
+    if not os.path.exists(path):
+        return new_state()
+    with open(path) as f:
+        state = json.load(f)
+    if state.get('version') == 1:
+        # Version 1 states only counted CT players in B-Site
+        state['positions'] = {'ct': {area: dict(stats, site='B') for area, stats in state['positions'].items()}}
+        state['version'] = 2
+    if state.get('version') == 2:
+        # Version 2 states have no heatmaps
+        state.update(version=3, heatmap_grid=None, heatmaps={})
+    if state.get('version') == 3:
+        # Version 3 states have no filter cube; their demos only count in the position stats
+        state.update(version=4, cube=[])
+    if state.get('version') == 4:
+        # Version 4 states have no team setups
+        state.update(version=5, setups={})
+    if state.get('version') == 5:
+        # Version 5 states list their demos by file name; demo ids of top-level demos are the file stems
+        state.update(version=6, demos=[demo_id_for(demo) for demo in state['demos']])
+    if state.get('version') == 6:
+        # Version 6 heatmap grids have no tickrate; every demo was counted as 64 tick
+        if state['heatmap_grid'] is not None:
+            state['heatmap_grid']['tickrate'] = 64
+        state['version'] = STATE_VERSION
+    if state.get('version') != STATE_VERSION:
+        raise ValueError(f"Unsupported aggregate state version in {path}: {state.get('version')}")
+    for _, _, stats in _iter_positions(state):
+        stats['players'] = set(stats['players'])
+    for buy_types in (buy_types for sites in state['heatmaps'].values() for buy_types in sites.values()):
+        for buy_type, sparse in buy_types.items():
+            buy_types[buy_type] = from_sparse(sparse)
+    state['cube'] = {tuple(row[:-1]): row[-1] for row in state['cube']}
+    return state
+
+def update_corpus(corpus_path, demo_states):
+    """
+    Merge new per-demo states into the persisted corpus state
+    A demo id already in the corpus raises ValueError (as in merge_states) and leaves the corpus file untouched;
+    re-extracted demos go through rebuild_corpus instead.
+    """
+    corpus = load_state(corpus_path)
+    for state in demo_states:
+        merge_states(corpus, state)
+    save_state(corpus, corpus_path)
+    return corpus
+
+def rebuild_corpus(state_paths):
+    """Merge persisted per-demo states from scratch (e.g. after a demo was re-extracted or removed)"""
+    corpus = new_state()
+    for path in state_paths:
+        merge_states(corpus, load_state(path))
+    return corpus
@@ -0,0 +1,260 @@
+"""
+CS2 Demo Analysis - Batch Extraction
+Parses and extracts a whole set of demos (a directory, glob or list of .dem files) across a process pool.
+Writes one sharded result and one fact table partition per demo (see shards.py, facts.py) plus a merged aggregate;
+a failing demo is reported without aborting the batch.
+Demos already in the corpus aggregate state are skipped, so adding a demo only extracts that demo.
+
+Usage:
+    python analysis/batch.py Notebooks_Demos/demos --workers 8 --output-dir web_app/public/data
+    python analysis/batch.py "tournament/**/*.dem" --workers 32
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+def _glob_root(pattern):
+    """Directory part of a glob pattern before its first wildcard"""
+    wildcard = min(pattern.find(c) for c in '*?[' if c in pattern)
+    return os.path.dirname(pattern[:wildcard]) or '.'
+
+def find_demo_paths(inputs):
+    """
+    Expand directories, glob patterns and file paths into sorted (demo path, demo id) pairs
+    A demo's id is its path relative to the directory (or the fixed part of the glob pattern) it was found under,
+    so demos with the same file name in different folders stay apart. Ids are not checked for clashes (see find_demos).
+    """
+    from shards import demo_id_for
+
+    demos = {}
+    for item in inputs:
+        if os.path.isdir(item):
+            root, paths = item, glob.glob(os.path.join(item, '**', '*.dem'), recursive=True)
+        elif glob.has_magic(item):
+            root, paths = _glob_root(item), [p for p in glob.glob(item, recursive=True) if p.endswith('.dem')]
+        elif os.path.isfile(item):
+            root, paths = None, [item]
+        else:
+            continue
+        for path in paths:
+            demos.setdefault(os.path.abspath(path), demo_id_for(path, root))
+    return sorted(demos.items())
+
+def demo_id_clashes(demos):
+    """{demo id: sorted paths} of the ids that more than one of the (demo path, demo id) pairs would get"""
+    paths_by_id = {}
+    for path, demo_id in demos:
+        paths_by_id.setdefault(demo_id, []).append(path)
+    return {demo_id: sorted(paths) for demo_id, paths in paths_by_id.items() if len(paths) > 1}
+
+def find_demos(inputs):
+    """Sorted (demo path, demo id) pairs of find_demo_paths; two demos with the same id are an error"""
+    demos = find_demo_paths(inputs)
+    clashes = demo_id_clashes(demos)
+    if clashes:
+        demo_id, paths = next(iter(clashes.items()))
+        raise ValueError(f"{' and '.join(paths)} would all get the demo id '{demo_id}'; rename all but one of them")
+    return demos
+
+def process_demo(demo_path, output_dir, cache_dir, lean=False, binary_journeys=False, report=False, profiler=None,
+                 stream=False, sites=None, sides=None, journey_tolerance=None, round_workers=None, demo_id=None):
+    """
+    Parse and extract one demo in a worker process; returns a small summary for the parent
+    demo_id names its output and its place in the corpus (default: the file stem, see find_demos)
+    """
+    # Imported here so the parent process never loads the extraction stack
+    from demo_cache import load_demo
+    from extract_data import PLAYER_PROPS, analyze_demo, required_player_props
+    from aggregates import save_state, state_path_for
+    from shards import ShardWriter, write_sharded_output, demo_id_for
+    from facts import write_fact_table
+    from instrumentation import Instrumentation
+
+    start = time.perf_counter()
+    instr = Instrumentation(enabled=report or profiler is not None, profiler=profiler)
+    instr.start_profiler()
+    player_props = required_player_props() if lean else PLAYER_PROPS
+    with instr.span('parse'):
+        dem = load_demo(demo_path, player_props, cache_dir, instr)
+    demo_id = demo_id or demo_id_for(demo_path)
+    # Streaming writes each round shard as soon as the round is done
+    writer = ShardWriter(output_dir, demo_id, binary_journeys) if stream else None
+    output_data, aggregate_state = analyze_demo(dem, demo_path, lean=lean, instr=instr, stream=stream, writer=writer,
+                                                sites=sites, sides=sides, journey_tolerance=journey_tolerance,
+                                                round_workers=round_workers, demo_id=demo_id)
+
+    with instr.span('write') as span:
+        if writer is not None:
+            index_entry = writer.finish(output_data['metadata'], output_data['aggregate'])
+        else:
+            index_entry = write_sharded_output(output_data, output_dir, demo_id, binary_journeys)
+        save_state(aggregate_state, state_path_for(output_dir, demo_id))
+        write_fact_table(output_data['facts'], output_dir, demo_id, demo_path, output_data['metadata']['map'])
+        span.rows = len(output_data['rounds'])
+    if instr.enabled:
+        instr.write_report(os.path.join(output_dir, f'{demo_id}.run.json'), metadata={
+            'demo_file': os.path.basename(demo_path),
+            'lean': lean,
+            'stream': stream,
+            'sites': sites,
+            'sides': sides,
+            'journey_tolerance': journey_tolerance,
+            'round_workers': round_workers,
+            'player_props': player_props,
+            'worker_pid': os.getpid()
+        })
+
+    return {
+        'demo': demo_path,
+        'demo_id': demo_id,
+        'index_entry': index_entry,
+        'total_rounds': int(output_data['metadata']['total_rounds']),
+        'aggregate_state': aggregate_state,
+        'seconds': round(time.perf_counter() - start, 2)
+    }
+
+def run_batch(demos, output_dir, cache_dir, workers, lean=False, binary_journeys=False, report=False, profiler=None,
+              stream=False, sites=None, sides=None, journey_tolerance=None, round_workers=None):
+    """Process (demo path, demo id) pairs on a process pool, printing progress as each one finishes"""
+    # Give every worker its own slice of the machine instead of N full-size Polars thread pools
+    os.environ['POLARS_MAX_THREADS'] = str(max(1, (os.cpu_count() or 1) // workers))
+
+    results, failures = [], []
+    # Spawned (not forked) workers: forking after Polars has started its thread pool can deadlock
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        futures = {executor.submit(process_demo, demo, output_dir, cache_dir, lean, binary_journeys, report, profiler,
+                                   stream, sites, sides, journey_tolerance, round_workers, demo_id): (demo, demo_id)
+                   for demo, demo_id in demos}
+        for done, future in enumerate(as_completed(futures), start=1):
+            demo, demo_id = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                failures.append({'demo': demo, 'error': f"{type(e).__name__}: {e}"})
+                print(f"[{done}/{len(demos)}] ❌ {demo_id}: {type(e).__name__}: {e}")
+                continue
+            results.append(result)
+            print(f"[{done}/{len(demos)}] ✅ {demo_id}: {result['total_rounds']} rounds in {result['seconds']}s")
+
+    # Merge in input order so the corpus does not depend on completion order
+    order = {demo: i for i, (demo, _) in enumerate(demos)}
+    results.sort(key=lambda r: order[r['demo']])
+    return results, failures
+
+def corpus_state_paths(output_dir, corpus_path):
+    """Every per-demo state file in an output directory (not the corpus state itself)"""
+    return [p for p in sorted(glob.glob(os.path.join(output_dir, '*.stats.json')))
+            if os.path.abspath(p) != os.path.abspath(corpus_path)]
+
+def add_extraction_arguments(parser):
+    """Extraction options shared by the batch and ingestion command lines (see extraction_options)"""
+    parser.add_argument('--lean', action='store_true',
+                        help="parse only the props the pipeline needs and prune ticks to alive in-round rows")
+    parser.add_argument('--binary-journeys', action='store_true',
+                        help="write journey points as columnar binary files instead of JSON")
+    parser.add_argument('--stream', action='store_true',
+                        help="read and process tick data one round at a time to bound memory on long demos")
+    parser.add_argument('--round-workers', type=int,
+                        help="threads processing streamed rounds side by side (default: the Polars thread count)")
+    parser.add_argument('--sites', nargs='+', help="sites to extract (default: B); e.g. --sites A B Mid")
+    parser.add_argument('--sides', nargs='+', choices=['ct', 't'], help="sides to extract (default: ct)")
+    parser.add_argument('--journey-tolerance', type=float,
+                        help="simplify journeys to within this many world units of every tick (keeps zone changes) "
+                             "instead of keeping every 32nd tick")
+    parser.add_argument('--report', action='store_true',
+                        help="write a JSON run report (stage timings, rows, memory) per demo as <demo_id>.run.json")
+    parser.add_argument('--profiler', choices=['cprofile', 'pyinstrument'],
+                        help="profile each demo and save the profile next to its run report")
+
+def extraction_options(args):
+    """process_demo keyword arguments from parsed extraction arguments"""
+    return {
+        'lean': args.lean,
+        'binary_journeys': args.binary_journeys,
+        'report': args.report,
+        'profiler': args.profiler,
+        'stream': args.stream,
+        'sites': args.sites,
+        'sides': args.sides,
+        'journey_tolerance': args.journey_tolerance,
+        'round_workers': args.round_workers
+    }
+
+def write_aggregate(corpus, failures, output_dir):
+    """Write the merged aggregate (derived from the corpus state) for the front end"""
+    from aggregates import finalize
+
+    aggregate = finalize(corpus)
+    aggregate['demos'] = list(corpus['demos'])
+    aggregate['failed'] = [{'demo_file': os.path.basename(f['demo']), 'error': f['error']} for f in failures]
+
+    aggregate_path = os.path.join(output_dir, 'aggregate.json')
+    os.makedirs(output_dir, exist_ok=True)
+    tmp_path = f'{aggregate_path}.tmp-{os.getpid()}'
+    with open(tmp_path, 'w') as f:
+        json.dump(aggregate, f, indent=2)
+    os.replace(tmp_path, aggregate_path)
+    return aggregate_path
+
+def main(argv=None):
+    from demo_cache import CACHE_DIR
+    from aggregates import load_state, save_state, update_corpus, rebuild_corpus
+    from shards import update_index
+
+    parser = argparse.ArgumentParser(description="Extract B-Site data from many demos in parallel")
+    parser.add_argument('inputs', nargs='+', help=".dem files, directories or glob patterns")
+    parser.add_argument('--output-dir', default=os.path.join('web_app', 'public', 'data'),
+                        help="directory for index.json, per-demo shards and aggregate.json")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help="parsed-demo Parquet cache directory")
+    add_extraction_arguments(parser)
+    parser.add_argument('--corpus', help="corpus aggregate state (default: <output-dir>/corpus.stats.json)")
+    parser.add_argument('--force', action='store_true', help="re-extract demos already in the corpus")
+    args = parser.parse_args(argv)
+    corpus_path = args.corpus or os.path.join(args.output_dir, 'corpus.stats.json')
+
+    try:
+        demos = find_demos(args.inputs)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    if not demos:
+        print("No .dem files found")
+        return 1
+
+    known = set(load_state(corpus_path)['demos'])
+    if not args.force:
+        skipped = [d for d in demos if d[1] in known]
+        demos = [d for d in demos if d[1] not in known]
+        if skipped:
+            print(f"Skipping {len(skipped)} demos already in {corpus_path}")
+
+    start = time.perf_counter()
+    results, failures = [], []
+    if demos:
+        workers = max(1, min(args.workers, len(demos)))
+        print(f"Processing {len(demos)} demos with {workers} workers...")
+        results, failures = run_batch(demos, args.output_dir, args.cache_dir, workers, **extraction_options(args))
+
+    if known & {r['demo_id'] for r in results}:
+        # Re-extracted demos replace their old counts, so rebuild the corpus from every per-demo state
+        corpus = rebuild_corpus(corpus_state_paths(args.output_dir, corpus_path))
+        save_state(corpus, corpus_path)
+    else:
+        corpus = update_corpus(corpus_path, [r['aggregate_state'] for r in results])
+    update_index(args.output_dir, [r['index_entry'] for r in results])
+    aggregate_path = write_aggregate(corpus, failures, args.output_dir)
+
+    print(f"\n✅ Batch complete in {time.perf_counter() - start:.1f}s: {len(results)} succeeded, {len(failures)} failed")
+    print(f"💾 Merged aggregate saved to: {aggregate_path}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+"""
+CS2 Demo Analysis - Benchmark
+Times every stage of the extraction on a seeded synthetic demo (see synthetic.py) and reports
+seconds, throughput (items/sec, where items are what the stage processes: ticks, player-rounds, journey
+points, ...) and resident memory per stage, plus the peak RSS of the run. Each run is appended to a JSON results file
+and compared with the previous run of the same configuration, so regressions show up run to run.
+
+Usage:
+    python analysis/benchmark.py
+    python analysis/benchmark.py --rounds 24 --overtime 2 --players 10 --tickrate 128 --repeat 3
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+from datetime import datetime, timezone
+from contextlib import redirect_stdout
+from instrumentation import peak_rss_mb, current_rss_mb
+
+RESULTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_results.json')
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+class StageTimer:
+    """Collects wall time, call count and processed rows per stage"""
+
+    def __init__(self, total_ticks):
+        self.total_ticks = total_ticks
+        self.stages = {}
+
+    def run(self, name, fn, items=None):
+        """
+        Run fn() once as stage `name`; `items` is what the stage processed (defaults to ticks), or a function
+        of the stage's result when only the result tells
+        """
+        start_rss = current_rss_mb()
+        start = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            calls, result = fn()
+        seconds = time.perf_counter() - start
+        rss = current_rss_mb()
+        if callable(items):
+            items = items(result)
+        items = items if items is not None else self.total_ticks
+        self.stages[name] = {
+            'seconds': round(seconds, 6),
+            'calls': calls,
+            'items': items,
+            'items_per_sec': round(items / seconds) if seconds > 0 else None,
+            'rss_mb': rss,
+            'rss_change_mb': round(rss - start_rss, 1) if rss is not None and start_rss is not None else None
+        }
+        return result
+
+def run_stages(dem):
+    """Time each extraction stage the way analyze_demo drives it; returns {stage: stats}"""
+    import polars as pl
+    from extract_data import (analyze_demo, analyze_player_journey, build_grenade_events, build_journeys,
+                              build_site_journeys, classify_b_site_position, classify_buy_type, classify_buy_types, extract_grenade_throws,
+                              extract_player_equipment_at_round_start, extract_round_start_equipment,
+                              find_b_site_players, demo_tickrate, B_SITE_BOUNDS, DUST2_ZONES)
+    from transitions import build_zone_transitions, site_visits, rotation_events
+    from heatmaps import occupancy_counts
+    from aggregates import state_from_rounds, finalize
+
+    ticks_df = dem.ticks
+    total_rounds = ticks_df['round_num'].max()
+    tickrate = demo_tickrate(dem)
+    ct_ticks = ticks_df.filter((pl.col('team_num') == 3) & (pl.col('health') > 0))
+    timer = StageTimer(len(ticks_df))
+
+    def scan():
+        players = {}
+        for round_num in range(1, total_rounds + 1):
+            players[round_num] = find_b_site_players(ct_ticks.filter(pl.col('round_num') == round_num))
+        return total_rounds, players
+    b_site_players = timer.run('b_site_scan', scan, items=len(ct_ticks))
+    pairs = [(round_num, name) for round_num, names in b_site_players.items() for name in sorted(names)]
+
+    def equipment():
+        for round_num, name in pairs:
+            extract_player_equipment_at_round_start(ticks_df, round_num, name, dem.rounds, dem.buys)
+        return len(pairs), None
+    timer.run('equipment', equipment, items=len(pairs))
+    equipment_table = timer.run('equipment_batched',
+                                lambda: (1, extract_round_start_equipment(ticks_df, dem.rounds, dem.buys)),
+                                items=len(pairs))
+
+    def buy_types():
+        for row in equipment_table.iter_rows(named=True):
+            classify_buy_type(row['round_num'], total_rounds, row['equipment_value'], row['primary_weapon'],
+                              row['money'], row['armor_value'], row['has_helmet'])
+        return len(equipment_table), None
+    timer.run('buy_type', buy_types, items=len(equipment_table))
+    timer.run('buy_type_batched', lambda: (1, classify_buy_types(equipment_table, total_rounds)),
+              items=len(equipment_table))
+
+    def journeys():
+        for round_num, name in pairs:
+            analyze_player_journey(ct_ticks, round_num, name)
+        return len(pairs), None
+    timer.run('journey', journeys, items=len(pairs))
+    timer.run('journey_batched', lambda: (1, build_journeys(ct_ticks)), items=len(pairs))
+    timer.run('journey_simplified', lambda: (1, build_site_journeys(ct_ticks, ['B'], tolerance=16)),
+              items=lambda simplified: sum(len(journey) for journey in simplified.values()))
+    transitions = timer.run('transitions', lambda: (1, build_zone_transitions(ct_ticks, DUST2_ZONES)),
+                            items=len(ct_ticks))
+    timer.run('transition_stats',
+              lambda: (1, (site_visits(transitions, DUST2_ZONES, tickrate=tickrate),
+                           rotation_events(transitions, tickrate))),
+              items=len(transitions))
+
+    equipment_types = classify_buy_types(equipment_table, total_rounds)
+    sided_ticks = ct_ticks.with_columns(_side=pl.lit('ct'))
+    timer.run('heatmaps', lambda: (1, occupancy_counts(sided_ticks, equipment_types, DUST2_ZONES, ['B'])),
+              items=len(sided_ticks))
+
+    def grenades():
+        for round_num, name in pairs:
+            extract_grenade_throws(dem.grenades, round_num, name)
+        return len(pairs), None
+    timer.run('grenades', grenades, items=len(pairs))
+    timer.run('grenades_batched', lambda: (1, build_grenade_events(dem.grenades)), items=len(pairs))
+
+    in_b_site = ct_ticks.filter(
+        pl.col('X').is_between(B_SITE_BOUNDS['min_x'], B_SITE_BOUNDS['max_x']) &
+        pl.col('Y').is_between(B_SITE_BOUNDS['min_y'], B_SITE_BOUNDS['max_y'])
+    )
+    def classify():
+        for x, y in zip(in_b_site['X'].to_list(), in_b_site['Y'].to_list()):
+            classify_b_site_position(x, y)
+        return len(in_b_site), None
+    timer.run('classify_position', classify, items=len(in_b_site))
+
+    output_data, _ = timer.run('pipeline', lambda: (1, analyze_demo(dem, 'synthetic.dem', lean=False)))
+
+    def aggregate():
+        return 1, finalize(state_from_rounds(output_data['rounds'], total_rounds, 'synthetic.dem'))
+    timer.run('aggregation', aggregate, items=sum(len(r['players']) for r in output_data['rounds']))
+
+    return timer.stages
+
+def best_of(runs):
+    """Per-stage fastest run, so one noisy repetition does not look like a regression"""
+    stages = {}
+    for run in runs:
+        for name, stats in run.items():
+            if name not in stages or stats['seconds'] < stages[name]['seconds']:
+                stages[name] = dict(stats)
+    for name in stages:
+        stages[name]['rss_mb'] = max(run[name]['rss_mb'] or 0 for run in runs) or None
+    return stages
+
+def load_results(path):
+    if not os.path.exists(path):
+        return {'runs': []}
+    with open(path) as f:
+        return json.load(f)
+
+def previous_run(results, params):
+    """Most recent earlier run with the same benchmark configuration"""
+    for run in reversed(results['runs']):
+        if run['params'] == params:
+            return run
+    return None
+
+def print_report(record, previous):
+    print(f"\n{'stage':<18} {'seconds':>9} {'items':>9} {'items/sec':>12} {'RSS MB':>9} {'RSS change':>11}  vs previous")
+    for name, stats in record['stages'].items():
+        change = ''
+        if previous and name in previous['stages'] and previous['stages'][name]['seconds'] > 0:
+            delta = stats['seconds'] / previous['stages'][name]['seconds'] - 1
+            change = f"{delta:+.1%}" + ('  ⚠️' if delta > 0.1 else '')
+        print(f"{name:<18} {stats['seconds']:>9.3f} {stats['items']:>9,} {stats['items_per_sec'] or 0:>12,} "
+              f"{stats['rss_mb'] or 0:>9} {stats['rss_change_mb'] or 0.0:>+11.1f}  {change}")
+    print(f"\nPeak RSS of the run: {record['peak_rss_mb'] or '?'} MB")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the extraction stages on a synthetic demo")
+    parser.add_argument('--rounds', type=int, default=24, help="regulation rounds (MR12, at most 24)")
+    parser.add_argument('--overtime', type=int, default=0, help="overtime periods of 6 rounds")
+    parser.add_argument('--players', type=int, default=10)
+    parser.add_argument('--tickrate', type=int, default=64)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=1, help="run every stage N times and keep the fastest")
+    parser.add_argument('--output', default=RESULTS_PATH, help="JSON file the run is appended to")
+    args = parser.parse_args(argv)
+
+    from synthetic import generate_demo
+
+    params = {'rounds': args.rounds, 'overtime': args.overtime, 'players': args.players,
+              'tickrate': args.tickrate, 'seed': args.seed}
+    start = time.perf_counter()
+    dem = generate_demo(**params)
+    print(f"Generated {len(dem.ticks):,} ticks over {dem.ticks['round_num'].max()} rounds "
+          f"in {time.perf_counter() - start:.1f}s")
+
+    stages = best_of([run_stages(dem) for _ in range(args.repeat)])
+
+    import polars as pl
+    record = {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'params': params,
+        'repeat': args.repeat,
+        'total_ticks': len(dem.ticks),
+        'environment': {'python': platform.python_version(), 'polars': pl.__version__,
+                        'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'stages': stages,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+    results = load_results(args.output)
+    print_report(record, previous_run(results, params))
+    results['runs'].append(record)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n💾 Results appended to: {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
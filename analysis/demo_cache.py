@@ -0,0 +1,127 @@
+"""
+Parsed-demo Parquet cache
+Stores the tables of a parsed demo (ticks, rounds, buys, grenades) plus header info as Parquet,
+keyed by the demo content hash, the requested player props and the awpy version.
+A cache hit never imports awpy and only reads the tables (and columns) that are actually used.
+"""
+
+import os
+import json
+import shutil
+import hashlib
+from importlib import metadata
+import polars as pl
+from instrumentation import NULL_INSTRUMENTATION
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.demo_cache')
+
+# Tables persisted from the parsed awpy Demo
+TABLES = ['ticks', 'rounds', 'buys', 'grenades']
+
+def demo_hash(demo_path, chunk_size=1 << 20):
+    """SHA-256 of the demo file contents"""
+    digest = hashlib.sha256()
+    with open(demo_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def awpy_version():
+    """Installed awpy version, read from package metadata so awpy itself is not imported"""
+    try:
+        return metadata.version('awpy')
+    except metadata.PackageNotFoundError:
+        return 'unknown'
+
+def cache_key(demo_path, player_props):
+    """Key of a parse: demo contents + requested player props + awpy version"""
+    key = {
+        'demo': demo_hash(demo_path),
+        'player_props': sorted(player_props or []),
+        'awpy': awpy_version()
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()[:24]
+
+class CachedDemo:
+    """
+    Parsed demo loaded back from the cache
+    Tables behave like the awpy Demo attributes (dem.ticks, dem.rounds, ...) but are only read
+    from disk on first access; scan() gives a LazyFrame for column projection / predicate pushdown
+    """
+
+    def __init__(self, entry_dir):
+        self.entry_dir = entry_dir
+        with open(os.path.join(entry_dir, 'meta.json')) as f:
+            meta = json.load(f)
+        self.header = meta.get('header')
+        self.tables = meta['tables']
+        self._loaded = {}
+
+    def table_path(self, table):
+        return os.path.join(self.entry_dir, f'{table}.parquet')
+
+    def scan(self, table, columns=None):
+        """Lazily scan a cached table, optionally projecting to the given columns"""
+        lf = pl.scan_parquet(self.table_path(table))
+        if columns is not None:
+            lf = lf.select(columns)
+        return lf
+
+    def __getattr__(self, name):
+        # Only called for missing attributes, so unknown tables raise AttributeError (hasattr() is False)
+        if name.startswith('_') or name not in self.tables:
+            raise AttributeError(name)
+        if name not in self._loaded:
+            self._loaded[name] = self.scan(name).collect()
+        return self._loaded[name]
+
+def write_cache(dem, entry_dir, meta=None):
+    """Persist the tables of a parsed awpy Demo; the entry only appears once fully written"""
+    tmp_dir = f'{entry_dir}.tmp-{os.getpid()}'
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    tables = []
+    for table in TABLES:
+        df = getattr(dem, table, None)
+        if isinstance(df, pl.DataFrame):
+            df.write_parquet(os.path.join(tmp_dir, f'{table}.parquet'))
+            tables.append(table)
+
+    meta = dict(meta or {})
+    meta['tables'] = tables
+    meta['header'] = getattr(dem, 'header', None)
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2, default=str)
+
+    try:
+        os.replace(tmp_dir, entry_dir)
+    except OSError:
+        # Another run published the same entry first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+def load_demo(demo_path, player_props, cache_dir=CACHE_DIR, instr=NULL_INSTRUMENTATION):
+    """
+    Return the parsed demo, from the cache when possible
+    On a miss the demo is parsed with awpy and written to the cache for the next run; whether the cache
+    was hit is kept as the 'demo_cache' note of the run
+    """
+    key = cache_key(demo_path, player_props)
+    entry_dir = os.path.join(cache_dir, key)
+    hit = os.path.exists(os.path.join(entry_dir, 'meta.json'))
+    instr.note('demo_cache', {'hit': hit, 'entry': entry_dir})
+    if hit:
+        return CachedDemo(entry_dir)
+
+    from awpy import Demo
+    dem = Demo(demo_path)
+    dem.parse(player_props=player_props)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    write_cache(dem, entry_dir, meta={
+        'demo_file': os.path.basename(demo_path),
+        'player_props': sorted(player_props or []),
+        'awpy_version': awpy_version()
+    })
+    # Hand back the cached copy so awpy's in-memory tables can be released and only
+    # the tables/columns the pipeline asks for are loaded
+    return CachedDemo(entry_dir)
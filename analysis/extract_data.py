@@ -10,23 +10,80 @@ Extracts comprehensive round-by-round data including:
 """
 
 import os
-import json
-from collections import defaultdict
-from awpy import Demo
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import polars as pl
+from zones import load_zone_map
+from demo_cache import load_demo, CACHE_DIR
+from transitions import build_zone_transitions, site_visits, rotation_events, coordinate_columns, TICKRATE
+from heatmaps import occupancy_counts, heatmap_grid, HEATMAP_CELLS
+from setups import build_setups, SETUP_OFFSETS
+from aggregates import state_from_rounds, add_round, add_heatmaps, add_setups, finalize, save_state, state_path_for
+from shards import ShardWriter, write_sharded_output, update_index, demo_id_for
+from facts import fact_rows, write_fact_table
+from instrumentation import Instrumentation, NULL_INSTRUMENTATION
 
 # Configuration
 DEMO_PATH = r"c:\Users\alexr\OneDrive\Documents\GitHub\CSDemoAnalyzer\Notebooks_Demos\demos\g2-vs-spirit-m3-dust2.dem"
-OUTPUT_PATH = r"c:\Users\alexr\OneDrive\Documents\GitHub\CSDemoAnalyzer\web_app\public\data.json"
+OUTPUT_DIR = r"c:\Users\alexr\OneDrive\Documents\GitHub\CSDemoAnalyzer\web_app\public\data"
 
-# B-Site area boundaries (verified for de_dust2)
-B_SITE_BOUNDS = {
-    'min_x': -2264,
-    'max_x': -963,
-    'min_y': -72,
-    'max_y': 1738
+# Write a JSON run report (stage timings, rows, memory) next to the output; optionally profile the run
+RUN_REPORT = False
+PROFILER = None  # 'cprofile' or 'pyinstrument'
+
+# Read and process tick data one round at a time, writing each round as soon as it is done;
+# peak memory then follows one round instead of the whole match (long overtime demos, 128 tick)
+STREAM_ROUNDS = False
+
+# Threads that load and process streamed rounds side by side (results are still merged in round order);
+# None uses one per Polars thread (POLARS_MAX_THREADS, which batch.py divides between its worker processes)
+ROUND_WORKERS = None
+
+# Journey points: every 32nd alive tick (None), or error-bounded simplification of every tick that keeps
+# each zone change and stays within this many world units of the full-resolution path (e.g. 16)
+JOURNEY_TOLERANCE = None
+
+# Count radar-aligned position heatmaps (heatmaps.HEATMAP_CELLS cells per side) from every alive tick
+COUNT_HEATMAPS = True
+
+# Write journey points as columnar binary (rounds/<n>.journeys.bin) instead of JSON objects
+BINARY_JOURNEYS = False
+
+# Player props requested from awpy (part of the parse cache key)
+PLAYER_PROPS = ["health", "armor_value", "pitch", "yaw", "cash", "money", "total_money", "active_weapon", "weapon"]
+
+# Lean extraction: parse only the props the enabled stages need and prune ticks at load time
+LEAN_EXTRACTION = False
+PIPELINE_STAGES = ['journey', 'equipment', 'grenades']
+
+# What each pipeline stage reads from the parsed demo
+STAGE_REQUIREMENTS = {
+    'journey': {'player_props': ['health'], 'tables': ['ticks']},
+    'equipment': {'player_props': ['health', 'armor_value', 'has_helmet', 'balance', 'active_weapon_name'],
+                  'tables': ['ticks', 'rounds', 'buys']},
+    'grenades': {'player_props': [], 'tables': ['grenades']},
 }
 
+# Tick columns awpy always provides that the pipeline reads
+TICK_BASE_COLUMNS = ['tick', 'round_num', 'name', 'steamid', 'side', 'team_num', 'X', 'Y', 'Z']
+
+# Callout zones and site bounds for the map (analysis/maps/de_dust2.json)
+DUST2_ZONES = load_zone_map('de_dust2')
+
+# B-Site area boundaries (verified for de_dust2)
+B_SITE_BOUNDS = DUST2_ZONES.site_bounds('B')
+# B-Site zones on their own, so the A and Mid zones never show up in B-Site classification
+B_SITE_ZONES = DUST2_ZONES.site_map('B')
+
+# Sites (from the zone config) and sides extracted in the single pass over the ticks;
+# e.g. ['A', 'B', 'Mid'] and ['ct', 't'] for every player everywhere
+EXTRACT_SITES = ['B']
+EXTRACT_SIDES = ['ct']
+
+# Values awpy uses for each side in side/team columns (compared as lowercase text)
+SIDE_VALUES = {'ct': ['ct', 'counter-terrorist', '3'], 't': ['t', 'terrorist', '2']}
+
 # Equipment value thresholds for buy classification
 BUY_THRESHOLDS = {
     'pistol': 800,      # First round of each half
@@ -50,6 +107,37 @@ WEAPON_PRICES = {
     'usp_silencer': 200, 'hkp2000': 200, 'glock': 200, 'elite': 300
 }
 
+# Weapon catalog: name -> class and price, one row per weapon (unpriced weapons cost 0)
+WEAPON_CLASSES = {}
+for weapon_class, weapons in [('pistol', PISTOLS), ('smg', SMGS), ('rifle', RIFLES), ('heavy', HEAVY)]:
+    for weapon in weapons:
+        WEAPON_CLASSES.setdefault(weapon, weapon_class)
+WEAPON_CATALOG = pl.DataFrame({
+    'weapon': list(WEAPON_CLASSES),
+    'weapon_class': list(WEAPON_CLASSES.values()),
+    'price': [WEAPON_PRICES.get(weapon, 0) for weapon in WEAPON_CLASSES]
+})
+
+PRIMARY_WEAPON_TYPES = ['rifle', 'heavy', 'smg']
+
+# Round-start equipment: player state is read from the first ~5 seconds after freeze end (at 64 tick)
+EQUIPMENT_WINDOW_TICKS = 320
+EQUIPMENT_FIELDS = ['primary_weapon', 'armor_value', 'has_helmet', 'equipment_value', 'health', 'money']
+
+# Candidate column names (awpy versions differ), probed in this order
+ROUND_START_COLUMNS = ['freeze_end', 'start', 'start_tick']
+BUY_WEAPON_COLUMNS = ['weapon', 'item', 'weapon_name', 'item_name', 'equipment']
+BUY_MONEY_COLUMNS = ['money_before', 'cash', 'money', 'total_money', 'cash_before']
+ECONOMY_MONEY_COLUMNS = ['cash', 'money', 'total_money']
+TICK_WEAPON_COLUMNS = ['active_weapon', 'weapon', 'weapon_name', 'weapon_primary', 'primary_weapon', 'current_weapon']
+TICK_MONEY_COLUMNS = ['cash', 'money', 'total_money', 'balance']
+GRENADE_SIDE_COLUMNS = ['thrower_side', 'side', 'thrower_team']
+GRENADE_THROWER_COLUMNS = ['thrower_name', 'thrower']
+GRENADE_ENTITY_COLUMNS = ['entity_id', 'grenade_entity_id']
+
+# Points kept from each grenade's flight path in the output (0 = landing position only)
+GRENADE_PATH_POINTS = 0
+
 def is_in_b_site_area(x, y):
     """Check if coordinates are within the broad B-Site area"""
     return (B_SITE_BOUNDS['min_x'] <= x <= B_SITE_BOUNDS['max_x'] and 
@@ -57,53 +145,29 @@ def is_in_b_site_area(x, y):
 
 def classify_b_site_position(x, y):
     """Classifies the specific position within B-Site based on coordinates."""
-    # Back site Tucked (most specific first)
-    if -1573 <= x <= -1496 and 1213 <= y <= 1331:
-        return "Back site Tucked"
-    # Single Barrel
-    elif -1951 <= x <= -1843 and 1272 <= y <= 1409:
-        return "Single Barrel"
-    # Double Barrels
-    elif -1974 <= x <= -1847 and 1105 <= y <= 1253:
-        return "Double Barrels"
-    # Window
-    elif -1538 <= x <= -1388 and 1076 <= y <= 1213:
-        return "Window"
-    # Default
-    elif -1592 <= x <= -1484 and 860 <= y <= 1051:
-        return "Default"
-    # Big Box B Site
-    elif -1982 <= x <= -1816 and 885 <= y <= 1081:
-        return "Big Box B Site"
-    # Back Plat
-    elif -2179 <= x <= -1955 and 1385 <= y <= 1718:
-        return "Back Plat"
-    # Doors
-    elif -1511 <= x <= -1337 and 468 <= y <= 752:
-        return "Doors"
-    # Car B-Site
-    elif -1820 <= x <= -1492 and -23 <= y <= 399:
-        return "Car B-Site"
-    # Tunnel Exit
-    elif -2113 <= x <= -1990 and -243 <= y <= 193:
-        return "Tunnel Exit"
-    # Top Car Box
-    elif -1940 <= x <= -1870 and 188 <= y <= 267:
-        return "Top Car Box"
-    # Close Left
-    elif -2217 <= x <= -2113 and 183 <= y <= 301:
-        return "Close Left"
-    # Second Cubby
-    elif -2248 <= x <= -2175 and 502 <= y <= 620:
-        return "Second Cubby"
-    # General B-Site (less specific)
-    elif -1820 <= x <= -1488 and 934 <= y <= 1400:
-        return "B-Site General"
-    # Whole B-Site (broadest)
-    elif is_in_b_site_area(x, y):
-        return "B-Site Area"
-    
-    return "Not in B-Site"
+    return B_SITE_ZONES.classify_point(x, y)
+
+def b_site_area_expr(x_col='X', y_col='Y'):
+    """Polars expression equivalent of is_in_b_site_area over whole columns"""
+    return (pl.col(x_col).is_between(B_SITE_BOUNDS['min_x'], B_SITE_BOUNDS['max_x']) &
+            pl.col(y_col).is_between(B_SITE_BOUNDS['min_y'], B_SITE_BOUNDS['max_y']))
+
+def side_expr(col):
+    """'ct' / 't' (null for anything else) from a side or team column holding text or team numbers"""
+    value = pl.col(col).cast(pl.String).str.to_lowercase()
+    return (
+        pl.when(value.is_in(SIDE_VALUES['ct'])).then(pl.lit('ct'))
+        .when(value.is_in(SIDE_VALUES['t'])).then(pl.lit('t'))
+    )
+
+def find_b_site_players(round_ticks):
+    """Names of the players with at least one tick inside the broad B-Site area"""
+    b_site_players = set()
+    for row in round_ticks.iter_rows(named=True):
+        x, y = row['X'], row['Y']
+        if is_in_b_site_area(x, y):
+            b_site_players.add(row['name'])
+    return b_site_players
 
 def get_weapon_type(weapon_name):
     """Classify weapon type"""
@@ -111,14 +175,8 @@ def get_weapon_type(weapon_name):
         return 'none'
     weapon_name = weapon_name.lower().replace('weapon_', '')
     
-    if weapon_name in PISTOLS:
-        return 'pistol'
-    elif weapon_name in SMGS:
-        return 'smg'
-    elif weapon_name in RIFLES:
-        return 'rifle'
-    elif weapon_name in HEAVY:
-        return 'heavy'
+    if weapon_name in WEAPON_CLASSES:
+        return WEAPON_CLASSES[weapon_name]
     elif weapon_name == 'knife' or 'knife' in weapon_name:
         return 'knife'
     return 'other'
@@ -239,455 +297,740 @@ def classify_buy_type(round_num, total_rounds, equipment_value, primary_weapon,
             return 'light_buy'
         return 'eco'
 
-def extract_player_equipment_at_round_start(ticks_df, round_num, player_name, rounds_df=None, buys_df=None, economy_df=None):
-    """Extract equipment information for a player at round start (first few seconds)"""
-    # Try to get round start tick from rounds dataframe if available
-    round_start_tick = None
-    if rounds_df is not None and len(rounds_df) > 0:
-        round_data = rounds_df.filter(pl.col('round_num') == round_num)
-        if len(round_data) > 0:
-            round_row = round_data.row(0, named=True)
-            # Try different column names for round start tick
-            round_start_tick = round_row.get('freeze_end', round_row.get('start', round_row.get('start_tick', None)))
-    
-    # Try to get weapon and money from buys dataframe first (most accurate)
-    weapon_from_buys = None
-    money_from_buys = None
-    if buys_df is not None and len(buys_df) > 0:
-        player_buys = buys_df.filter(
-            (pl.col('round_num') == round_num) &
-            (pl.col('player_name') == player_name)
-        )
-        if len(player_buys) > 0:
-            # Get all buys for this player in this round
-            for buy_row in player_buys.iter_rows(named=True):
-                # Get weapon from buy - try multiple column names
-                weapon = None
-                for col in ['weapon', 'item', 'weapon_name', 'item_name', 'equipment']:
-                    if col in buy_row:
-                        val = buy_row[col]
-                        if val and val != 'None' and str(val).lower() != 'none':
-                            weapon = str(val)
-                            break
-                
-                if weapon:
-                    # Prefer primary weapons over pistols/utilities
-                    weapon_type = get_weapon_type(weapon)
-                    if weapon_type in ['rifle', 'heavy', 'smg']:
-                        weapon_from_buys = weapon
-                        break
-                    elif weapon_from_buys is None:  # Fallback to any weapon
-                        weapon_from_buys = weapon
-                
-                # Get money before buy (if available)
-                if money_from_buys is None:
-                    for money_col in ['money_before', 'cash', 'money', 'total_money', 'cash_before']:
-                        if money_col in buy_row:
-                            money_from_buys = buy_row[money_col]
-                            if money_from_buys is not None:
-                                break
-    
-    # Try economy dataframe
-    money_from_economy = None
-    if economy_df is not None and len(economy_df) > 0:
-        player_economy = economy_df.filter(
-            (pl.col('round_num') == round_num) &
-            (pl.col('player_name') == player_name)
+def _missing_weapon(weapon):
+    """Mirrors `not weapon_name or weapon_name == 'None'` on a String expression"""
+    return weapon.is_null() | (weapon == '') | (weapon == 'None')
+
+def _catalog_lookup(weapon, field, default):
+    name = weapon.str.to_lowercase().str.replace_all('weapon_', '', literal=True)
+    return name.replace_strict(WEAPON_CATALOG['weapon'], WEAPON_CATALOG[field], default=default)
+
+def weapon_type_expr(col):
+    """Columnar get_weapon_type: weapon class from the catalog, 'knife', 'other' or 'none'"""
+    weapon = pl.col(col).cast(pl.String)
+    weapon_class = _catalog_lookup(weapon, 'weapon_class', None)
+    return (
+        pl.when(_missing_weapon(weapon)).then(pl.lit('none'))
+        .when(weapon_class.is_not_null()).then(weapon_class)
+        .when(weapon.str.to_lowercase().str.contains('knife', literal=True)).then(pl.lit('knife'))
+        .otherwise(pl.lit('other'))
+    )
+
+def weapon_price_expr(col):
+    """Columnar get_weapon_price"""
+    weapon = pl.col(col).cast(pl.String)
+    return pl.when(_missing_weapon(weapon)).then(0).otherwise(_catalog_lookup(weapon, 'price', 0))
+
+def entity_id_expr(col):
+    """True where a weapon value is an entity ID (a number above 1,000,000) rather than a name"""
+    value = pl.col(col).cast(pl.String).cast(pl.Float64, strict=False)
+    # NaN sorts above every number in polars, but float('nan') > 1000000 is False in Python
+    return ((value > 1000000) & value.is_not_nan()).fill_null(False)
+
+def equipment_value_expr(weapon_col, armor_col, helmet_col):
+    """Columnar calculate_equipment_value (without grenades)"""
+    armor = pl.col(armor_col).fill_null(0)
+    helmet = pl.col(helmet_col).fill_null(False)
+    weapon_value = (
+        pl.when(_missing_weapon(pl.col(weapon_col).cast(pl.String))).then(0)
+        # Unresolved entity ID - estimate from armor (a full armor + helmet buy usually means a rifle)
+        .when(entity_id_expr(weapon_col)).then(
+            pl.when((armor > 0) & helmet).then(3000).when(armor > 0).then(1500).otherwise(0)
         )
-        if len(player_economy) > 0:
-            econ_row = player_economy.row(0, named=True)
-            money_from_economy = econ_row.get('cash', econ_row.get('money', econ_row.get('total_money', None)))
-    
-    # Get round ticks for this player
-    round_ticks = ticks_df.filter(
-        (pl.col('round_num') == round_num) &
-        (pl.col('name') == player_name)
-    ).sort('tick')
-    
-    if len(round_ticks) == 0:
-        return None
+        .otherwise(weapon_price_expr(weapon_col))
+    )
+    armor_value = pl.when(armor > 0).then(pl.when(helmet).then(650).otherwise(500)).otherwise(0)
+    return weapon_value + armor_value
+
+def buy_type_expr(total_rounds, round_col='round_num', value_col='equipment_value', weapon_col='primary_weapon',
+                  money_col='money', armor_col='armor_value', helmet_col='has_helmet'):
+    """Columnar classify_buy_type: the same rules as one when/then chain over every player-round"""
+    half_break = 16 if total_rounds <= 24 else 13
+    round_num = pl.col(round_col)
+    value = pl.col(value_col)
+    money = pl.col(money_col)
+    weapon_type = weapon_type_expr(weapon_col)
+    armored = pl.col(armor_col).fill_null(0) > 0
+    full_armor = armored & pl.col(helmet_col).fill_null(False)
+    full_buy, light_buy, eco = pl.lit('full_buy'), pl.lit('light_buy'), pl.lit('eco')
     
-    # If we have round start tick, use ticks after that (within first 5 seconds)
-    if round_start_tick:
-        # Get ticks within first 5 seconds of round start (~320 ticks at 64 tickrate)
-        start_window = round_ticks.filter(
-            (pl.col('tick') >= round_start_tick) &
-            (pl.col('tick') <= round_start_tick + 320)
+    with_money = (
+        pl.when((value >= BUY_THRESHOLDS['full_buy']) & (money >= 5000)).then(full_buy)
+        .when(weapon_type.is_in(['rifle', 'heavy']) & (money >= 5000)).then(full_buy)
+        .when(full_armor & (value >= 2000) & (money >= 4000)).then(full_buy)
+        .when((weapon_type == 'smg') & (money >= 3000) & (money < 5000)).then(light_buy)
+        .when((value >= 2000) & (value < BUY_THRESHOLDS['full_buy']) & (money >= 2000) & (money < 5000)).then(light_buy)
+        .when((money < 3000) | (weapon_type == 'pistol') | (value < BUY_THRESHOLDS['eco'])).then(eco)
+        .when(value >= BUY_THRESHOLDS['full_buy']).then(full_buy)
+        .otherwise(light_buy)
+    )
+    without_money = (
+        pl.when(full_armor & (value >= 2000)).then(
+            pl.when(value >= BUY_THRESHOLDS['full_buy']).then(full_buy).otherwise(light_buy)
         )
-        if len(start_window) > 0:
-            round_ticks = start_window
-    
-    # Get first tick where player is alive (round start)
-    first_alive_tick = round_ticks.filter(pl.col('health') > 0)
-    if len(first_alive_tick) == 0:
-        # If no alive ticks, use first tick anyway
-        first_alive_tick = round_ticks.head(1)
-    
-    if len(first_alive_tick) == 0:
-        return None
-    
-    row = first_alive_tick.row(0, named=True)
-    
+        .when((value < BUY_THRESHOLDS['eco']) | (weapon_type == 'pistol')).then(eco)
+        .when((weapon_type == 'smg') & (value < BUY_THRESHOLDS['light_buy'])).then(light_buy)
+        .when((value >= BUY_THRESHOLDS['full_buy']) | weapon_type.is_in(['rifle', 'heavy'])).then(full_buy)
+        .when(armored & (value >= 1000) & (value < BUY_THRESHOLDS['full_buy'])).then(light_buy)
+        .otherwise(eco)
+    )
+    return (
+        pl.when((round_num == 1) | (round_num == half_break)).then(pl.lit('pistol'))
+        .when(money.is_not_null()).then(with_money)
+        .otherwise(without_money)
+    )
+
+def classify_buy_types(equipment_table, total_rounds):
+    """Label every player-round of an equipment table with its buy type"""
+    return equipment_table.with_columns(buy_type=buy_type_expr(total_rounds))
+
+def build_weapon_id_map(ticks_df, id_col='active_weapon', name_col='active_weapon_name'):
+    """
+    Entity ID -> weapon name map of a demo, from ticks where both the active weapon ID and its name
+    are known (the most frequent name wins if an ID was reused)
+    """
+    columns = ticks_df.collect_schema().names()
+    if id_col not in columns or name_col not in columns:
+        return {}
+    pairs = (
+        ticks_df.lazy()
+        .select(pl.col(id_col).cast(pl.String).alias('id'), pl.col(name_col).cast(pl.String).alias('weapon'))
+        .filter(entity_id_expr('id') & ~_missing_weapon(pl.col('weapon')))
+        .group_by('id', 'weapon').len()
+        .sort(['id', 'len', 'weapon'], descending=[False, True, False])
+        .unique('id', keep='first', maintain_order=True)
+        .collect()
+    )
+    return dict(zip(pairs['id'].to_list(), pairs['weapon'].to_list()))
+
+def _first_present(columns, candidates):
+    """First candidate column that exists (mirrors chained dict.get lookups)"""
+    return next((col for col in candidates if col in columns), None)
+
+def _is_entity_id(value):
+    """Large numeric values in weapon columns are entity IDs, not weapon names"""
+    try:
+        return float(str(value)) > 1000000
+    except ValueError:
+        return False
+
+def _buy_weapon_expr(col, dtype):
+    """The buy column as a weapon name when it holds a usable value (not null/empty/'none'), else null"""
+    if dtype == pl.Boolean:
+        return pl.when(pl.col(col)).then(pl.lit('True'))
+    if dtype.is_numeric():
+        return pl.when(pl.col(col) != 0).then(pl.col(col).cast(pl.String))
+    value = pl.col(col).cast(pl.String)
+    return pl.when((value != '') & (value.str.to_lowercase() != 'none')).then(value)
+
+def _round_start_buys(buys_df, keys_schema):
+    """
+    Weapon and money per (round, player) from the buys table
+    The first rifle/heavy/SMG bought wins, else the first weapon; money comes from the first row
+    with a value before that primary buy
+    """
+    weapon_cols = [col for col in BUY_WEAPON_COLUMNS if col in buys_df.columns]
+    money_cols = [col for col in BUY_MONEY_COLUMNS if col in buys_df.columns]
+    buys = buys_df.select(
+        pl.col('round_num').cast(keys_schema['round_num']),
+        pl.col('player_name').cast(pl.String).alias('name'),
+        (pl.coalesce([_buy_weapon_expr(col, buys_df.schema[col]) for col in weapon_cols])
+         if weapon_cols else pl.lit(None, dtype=pl.String)).alias('_weapon'),
+        (pl.coalesce([pl.col(col) for col in money_cols]) if money_cols else pl.lit(None)).alias('_money')
+    )
+    keys = ['round_num', 'name']
+    return (
+        buys.lazy()
+        .with_columns(_primary=weapon_type_expr('_weapon').is_in(PRIMARY_WEAPON_TYPES))
+        .with_columns(_before_primary=pl.col('_primary').cast(pl.Int32).cum_sum().over(keys) == 0)
+        .group_by(keys, maintain_order=True)
+        .agg(
+            _weapon_from_buys=pl.coalesce(pl.col('_weapon').filter('_primary').first(),
+                                          pl.col('_weapon').drop_nulls().first()),
+            _money_from_buys=pl.col('_money').filter('_before_primary').drop_nulls().first()
+        )
+        .collect()
+    )
+
+def _round_start_economy(economy_df, keys_schema):
+    """Money per (round, player) from the first economy row"""
+    money_col = _first_present(economy_df.columns, ECONOMY_MONEY_COLUMNS)
+    return (
+        economy_df.unique(['round_num', 'player_name'], keep='first', maintain_order=True)
+        .select(
+            pl.col('round_num').cast(keys_schema['round_num']),
+            pl.col('player_name').cast(pl.String).alias('name'),
+            (pl.col(money_col) if money_col else pl.lit(None)).alias('_money_from_economy')
+        )
+    )
+
+def _equipment_from_row(row, weapon_from_buys, money_from_buys, money_from_economy, columns, weapon_ids):
+    """
+    Equipment of one player from their round-start tick row plus what the buys/economy tables said
+    (the equipment value is added for the whole table by equipment_value_expr)
+    """
     # Get weapons - prefer buys dataframe, then try ticks
-    primary = weapon_from_buys  # Use weapon from buys if available
+    primary = weapon_from_buys
     
     if not primary or primary == 'None':
-        # Try to get from ticks dataframe
-        # Note: active_weapon might be an entity ID (numeric), not a name
-        weapon_cols = ['active_weapon', 'weapon', 'weapon_name', 'weapon_primary', 'primary_weapon', 'current_weapon']
-        for col in weapon_cols:
-            if col in row:
-                val = row[col]
-                if val and val != 'None':
-                    val_str = str(val)
-                    # Check if it's a numeric ID (entity ID) - these are usually large numbers
-                    # Weapon names are strings, IDs are numbers
-                    try:
-                        val_float = float(val_str)
-                        # If it's a very large number, it's likely an entity ID, skip it
-                        if val_float > 1000000:
-                            continue
-                    except:
-                        pass
-                    
-                    if val_str.lower() != 'none':
-                        primary = val_str
-                        break
+        # Note: active_weapon might be an entity ID (numeric), not a name; known IDs are resolved to names
+        for col in columns['tick_weapon']:
+            val = row[col]
+            if val and val != 'None':
+                val_str = str(val)
+                if _is_entity_id(val_str):
+                    if val_str not in weapon_ids:
+                        continue
+                    val_str = weapon_ids[val_str]
+                if val_str.lower() != 'none':
+                    primary = val_str
+                    break
         
-        # If still no weapon, check if there's inventory data
+        # If still no weapon, check any other weapon column
         if not primary or primary == 'None':
-            # Check for inventory columns
-            for col in row.keys():
-                if 'weapon' in col.lower():
-                    val = row[col]
-                    if val and str(val).lower() != 'none':
-                        try:
-                            # Skip if it's a large numeric ID
-                            val_float = float(str(val))
-                            if val_float > 1000000:
-                                continue
-                        except:
-                            pass
-                        primary = str(val)
-                        break
+            for col in columns['weapon_like']:
+                val = row[col]
+                if val and str(val).lower() != 'none':
+                    if _is_entity_id(val):
+                        if str(val) not in weapon_ids:
+                            continue
+                        val = weapon_ids[str(val)]
+                    primary = str(val)
+                    break
     
     if not primary:
         primary = 'None'
     
-    # Get armor - try multiple column names
     # awpy uses 'armor' column which contains armor value (0-100)
-    armor_value = row.get('armor', row.get('armor_value', 0))
-    if armor_value is None:
-        armor_value = 0
+    armor_value = row[columns['armor']] if columns['armor'] else 0
     armor_value = int(armor_value) if armor_value else 0
     
     # Get helmet status - in CS2, armor > 100 means helmet, or check has_helmet column
     has_helmet = False
-    if 'has_helmet' in row:
-        has_helmet = bool(row['has_helmet'])
-    elif 'helmet' in row:
-        has_helmet = bool(row['helmet'])
+    if columns['helmet']:
+        has_helmet = bool(row[columns['helmet']])
     # In CS2, armor value > 100 typically indicates helmet (100 = kevlar, >100 = kevlar+helmet)
     elif armor_value > 100:
         has_helmet = True
         armor_value = 100  # Normalize to 100 for kevlar+helmet
-    elif armor_value == 100:
-        # Could be either, but if it's exactly 100, assume no helmet for safety
-        has_helmet = False
-    
-    # Get money if available - try multiple sources
-    money = money_from_buys or money_from_economy  # From buys/economy dataframe first
-    if money is None:
-        # Try from ticks
-        money = row.get('cash', row.get('money', row.get('total_money', None)))
     
-    # Calculate accurate equipment value
-    equipment_value = calculate_equipment_value(primary, armor_value, has_helmet)
+    # Get money - from buys/economy dataframe first, then from ticks
+    money = money_from_buys or money_from_economy
+    if money is None and columns['tick_money']:
+        money = row[columns['tick_money']]
     
     return {
-        'primary_weapon': primary if primary else 'None',
+        'primary_weapon': primary,
         'armor_value': armor_value,
-        'has_helmet': bool(has_helmet),
-        'equipment_value': equipment_value,
+        'has_helmet': has_helmet,
         'health': row.get('health', 100),
         'money': money
     }
 
+def extract_round_start_equipment(ticks_df, rounds_df=None, buys_df=None, economy_df=None, weapon_ids=None):
+    """
+    Equipment of every player at the start of every round, as one table
+    (round_num, name, primary_weapon, armor_value, has_helmet, equipment_value, health, money)
+    Uses each player's first alive tick in the first ~5 seconds after freeze end, found with one join
+    and a grouped pick; buys/economy are aggregated per (round, player) once and joined on.
+    Weapon entity IDs are resolved with weapon_ids (built from the ticks when not given)
+    """
+    if weapon_ids is None:
+        weapon_ids = build_weapon_id_map(ticks_df)
+    keys = ['round_num', 'name']
+    keys_schema = {'round_num': ticks_df.schema['round_num'], 'name': pl.String}
+    
+    # Round start windows from the rounds dataframe
+    ticks_lf = ticks_df.lazy().select(keys + ['tick', 'health']).with_row_index('_row')
+    start_col = _first_present(rounds_df.columns, ROUND_START_COLUMNS) if rounds_df is not None else None
+    if start_col is not None:
+        starts = (
+            rounds_df.lazy()
+            .unique('round_num', keep='first', maintain_order=True)
+            .select(pl.col('round_num').cast(keys_schema['round_num']), pl.col(start_col).alias('_start'))
+        )
+        ticks_lf = ticks_lf.join(starts, on='round_num', how='left')
+        in_window = (
+            pl.col('_start').is_not_null() & (pl.col('_start') != 0) &
+            pl.col('tick').is_between(pl.col('_start'), pl.col('_start') + EQUIPMENT_WINDOW_TICKS)
+        ).fill_null(False)
+    else:
+        in_window = pl.lit(False)
+    
+    # Ticks in the start window when the player has any there, else all of the player's round ticks;
+    # then the first alive tick, or the first tick if the player was never alive
+    picked_rows = (
+        ticks_lf
+        .with_columns(_in_window=in_window)
+        .filter(pl.col('_in_window') | ~pl.col('_in_window').any().over(keys))
+        .group_by(keys)
+        .agg(pl.col('_row').sort_by(~(pl.col('health') > 0).fill_null(False), pl.col('tick')).first())
+        .collect()['_row']
+        .sort()
+    )
+    picked = ticks_df[picked_rows]
+    
+    # Weapon/money from the buys and economy tables, per (round, player)
+    extras = picked.select(pl.col('round_num'), pl.col('name').cast(pl.String))
+    if buys_df is not None and len(buys_df) > 0:
+        extras = extras.join(_round_start_buys(buys_df, keys_schema), on=keys, how='left', maintain_order='left')
+    if economy_df is not None and len(economy_df) > 0:
+        extras = extras.join(_round_start_economy(economy_df, keys_schema), on=keys, how='left', maintain_order='left')
+    
+    # Column names are resolved once for the whole table
+    columns = {
+        'tick_weapon': [col for col in TICK_WEAPON_COLUMNS if col in picked.columns],
+        'weapon_like': [col for col in picked.columns if 'weapon' in col.lower()],
+        'armor': _first_present(picked.columns, ['armor', 'armor_value']),
+        'helmet': _first_present(picked.columns, ['has_helmet', 'helmet']),
+        'tick_money': _first_present(picked.columns, TICK_MONEY_COLUMNS)
+    }
+    
+    row_fields = [field for field in EQUIPMENT_FIELDS if field != 'equipment_value']
+    equipment = {key: [] for key in keys + row_fields}
+    for row, extra in zip(picked.iter_rows(named=True), extras.iter_rows(named=True)):
+        result = _equipment_from_row(
+            row,
+            extra.get('_weapon_from_buys'),
+            extra.get('_money_from_buys'),
+            extra.get('_money_from_economy'),
+            columns,
+            weapon_ids
+        )
+        equipment['round_num'].append(extra['round_num'])
+        equipment['name'].append(extra['name'])
+        for field in row_fields:
+            equipment[field].append(result[field])
+    return (
+        pl.DataFrame(equipment, schema_overrides={'primary_weapon': pl.String, 'armor_value': pl.Int64,
+                                                  'has_helmet': pl.Boolean}, strict=False)
+        .with_columns(equipment_value=equipment_value_expr('primary_weapon', 'armor_value', 'has_helmet'))
+        .select(keys + EQUIPMENT_FIELDS)
+    )
+
+def extract_player_equipment_at_round_start(ticks_df, round_num, player_name, rounds_df=None, buys_df=None, economy_df=None):
+    """Extract equipment information for a player at round start (first few seconds)"""
+    player_ticks = ticks_df.filter(
+        (pl.col('round_num') == round_num) &
+        (pl.col('name') == player_name)
+    )
+    table = extract_round_start_equipment(player_ticks, rounds_df, buys_df, economy_df)
+    if len(table) == 0:
+        return None
+    row = table.row(0, named=True)
+    return {field: row[field] for field in EQUIPMENT_FIELDS}
+
+def simplify_paths(x, y, keyframes, tolerance):
+    """
+    Ramer-Douglas-Peucker simplification of many concatenated paths at once
+    keyframes marks points that are always kept (at least the first and last point of every path).
+    Each pass splits every segment between kept points at its farthest point while that point deviates
+    more than `tolerance` from the segment; points of segments already within tolerance drop out, so a
+    pass is a few array operations over the points still in play. Returns the boolean mask of kept points
+    """
+    keep = keyframes.copy()
+    active = np.flatnonzero(~keep)
+    while len(active):
+        kept = np.flatnonzero(keep)
+        # Segment of every active point: the kept point before it to the next kept point
+        segment = np.searchsorted(kept, active) - 1
+        start, end = kept[segment], kept[segment + 1]
+        dx, dy = x[end] - x[start], y[end] - y[start]
+        length2 = dx * dx + dy * dy
+        px, py = x[active] - x[start], y[active] - y[start]
+        t = np.clip((px * dx + py * dy) / np.where(length2 > 0, length2, 1), 0, 1)
+        deviation = np.hypot(px - t * dx, py - t * dy)
+        # Active points are in index order, so each segment's points are one contiguous run
+        bounds = np.flatnonzero(np.concatenate(([True], segment[1:] != segment[:-1])))
+        worst = np.repeat(np.maximum.reduceat(deviation, bounds), np.diff(np.append(bounds, len(active))))
+        split = worst > tolerance
+        farthest = np.flatnonzero(split & (deviation == worst))
+        # One point per segment, in case of equal deviations
+        farthest = farthest[np.unique(segment[farthest], return_index=True)[1]]
+        keep[active[farthest]] = True
+        split[farthest] = False
+        active = active[split]
+    return keep
+
+def build_site_journeys(ticks_df, sites=None, sample_rate=32, tolerance=None):
+    """
+    Build the journeys of every player in every round through every site in one pass
+    Alive ticks are classified once against the map's zones, and each point goes to the journey of the site
+    whose bounds contain it. Points are every `sample_rate`-th alive tick, or with a `tolerance` (world units)
+    the ticks kept by simplify_paths: the first and last tick of every stay in a site and of every zone,
+    plus whatever keeps the path within tolerance of every tick.
+    Returns {(round_num, player_name, side, site): journey points}
+    (side is read from a '_side' column when the ticks have one, else None)
+    """
+    if sites is None:
+        sites = EXTRACT_SITES
+    x_col, y_col, z_col = coordinate_columns(ticks_df.columns)
+    player_round = ['round_num', 'name']
+    side = pl.col('_side') if '_side' in ticks_df.columns else pl.lit(None, dtype=pl.String)
+    
+    points = (
+        ticks_df.lazy()
+        .filter(pl.col('health') > 0)
+        .select(player_round + [side.alias('_side'), 'tick', x_col, y_col, z_col])
+        .sort(player_round + ['tick'])
+    )
+    if tolerance is None:
+        # Sample every N alive ticks of each player's round to reduce data size
+        points = points.filter(pl.int_range(pl.len()).over(player_round) % sample_rate == 0)
+    points = (
+        points.with_row_index('_row')
+        # Validate coordinates are reasonable (not 0,0,0)
+        .filter(~((pl.col(x_col) == 0) & (pl.col(y_col) == 0) & (pl.col(z_col) == 0)))
+        .collect()
+    )
+    x, y = points[x_col].to_numpy(), points[y_col].to_numpy()
+    site_codes = DUST2_ZONES.site_codes(x, y)
+    keep = np.isin(site_codes, [list(DUST2_ZONES.sites).index(site) + 1 for site in sites])
+    points = points.filter(pl.Series(keep)).with_columns(_site=pl.Series(site_codes[keep]))
+    codes = DUST2_ZONES.codes(x[keep], y[keep])
+    
+    if tolerance is not None:
+        # Each journey's ticks must be contiguous for the simplification: a stable sort by
+        # (player round, site) keeps the tick order within every journey
+        player_round_id = points.select(pl.struct(player_round).rle_id()).to_series().to_numpy().astype(np.int64)
+        site = points['_site'].to_numpy()
+        order = np.argsort(player_round_id * (len(DUST2_ZONES.sites) + 1) + site, kind='stable')
+        points, codes, site = points[order], codes[order], site[order]
+        row = points['_row'].to_numpy()
+        # Stays start where the previous tick of the journey is not the player's previous tick
+        new_stay = np.ones(len(points), dtype=bool)
+        new_stay[1:] = (row[1:] != row[:-1] + 1) | (site[1:] != site[:-1])
+        zone_change = new_stay.copy()
+        zone_change[1:] |= codes[1:] != codes[:-1]
+        # Keep both sides of every boundary: the first and the last tick of every stay and every zone
+        keyframes = zone_change | np.roll(zone_change, -1)
+        simplified = simplify_paths(points[x_col].to_numpy(), points[y_col].to_numpy(), keyframes, tolerance)
+        points, codes = points.filter(pl.Series(simplified)), codes[simplified]
+    
+    site_names = [None] + list(DUST2_ZONES.sites)
+    rows = points.select(player_round + ['_side', 'tick', x_col, y_col, z_col, '_site']).iter_rows()
+    journeys = defaultdict(list)
+    for (round_num, name, side, tick, x, y, z, site_code), code in zip(rows, codes):
+        site = site_names[site_code]
+        key = (round_num, name, side, site)
+        # The first point of a player's journey through a site is where they entered it
+        is_entry = key not in journeys
+        journeys[key].append({
+            'tick': int(tick),
+            'time': round(tick / 64.0, 2),  # Convert to seconds (assuming 64 tick)
+            'x': round(float(x), 1),
+            'y': round(float(y), 1),
+            'z': round(float(z), 1),
+            'area': DUST2_ZONES.labels[code],
+            'is_entry': is_entry
+        })
+    
+    return dict(journeys)
+
+def build_journeys(ticks_df, sample_rate=32):
+    """
+    Build the B-Site journeys of every player in every round in one pass
+    Returns {(round_num, player_name): journey points} for all players with at least one point
+    """
+    return {
+        (round_num, name): journey
+        for (round_num, name, _, _), journey in build_site_journeys(ticks_df, ['B'], sample_rate).items()
+    }
+
 def analyze_player_journey(ticks_df, round_num, player_name, sample_rate=32):
     """
     Analyze a player's journey through B-Site for a specific round
     Returns journey points with timestamps and areas
     Uses proper awpy coordinate system (X, Y, Z)
     """
-    # Get all ticks for this player in this round where they're alive
     player_round_ticks = ticks_df.filter(
         (pl.col('round_num') == round_num) &
-        (pl.col('name') == player_name) &
-        (pl.col('health') > 0)
-    ).sort('tick')
-    
-    if len(player_round_ticks) == 0:
-        return []
+        (pl.col('name') == player_name)
+    )
+    return build_journeys(player_round_ticks, sample_rate).get((round_num, player_name), [])
+
+def build_grenade_events(grenades_df, path_points=GRENADE_PATH_POINTS, sites=None, sides=None):
+    """
+    Collapse the grenade trajectories of a demo into one event per throw, in one pass
+    awpy's grenades table has one row per tick of flight; rows are grouped by (round, thrower, entity)
+    into {tick, time, type, land_tick, land_time, x, y, z, area} with the landing position, plus a
+    downsampled flight 'path' of up to path_points [x, y] points when path_points > 0.
+    Only throws of the given sides that land in one of the given sites are kept.
+    Returns {(round_num, thrower_name, site): events in throw order}
+    """
+    if sites is None:
+        sites = EXTRACT_SITES
+    if sides is None:
+        sides = EXTRACT_SIDES
+    if grenades_df is None or len(grenades_df) == 0:
+        return {}
     
-    # Sample every N ticks to reduce data size
-    all_ticks = player_round_ticks['tick'].to_list()
-    sampled_ticks = [all_ticks[i] for i in range(0, len(all_ticks), sample_rate)]
+    columns = grenades_df.columns
+    side_col = _first_present(columns, GRENADE_SIDE_COLUMNS)
+    thrower_col = _first_present(columns, GRENADE_THROWER_COLUMNS)
+    if side_col is None or thrower_col is None:
+        return {}
+    x_col, y_col, z_col = coordinate_columns(columns)
+    # Without entity IDs every row has to stand for its own throw
+    entity_col = _first_present(columns, GRENADE_ENTITY_COLUMNS)
+    entity = pl.col(entity_col) if entity_col else pl.int_range(pl.len())
     
-    journey = []
-    in_b_site = False
-    first_b_site_tick = None
+    landing = [pl.col(col).sort_by('tick').last().alias(f'_{col}') for col in (x_col, y_col, z_col)]
+    path = [pl.col(col).sort_by('tick').alias(f'_{col}_path') for col in (x_col, y_col)] if path_points > 0 else []
+    events = (
+        grenades_df.lazy()
+        .filter(side_expr(side_col).is_in(sides))
+        .with_columns(pl.col(thrower_col).cast(pl.String).alias('_thrower'), entity.alias('_entity'))
+        .group_by('round_num', '_thrower', '_entity')
+        .agg(
+            pl.col('tick').min().alias('_throw_tick'),
+            pl.col('tick').max().alias('_land_tick'),
+            pl.col('grenade_type').sort_by('tick').first().alias('_type'),
+            *landing,
+            *path
+        )
+        .sort('round_num', '_thrower', '_throw_tick')
+        .collect()
+    )
+    x, y = events[f'_{x_col}'].to_numpy(), events[f'_{y_col}'].to_numpy()
+    landing_sites = DUST2_ZONES.site_of(x, y)
+    areas = DUST2_ZONES.classify(x, y)
     
-    for tick in sampled_ticks:
-        tick_data = player_round_ticks.filter(pl.col('tick') == tick)
-        if len(tick_data) == 0:
+    by_thrower = defaultdict(list)
+    for row, site, area in zip(events.iter_rows(named=True), landing_sites, areas):
+        if site not in sites:
             continue
-            
-        row = tick_data.row(0, named=True)
-        
-        # Get coordinates - awpy uses X, Y, Z
-        x = row.get('X', row.get('x', 0))
-        y = row.get('Y', row.get('y', 0))
-        z = row.get('Z', row.get('z', 0))
-        
-        # Validate coordinates are reasonable (not 0,0,0 or NaN)
-        if x == 0 and y == 0 and z == 0:
-            continue
-        
-        # Check if in B-Site area
-        if is_in_b_site_area(x, y):
-            if not in_b_site:
-                first_b_site_tick = tick
-                in_b_site = True
-            
-            area = classify_b_site_position(x, y)
-            
-            # Calculate time from round start (need round start tick)
-            # For now, use absolute time
-            journey.append({
-                'tick': int(tick),
-                'time': round(tick / 64.0, 2),  # Convert to seconds (assuming 64 tick)
-                'x': round(float(x), 1),
-                'y': round(float(y), 1),
-                'z': round(float(z), 1),
-                'area': area,
-                'is_entry': (tick == first_b_site_tick)
-            })
-    
-    return journey
-
-def extract_grenade_throws(grenades_df, round_num, player_name):
-    """Extract grenade throw information for a player in a round"""
+        event = {
+            'tick': row['_throw_tick'],
+            'time': round(row['_throw_tick'] / 64.0, 2),
+            'type': row['_type'],
+            'land_tick': row['_land_tick'],
+            'land_time': round(row['_land_tick'] / 64.0, 2),
+            'x': round(float(row[f'_{x_col}']), 1),
+            'y': round(float(row[f'_{y_col}']), 1),
+            'z': round(float(row[f'_{z_col}']), 1),
+            'area': area
+        }
+        if path_points > 0:
+            xs, ys = row[f'_{x_col}_path'], row[f'_{y_col}_path']
+            keep = np.unique(np.linspace(0, len(xs) - 1, min(len(xs), path_points)).round().astype(int))
+            event['path'] = [[round(float(xs[k]), 1), round(float(ys[k]), 1)] for k in keep]
+        by_thrower[(row['round_num'], row['_thrower'], site)].append(event)
+    
+    return dict(by_thrower)
+
+def extract_grenade_throws(grenades_df, round_num, player_name, path_points=GRENADE_PATH_POINTS):
+    """Extract the CT grenade throws of a player in a round that land in B-Site (one event per thrown grenade)"""
     if grenades_df is None or len(grenades_df) == 0:
         return []
-    
-    # Try to find the correct column for side/team
-    side_col = None
-    for col in ['thrower_side', 'side', 'thrower_team']:
-        if col in grenades_df.columns:
-            side_col = col
-            break
-    
-    if side_col is None:
+    thrower_col = _first_present(grenades_df.columns, GRENADE_THROWER_COLUMNS)
+    if thrower_col is None:
         return []
-    
-    # Filter for CT grenades from this player in this round
     player_grenades = grenades_df.filter(
         (pl.col('round_num') == round_num) &
-        (pl.col('thrower_name') == player_name) &
-        (pl.col(side_col).is_in(['CT', 'Counter-Terrorist', 'ct', 3]))  # Handle all CT variations
+        (pl.col(thrower_col).cast(pl.String) == player_name)
     )
-    
-    throws = []
-    for row in player_grenades.iter_rows(named=True):
-        x, y = row['X'], row['Y']
-        
-        # Only include throws in or near B-Site
-        if is_in_b_site_area(x, y):
-            throws.append({
-                'tick': row['tick'],
-                'time': round(row['tick'] / 64.0, 2),
-                'type': row['grenade_type'],
-                'x': round(x, 1),
-                'y': round(y, 1),
-                'area': classify_b_site_position(x, y)
-            })
-    
-    return throws
+    return build_grenade_events(player_grenades, path_points, ['B'], ['ct']).get((round_num, player_name, 'B'), [])
 
-def main():
-    print(f"Loading demo from: {DEMO_PATH}")
-    try:
-        dem = Demo(DEMO_PATH)
-        # Parse with player props including weapons and money
-        # awpy requires explicit player_props to track equipment and money
-        dem.parse(player_props=["health", "armor_value", "pitch", "yaw", "cash", "money", "total_money", "active_weapon", "weapon"])
-    except Exception as e:
-        print(f"Error loading demo: {e}")
-        return
+def required_player_props(stages=PIPELINE_STAGES):
+    """Minimal player props to request from awpy for the given pipeline stages"""
+    return sorted({prop for stage in stages for prop in STAGE_REQUIREMENTS[stage]['player_props']})
+
+def required_tables(stages=PIPELINE_STAGES):
+    """Parsed demo tables the given pipeline stages read"""
+    return sorted({table for stage in stages for table in STAGE_REQUIREMENTS[stage]['tables']})
+
+def prune_ticks(ticks_lf, rounds_df=None):
+    """
+    Keep only alive player ticks between freeze end and round end, with compact types
+    (float32 coordinates, categorical names, int32 ticks/rounds)
+    """
+    columns = ticks_lf.collect_schema().names()
+    ticks_lf = ticks_lf.with_columns(pl.col('round_num').cast(pl.Int32))
     
-    print("Demo parsed successfully!")
+    if rounds_df is not None and 'freeze_end' in rounds_df.columns:
+        end_col = next((col for col in ['end', 'official_end', 'end_tick'] if col in rounds_df.columns), None)
+        if end_col is not None:
+            windows = rounds_df.lazy().select(
+                pl.col('round_num').cast(pl.Int32),
+                pl.col('freeze_end').alias('_window_start'),
+                pl.col(end_col).alias('_window_end')
+            )
+            ticks_lf = (
+                ticks_lf.join(windows, on='round_num', how='inner')
+                .filter(pl.col('tick').is_between(pl.col('_window_start'), pl.col('_window_end')))
+                .drop('_window_start', '_window_end')
+            )
+    
+    if 'health' in columns:
+        ticks_lf = ticks_lf.filter(pl.col('health') > 0)
     
-    ticks_df = dem.ticks
-    total_rounds = ticks_df['round_num'].max()
-    print(f"Total rounds in demo: {total_rounds}")
+    casts = [pl.col('tick').cast(pl.Int32)]
+    casts += [pl.col(axis).cast(pl.Float32) for axis in coordinate_columns(columns) if axis in columns]
+    casts += [pl.col(col).cast(pl.Categorical) for col in ['name', 'side'] if col in columns]
+    return ticks_lf.with_columns(casts)
+
+def demo_tickrate(dem):
+    """Ticks per second of a parsed demo, from its header (TICKRATE when the header does not give one)"""
+    header = getattr(dem, 'header', None) or {}
+    return header.get('tickrate') or TICKRATE
+
+def scan_ticks(dem, rounds_df=None, lean=False, round_num=None, stages=PIPELINE_STAGES):
+    """
+    Tick data for the pipeline as a LazyFrame, read from the parse cache when possible
+    With round_num only that round is read (the filter is pushed down to the Parquet scan);
+    in lean mode only the needed columns are read and pruned to alive in-round rows
+    """
+    ticks_lf = dem.scan('ticks') if hasattr(dem, 'scan') else dem.ticks.lazy()
+    if round_num is not None:
+        ticks_lf = ticks_lf.filter(pl.col('round_num') == round_num)
+    if not lean:
+        return ticks_lf
     
-    # Debug: Print columns to understand available data
-    print(f"Available columns in ticks: {ticks_df.columns}")
+    available = ticks_lf.collect_schema().names()
+    needed = TICK_BASE_COLUMNS + required_player_props(stages)
+    ticks_lf = ticks_lf.select([col for col in available if col in needed or col.lower() in needed])
+    return prune_ticks(ticks_lf, rounds_df)
+
+def load_ticks(dem, rounds_df=None, lean=False, stages=PIPELINE_STAGES):
+    """
+    Tick data for the pipeline
+    In lean mode only the needed columns are read (lazily from the parse cache when possible)
+    and pruned to alive in-round rows before anything is materialized
+    """
+    if not lean:
+        return dem.ticks
+    return scan_ticks(dem, rounds_df, lean, stages=stages).collect()
+
+def player_side_expr(ticks_lf, instr=NULL_INSTRUMENTATION):
+    """
+    Side ('ct' / 't') of every tick row
+    awpy uses team_num where 3=CT, 2=T; older versions only have a 'side' column
+    """
+    columns = ticks_lf.collect_schema().names()
+    for col in ["team_num", "side"]:
+        if col in columns:
+            instr.note('side_column', col)
+            return side_expr(col)
+    raise ValueError("Cannot find side or team_num column!")
+
+def _round_rows(df, round_num):
+    """Rows of one round of an optional per-round table (tables without round_num are kept whole)"""
+    if df is None or 'round_num' not in df.columns:
+        return df
+    return df.filter(pl.col('round_num') == round_num)
+
+def _note_tick_columns(ticks_lf, instr):
+    """Record the tick columns, money columns and side values seen in the tick data"""
+    columns = ticks_lf.collect_schema().names()
+    instr.note('tick_columns', columns)
     
     # Check for money/cash columns in ticks
-    money_columns = [col for col in ticks_df.columns if 'money' in col.lower() or 'cash' in col.lower()]
-    if money_columns:
-        print(f"Money columns found in ticks: {money_columns}")
-    else:
-        print("Warning: No money columns found in ticks")
+    money_columns = [col for col in columns if 'money' in col.lower() or 'cash' in col.lower() or col == 'balance']
+    instr.note('money_columns', money_columns)
+    if not money_columns:
+        instr.warn("No money columns found in ticks")
     
-    # Check rounds dataframe for economy data
-    rounds_df = None
-    if hasattr(dem, 'rounds') and dem.rounds is not None:
-        rounds_df = dem.rounds
-        print(f"Rounds dataframe columns: {rounds_df.columns}")
+    if instr.enabled:
+        for col, key in [('side', 'sides'), ('team_num', 'team_nums')]:
+            if col in columns:
+                values = ticks_lf.select(pl.col(col).unique()).collect()[col].to_list()
+                instr.note(key, [str(value) for value in values] if col == 'side' else values)
+
+def setup_round_info(rounds_df, round_num_dtype):
+    """(round_num, freeze_end, winner) of every round for the setup fingerprints, None without round data"""
+    start_col = _first_present(rounds_df.columns, ROUND_START_COLUMNS) if rounds_df is not None else None
+    if start_col is None:
+        return None
+    winner = side_expr('winner') if 'winner' in rounds_df.columns else pl.lit(None, dtype=pl.String)
+    return (
+        rounds_df.unique('round_num', keep='first', maintain_order=True)
+        .select(pl.col('round_num').cast(round_num_dtype), pl.col(start_col).alias('freeze_end'),
+                winner.alias('winner'))
+    )
+
+def build_round_tables(ticks_df, player_ticks, total_rounds, rounds_df, buys_df, economy_df, weapon_ids,
+                       sites=None, journey_tolerance=None, tickrate=TICKRATE, instr=NULL_INSTRUMENTATION):
+    """
+    Journeys, site stats, rotations, classified round-start equipment, position heatmaps and team setups
+    of every player-round in the given ticks
+    Returns ({round_num: {(name, side, site): journey}}, {(round_num, name, side, site): site stats},
+    {round_num: [rotation]}, {(round_num, name): equipment row with buy_type},
+    {(side, site, buy_type): {cell: ticks}}, setup table (see setups.build_setups; None without round data))
+    """
+    # Build the journeys of every player through every site in a single pass over the tick data
+    with instr.span('journey') as span:
+        journeys = defaultdict(dict)
+        site_journeys = build_site_journeys(player_ticks, sites, tolerance=journey_tolerance)
+        for (round_num, name, side, site), journey in site_journeys.items():
+            journeys[round_num][(name, side, site)] = journey
+        span.rows = len(player_ticks)
     
-    # Check buys dataframe for economy data (this is where money is often stored)
-    buys_df = None
-    if hasattr(dem, 'buys') and dem.buys is not None:
-        buys_df = dem.buys
-        print(f"Buys dataframe columns: {buys_df.columns}")
-        if len(buys_df) > 0:
-            print(f"Buys dataframe has {len(buys_df)} rows")
-    else:
-        print("No buys dataframe found")
+    # Full-resolution zone stays; site stats and rotations are aggregations over them
+    with instr.span('transitions') as span:
+        transitions = build_zone_transitions(player_ticks, DUST2_ZONES)
+        visits = site_visits(transitions, DUST2_ZONES, sites, tickrate)
+        rotations = defaultdict(list)
+        for rotation in rotation_events(transitions, tickrate).iter_rows(named=True):
+            rotations[rotation.pop('round_num')].append(rotation)
+        span.rows = len(transitions)
     
-    # Check if there's an economy dataframe
-    economy_df = None
-    if hasattr(dem, 'economy') and dem.economy is not None:
-        economy_df = dem.economy
-        print(f"Economy dataframe columns: {economy_df.columns}")
-        if len(economy_df) > 0:
-            print(f"Economy dataframe has {len(economy_df)} rows")
-    else:
-        print("No economy dataframe found")
-    
-    if "side" in ticks_df.columns:
-        print(f"Unique sides: {ticks_df['side'].unique().to_list()}")
-    if "team_num" in ticks_df.columns:
-        print(f"Unique team_nums: {ticks_df['team_num'].unique().to_list()}")
-    
-    # Determine CT side - awpy uses team_num where 3=CT, 2=T
-    # Filter for CT players who are alive
-    ct_ticks = None
-    if "team_num" in ticks_df.columns:
-        # Modern awpy uses team_num
-        ct_ticks = ticks_df.filter(
-            (pl.col("team_num") == 3) &  # 3 is CT team
-            (pl.col("health") > 0)
-        )
-        print(f"Using team_num filtering (team 3 = CT)")
-    elif "side" in ticks_df.columns:
-        # Older versions might use 'side'
-        unique_sides = ticks_df["side"].unique().to_list()
-        ct_side_val = "CT"
-        
-        # Handle different case conventions
-        if "ct" in unique_sides:
-            ct_side_val = "ct"  # Lowercase
-        elif "CT" in unique_sides:
-            ct_side_val = "CT"  # Uppercase
-        elif "Counter-Terrorist" in unique_sides:
-            ct_side_val = "Counter-Terrorist"
-        elif 3 in unique_sides:
-            ct_side_val = 3
-            
-        ct_ticks = ticks_df.filter(
-            (pl.col("side") == ct_side_val) &
-            (pl.col("health") > 0)
+    # Equipment at round start of every player in every round, from one table
+    with instr.span('equipment') as span:
+        equipment_table = classify_buy_types(
+            extract_round_start_equipment(ticks_df, rounds_df, buys_df, economy_df, weapon_ids),
+            total_rounds
         )
-        print(f"Using side filtering (side = {ct_side_val})")
-        print(f"CT ticks found: {len(ct_ticks)}")
-    else:
-        print("ERROR: Cannot find side or team_num column!")
-        return
+        round_start_equipment = {
+            (row['round_num'], row['name']): row for row in equipment_table.iter_rows(named=True)
+        }
+        span.rows = len(equipment_table)
     
-    print(f"Processing {total_rounds} rounds...")
+    # Ticks per radar grid cell, split by side, site and buy type
+    heatmaps = {}
+    if COUNT_HEATMAPS:
+        with instr.span('heatmaps') as span:
+            heatmaps = occupancy_counts(player_ticks, equipment_table, DUST2_ZONES, sites, HEATMAP_CELLS)
+            span.rows = len(player_ticks)
     
-    # Data structures
-    rounds_data = []
-    position_stats = defaultdict(lambda: {
-        'total_count': 0,
-        'by_buy_type': defaultdict(int),
-        'entry_points': defaultdict(int),
-        'players': set()
-    })
-    
-    # Process each round
-    for round_num in range(1, total_rounds + 1):
-        print(f"  Processing round {round_num}...")
-        
-        round_ticks = ct_ticks.filter(pl.col('round_num') == round_num)
-        
-        if len(round_ticks) == 0:
-            continue
-        
-        # Find all CT players who spent time in B-Site this round
-        b_site_players = set()
-        for row in round_ticks.iter_rows(named=True):
-            x, y = row['X'], row['Y']
-            if is_in_b_site_area(x, y):
-                b_site_players.add(row['name'])
-        
-        round_data = {
-            'round_num': round_num,
-            'ct_players': []
-        }
-        
-        # Analyze each CT player who was in B-Site
-        for player_name in b_site_players:
-            # Extract equipment at round start (not when entering B-site)
-            equipment = extract_player_equipment_at_round_start(ticks_df, round_num, player_name, rounds_df, buys_df, economy_df)
+    # Zones of each whole side shortly after freeze end, hashed for grouping identical setups
+    setups = None
+    round_info = setup_round_info(rounds_df, player_ticks.schema['round_num'])
+    if round_info is not None:
+        with instr.span('setups') as span:
+            setups = build_setups(player_ticks, round_info, equipment_table, DUST2_ZONES, SETUP_OFFSETS, tickrate)
+            span.rows = len(setups)
+    
+    return journeys, visits, rotations, round_start_equipment, heatmaps, setups
+
+def analyze_round(round_num, round_journeys, visits, round_rotations, round_start_equipment, grenade_events,
+                  instr=NULL_INSTRUMENTATION):
+    """Player data of one round: one entry per player and site they went through, plus moves between sites"""
+    round_data = {
+        'round_num': round_num,
+        'players': [],
+        'rotations': round_rotations
+    }
+    
+    with instr.span('round_assembly') as span:
+        for (player_name, side, site), journey in sorted(round_journeys.items()):
+            # Equipment at round start (not when entering the site)
+            equipment = round_start_equipment.get((round_num, player_name))
             if equipment is None:
                 continue
             
-            # Get money at round start for better buy classification
-            money_at_start = equipment.get('money')
-            
-            # Classify buy type using equipment and money
-            buy_type = classify_buy_type(
-                round_num, 
-                total_rounds, 
-                equipment['equipment_value'],
-                equipment['primary_weapon'],
-                money_at_start,
-                equipment['armor_value'],
-                equipment['has_helmet']
-            )
-            
-            # Analyze journey
-            journey = analyze_player_journey(ct_ticks, round_num, player_name, sample_rate=32)
-            
-            if len(journey) == 0:
-                continue
-            
-            # Determine primary position (where they spent most time)
-            position_counts = defaultdict(int)
-            for point in journey:
-                position_counts[point['area']] += 1
+            buy_type = equipment['buy_type']
             
-            primary_position = max(position_counts.items(), key=lambda x: x[1])[0] if position_counts else "Unknown"
+            # Primary position, time in site and entry point come from every tick, not the sampled journey
+            visit = visits[(round_num, player_name, side, site)]
             
-            # Calculate time spent in B-Site
-            time_in_site = (journey[-1]['time'] - journey[0]['time']) if len(journey) > 1 else 0
-            
-            # Determine entry point
-            entry_point = "unknown"
-            if len(journey) > 0 and journey[0]['area'] in ["Window", "Doors", "Tunnel Exit"]:
-                entry_point = journey[0]['area']
-            
-            # Extract grenade throws
-            grenades = []
-            if hasattr(dem, 'grenades'):
-                grenades = extract_grenade_throws(dem.grenades, round_num, player_name)
+            # Grenade throws that landed in this site
+            grenades = grenade_events.get((round_num, player_name, site), [])
             
             player_data = {
                 'name': player_name,
+                'side': side,
+                'site': site,
                 'buy_type': buy_type,
                 'equipment': {
                     'primary_weapon': equipment['primary_weapon'],
@@ -695,76 +1038,276 @@ def main():
                     'has_helmet': equipment['has_helmet'],
                     'total_value': equipment['equipment_value'],
                     'health': equipment['health'],
-                    'money': money_at_start  # Include money if available
+                    'money': equipment['money']  # Include money if available
                 },
                 'journey': journey,
                 'utility_throws': grenades,
-                'entry_point': entry_point,
-                'primary_position': primary_position,
-                'time_in_site': round(time_in_site, 2)
+                'entry_point': visit['entry_point'],
+                'primary_position': visit['primary_position'],
+                'time_in_site': visit['time_in_site']
             }
             
-            round_data['ct_players'].append(player_data)
-            
-            # Update aggregate statistics
-            position_stats[primary_position]['total_count'] += 1
-            position_stats[primary_position]['by_buy_type'][buy_type] += 1
-            position_stats[primary_position]['entry_points'][entry_point] += 1
-            position_stats[primary_position]['players'].add(player_name)
-        
-        rounds_data.append(round_data)
+            round_data['players'].append(player_data)
+        span.rows = len(round_data['players'])
     
-    # Calculate aggregate statistics
-    aggregate_stats = {
-        'total_rounds': total_rounds,
-        'position_stats': []
-    }
+    return round_data
+
+def map_in_order(executor, fn, items, window):
+    """fn(item) of every item, run on the executor with at most `window` calls in flight and yielded in item order"""
+    pending = deque()
+    try:
+        for item in items:
+            pending.append(executor.submit(fn, item))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+def analyze_demo(dem, demo_path, lean=None, instr=NULL_INSTRUMENTATION, stream=None, writer=None, sites=None, sides=None,
+                 journey_tolerance=None, round_workers=None, demo_id=None):
+    """
+    Run the full extraction on a parsed demo and return the output data and its aggregate state
+    (which counts the demo under demo_id, by default its file stem)
+    Every alive player of the given sides is followed through every given site in the same pass
+    (defaults: EXTRACT_SITES / EXTRACT_SIDES); journey_tolerance (default JOURNEY_TOLERANCE) switches
+    journeys from fixed sampling to error-bounded simplification. With stream=True tick data is read and processed one round at a time, so peak memory follows one
+    round instead of the whole match. Streamed rounds run on round_workers threads (default ROUND_WORKERS)
+    and are merged in round order, so the output does not depend on the thread count.
+    Finished rounds are handed to writer.write_round (a ShardWriter)
+    when a writer is given and released instead of being kept in output_data['rounds'].
+    """
+    if lean is None:
+        lean = LEAN_EXTRACTION
+    if stream is None:
+        stream = STREAM_ROUNDS
+    if sites is None:
+        sites = EXTRACT_SITES
+    if sides is None:
+        sides = EXTRACT_SIDES
+    if journey_tolerance is None:
+        journey_tolerance = JOURNEY_TOLERANCE
+    if round_workers is None:
+        round_workers = ROUND_WORKERS or pl.thread_pool_size()
+    
+    # Check rounds dataframe for economy data
+    rounds_df = None
+    if hasattr(dem, 'rounds') and dem.rounds is not None:
+        rounds_df = dem.rounds
+        instr.note('rounds_columns', rounds_df.columns)
+    
+    # Check buys dataframe for economy data (this is where money is often stored)
+    buys_df = None
+    if hasattr(dem, 'buys') and dem.buys is not None:
+        buys_df = dem.buys
+        instr.note('buys', {'columns': buys_df.columns, 'rows': len(buys_df)})
+    
+    # Check if there's an economy dataframe
+    economy_df = None
+    if hasattr(dem, 'economy') and dem.economy is not None:
+        economy_df = dem.economy
+        instr.note('economy', {'columns': economy_df.columns, 'rows': len(economy_df)})
+    
+    if stream:
+        # Only whole-match metadata is computed up front, from the lazy scan
+        ticks_lf = scan_ticks(dem, rounds_df, lean)
+        total_rounds = ticks_lf.select(pl.col('round_num').max()).collect().item()
+        weapon_ids = build_weapon_id_map(ticks_lf)
+    else:
+        with instr.span('load_ticks') as span:
+            ticks_df = load_ticks(dem, rounds_df, lean)
+            span.rows = len(ticks_df)
+        ticks_lf = ticks_df.lazy()
+        total_rounds = ticks_df['round_num'].max()
+        weapon_ids = build_weapon_id_map(ticks_df)
+    instr.note('total_rounds', total_rounds)
+    # Seconds-based stages (site times, rotations, setups) and heatmap grids follow the demo's tickrate
+    tickrate = demo_tickrate(dem)
+    instr.note('tickrate', tickrate)
+    _note_tick_columns(ticks_lf, instr)
+    
+    # Alive players of the extracted sides, with their side as a column
+    side = player_side_expr(ticks_lf, instr)
+    instr.note('extract', {'sites': sites, 'sides': sides})
+    
+    def select_players(df):
+        return df.with_columns(_side=side).filter(pl.col('_side').is_in(sides) & (pl.col('health') > 0))
+    
+    # One event per grenade throw, grouped by (round, thrower, landing site)
+    grenade_events = {}
+    if 'grenades' in PIPELINE_STAGES and hasattr(dem, 'grenades'):
+        with instr.span('grenades') as span:
+            grenade_events = build_grenade_events(dem.grenades, GRENADE_PATH_POINTS, sites, sides)
+            span.rows = len(dem.grenades) if dem.grenades is not None else 0
+    
+    # Alive ticks in the extracted sites vs journey points written, for the compression ratio
+    journey_size = {'site_ticks': 0, 'points': 0}
+    
+    def count_journey_points(journeys, visits):
+        journey_size['site_ticks'] += sum(visit['ticks'] for visit in visits.values())
+        journey_size['points'] += sum(len(journey) for round_journeys in journeys.values()
+                                      for journey in round_journeys.values())
+    
+    rounds_data = []
+    # Flat player-round rows for the fact table; small enough to keep even when streaming
+    facts = []
+    aggregate_state = state_from_rounds([], total_rounds, demo_id or demo_id_for(demo_path))
+    grid = heatmap_grid(DUST2_ZONES, HEATMAP_CELLS, tickrate) if COUNT_HEATMAPS else None
+    
+    def finish_round(round_data):
+        with instr.span('aggregation') as span:
+            add_round(aggregate_state, round_data)
+            facts.extend(fact_rows(round_data))
+            span.rows = len(round_data['players'])
+        if writer is not None:
+            with instr.span('write') as span:
+                writer.write_round(round_data)
+                span.rows = 1
+        else:
+            rounds_data.append(round_data)
     
-    for area, stats in position_stats.items():
-        total_count = stats['total_count']
+    if stream:
+        def stream_round(round_num):
+            """Read and process one round's ticks; runs on a round thread (Polars releases the GIL)"""
+            with instr.span('load_ticks') as span:
+                round_ticks = scan_ticks(dem, rounds_df, lean, round_num).collect()
+                span.rows = len(round_ticks)
+            with instr.span('player_filter') as span:
+                round_player_ticks = select_players(round_ticks)
+                span.rows = len(round_ticks)
+            if len(round_player_ticks) == 0:
+                return 0, None
+            
+            journeys, visits, rotations, round_start_equipment, heatmaps, setups = build_round_tables(
+                round_ticks, round_player_ticks, total_rounds, _round_rows(rounds_df, round_num),
+                _round_rows(buys_df, round_num), _round_rows(economy_df, round_num), weapon_ids, sites,
+                journey_tolerance, tickrate, instr
+            )
+            round_data = analyze_round(round_num, journeys.get(round_num, {}), visits, rotations.get(round_num, []),
+                                       round_start_equipment, grenade_events, instr)
+            # Only the round's results leave the thread; its ticks are released here
+            return len(round_player_ticks), (journeys, visits, heatmaps, setups, round_data)
         
-        buy_type_breakdown = {}
-        for buy_type, count in stats['by_buy_type'].items():
-            buy_type_breakdown[buy_type] = {
-                'count': count,
-                'percentage': round(count / total_count, 3) if total_count > 0 else 0
-            }
+        player_tick_count = 0
+        instr.note('round_workers', round_workers)
+        with ThreadPoolExecutor(max_workers=round_workers) as executor:
+            # A couple of rounds per thread in flight keeps the threads busy while bounding memory
+            for tick_count, results in map_in_order(executor, stream_round, range(1, total_rounds + 1),
+                                                    2 * round_workers):
+                player_tick_count += tick_count
+                if results is None:
+                    continue
+                journeys, visits, heatmaps, setups, round_data = results
+                count_journey_points(journeys, visits)
+                add_heatmaps(aggregate_state, heatmaps, grid)
+                add_setups(aggregate_state, setups, SETUP_OFFSETS)
+                del journeys, visits, heatmaps, setups, results
+                finish_round(round_data)
+        instr.note('player_ticks', player_tick_count)
+    else:
+        with instr.span('player_filter') as span:
+            player_ticks = select_players(ticks_df)
+            span.rows = len(ticks_df)
+        instr.note('player_ticks', len(player_ticks))
         
-        entry_point_breakdown = {}
-        for entry, count in stats['entry_points'].items():
-            entry_point_breakdown[entry] = count
+        journeys, visits, rotations, round_start_equipment, heatmaps, setups = build_round_tables(
+            ticks_df, player_ticks, total_rounds, rounds_df, buys_df, economy_df, weapon_ids, sites, journey_tolerance,
+            tickrate, instr
+        )
+        count_journey_points(journeys, visits)
+        add_heatmaps(aggregate_state, heatmaps, grid)
+        add_setups(aggregate_state, setups, SETUP_OFFSETS)
         
-        aggregate_stats['position_stats'].append({
-            'area': area,
-            'overall_frequency': round(total_count / total_rounds, 3) if total_rounds > 0 else 0,
-            'total_occurrences': total_count,
-            'by_buy_type': buy_type_breakdown,
-            'entry_points': entry_point_breakdown,
-            'unique_players': len(stats['players'])
-        })
+        # Process each round that has alive players of the extracted sides
+        played_rounds = set(player_ticks['round_num'].unique().to_list())
+        for round_num in range(1, total_rounds + 1):
+            if round_num in played_rounds:
+                finish_round(analyze_round(round_num, journeys.get(round_num, {}), visits, rotations.get(round_num, []),
+                                           round_start_equipment, grenade_events, instr))
+    
+    instr.note('journey_compression', dict(
+        journey_size,
+        mode='sample' if journey_tolerance is None else 'simplify',
+        tolerance=journey_tolerance,
+        ratio=round(journey_size['site_ticks'] / journey_size['points'], 2) if journey_size['points'] else None
+    ))
     
-    # Sort by frequency
-    aggregate_stats['position_stats'].sort(key=lambda x: x['overall_frequency'], reverse=True)
+    # Aggregate statistics are kept as a mergeable state; percentages are derived from it
+    with instr.span('aggregation'):
+        aggregate_stats = finalize(aggregate_state)
     
     # Prepare final output
     output_data = {
         'metadata': {
-            'demo_file': os.path.basename(DEMO_PATH),
+            'demo_file': os.path.basename(demo_path),
             'total_rounds': total_rounds,
             'map': 'de_dust2'
         },
         'rounds': rounds_data,
-        'aggregate': aggregate_stats
+        'aggregate': aggregate_stats,
+        'facts': facts
     }
     
-    # Save to JSON
-    os.makedirs(os.path.dirname(OUTPUT_PATH), exist_ok=True)
-    with open(OUTPUT_PATH, 'w') as f:
-        json.dump(output_data, f, indent=2)
+    return output_data, aggregate_state
+
+def main():
+    instr = Instrumentation(enabled=RUN_REPORT, profiler=PROFILER)
+    instr.start_profiler()
+    
+    print(f"Loading demo from: {DEMO_PATH}")
+    try:
+        # Parse with player props including weapons and money (or reuse a cached parse)
+        # awpy requires explicit player_props to track equipment and money
+        player_props = required_player_props() if LEAN_EXTRACTION else PLAYER_PROPS
+        with instr.span('parse'):
+            dem = load_demo(DEMO_PATH, player_props, CACHE_DIR, instr)
+    except Exception as e:
+        print(f"Error loading demo: {e}")
+        return
+    
+    print("Demo parsed successfully!")
+    
+    # In streaming mode round shards are written as each round finishes
+    demo_id = demo_id_for(DEMO_PATH)
+    writer = ShardWriter(OUTPUT_DIR, demo_id, BINARY_JOURNEYS) if STREAM_ROUNDS else None
+    try:
+        output_data, aggregate_state = analyze_demo(dem, DEMO_PATH, instr=instr, stream=STREAM_ROUNDS, writer=writer,
+                                                    demo_id=demo_id)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        return
+    
+    total_rounds = output_data['metadata']['total_rounds']
+    aggregate_stats = output_data['aggregate']
+    
+    # Save as a manifest plus per-round shards, with the mergeable aggregate state and the fact table alongside
+    with instr.span('write') as span:
+        if writer is not None:
+            index_entry = writer.finish(output_data['metadata'], aggregate_stats)
+        else:
+            index_entry = write_sharded_output(output_data, OUTPUT_DIR, demo_id, BINARY_JOURNEYS)
+        update_index(OUTPUT_DIR, [index_entry])
+        save_state(aggregate_state, state_path_for(OUTPUT_DIR, demo_id))
+        write_fact_table(output_data['facts'], OUTPUT_DIR, demo_id, DEMO_PATH, output_data['metadata']['map'])
+        span.rows = len(output_data['rounds'])
     
     print(f"\n✅ Analysis complete!")
     print(f"📊 Processed {total_rounds} rounds")
-    print(f"💾 Data saved to: {OUTPUT_PATH}")
+    print(f"💾 Data saved to: {os.path.join(OUTPUT_DIR, index_entry['manifest'])}")
+    if RUN_REPORT:
+        report_path = instr.write_report(os.path.join(OUTPUT_DIR, f'{demo_id}.run.json'), metadata={
+            'demo_file': os.path.basename(DEMO_PATH),
+            'lean': LEAN_EXTRACTION,
+            'stream': STREAM_ROUNDS,
+            'round_workers': ROUND_WORKERS,
+            'journey_tolerance': JOURNEY_TOLERANCE,
+            'sites': EXTRACT_SITES,
+            'sides': EXTRACT_SIDES,
+            'player_props': player_props
+        })
+        print(f"📈 Run report saved to: {report_path}")
     print(f"\nTop positions by frequency:")
     for stat in aggregate_stats['position_stats'][:5]:
         print(f"  {stat['area']}: {stat['overall_frequency']*100:.1f}% ({stat['total_occurrences']} occurrences)")
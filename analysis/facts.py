@@ -0,0 +1,206 @@
+"""
+Player-round fact table
+Next to the nested round shards every extracted demo gets a flat table with one row per
+(demo, round, player, site): buy type, equipment, money, primary position, entry point, time in site
+utility counts and the resampled trajectory of the journey (see trajectories.py). Tables are Parquet files in a hive-partitioned layout under <output_dir>/facts:
+    facts/map=<map>/event=<event>/demo_id=<demo_id>/facts.parquet
+so cross-demo questions are one lazy scan. query_facts() filters on partitions (whole directories are
+skipped) and pushes the other filters down into the Parquet reader.
+
+The event is the name of the directory the demo file is in, and the date the demo file's modification
+date (awpy's header has neither).
+
+Usage:
+    python analysis/facts.py web_app/public/data --player s1mple --buy-type eco full_buy --site B
+    python analysis/facts.py web_app/public/data --event iem-cologne --from 2024-06-01 --to 2024-06-30
+"""
+
+import os
+import re
+import sys
+import argparse
+from datetime import date, datetime, timezone
+import polars as pl
+from trajectories import TRAJECTORY_POINTS, trajectory_vector
+
+FACTS_DIR = 'facts'
+FACTS_FILE = 'facts.parquet'
+
+# Grenade type names differ between awpy versions ('Smoke Grenade', 'smokegrenade', 'CSmokeGrenadeProjectile'),
+# so utility is counted by name fragments
+UTILITY_TYPES = {
+    'smokes': ['smoke'],
+    'flashes': ['flash'],
+    'he_grenades': ['hegrenade', 'he grenade', 'he_grenade'],
+    'molotovs': ['molotov', 'incendiary', 'incgrenade', 'inferno']
+}
+
+FACT_SCHEMA = {
+    'date': pl.Date,
+    'round_num': pl.Int32,
+    'name': pl.String,
+    'side': pl.String,
+    'site': pl.String,
+    'buy_type': pl.String,
+    'primary_weapon': pl.String,
+    'equipment_value': pl.Int32,
+    'money': pl.Int32,
+    'armor_value': pl.Int32,
+    'has_helmet': pl.Boolean,
+    'primary_position': pl.String,
+    'entry_point': pl.String,
+    'time_in_site': pl.Float64,
+    **{utility: pl.Int16 for utility in UTILITY_TYPES},
+    'utility_total': pl.Int16,
+    'trajectory': pl.Array(pl.Float32, 2 * TRAJECTORY_POINTS)
+}
+
+PARTITIONS = ['map', 'event', 'demo_id']
+
+def _partition_value(value):
+    """Directory-safe partition value"""
+    return re.sub(r'[^A-Za-z0-9_.-]+', '-', str(value)) or 'unknown'
+
+def demo_event(demo_path):
+    return os.path.basename(os.path.dirname(os.path.abspath(demo_path))) or 'unknown'
+
+def demo_date(demo_path):
+    """Modification date of the demo file (None when the file is not there)"""
+    try:
+        return datetime.fromtimestamp(os.path.getmtime(demo_path), timezone.utc).date()
+    except OSError:
+        return None
+
+def utility_kind(grenade_type):
+    """Fact column counting a grenade type, or None"""
+    name = str(grenade_type).lower()
+    if name == 'he':
+        return 'he_grenades'
+    for utility, fragments in UTILITY_TYPES.items():
+        if any(fragment in name for fragment in fragments):
+            return utility
+    return None
+
+def fact_rows(round_data):
+    """Fact rows (without the demo columns) of one extracted round"""
+    rows = []
+    for player in round_data['players']:
+        equipment = player['equipment']
+        utility = dict.fromkeys(UTILITY_TYPES, 0)
+        for throw in player['utility_throws']:
+            kind = utility_kind(throw['type'])
+            if kind is not None:
+                utility[kind] += 1
+        money = equipment.get('money')
+        rows.append({
+            'round_num': round_data['round_num'],
+            'name': player['name'],
+            'side': player['side'],
+            'site': player['site'],
+            'buy_type': player['buy_type'],
+            'primary_weapon': equipment['primary_weapon'],
+            'equipment_value': equipment['total_value'],
+            'money': int(money) if money is not None else None,
+            'armor_value': equipment['armor_value'],
+            'has_helmet': equipment['has_helmet'],
+            'primary_position': player['primary_position'],
+            'entry_point': player['entry_point'],
+            'time_in_site': player['time_in_site'],
+            **utility,
+            'utility_total': len(player['utility_throws']),
+            'trajectory': trajectory_vector(player['journey'])
+        })
+    return rows
+
+def fact_path(output_dir, map_name, event, demo_id):
+    partitions = zip(PARTITIONS, (map_name, event, demo_id))
+    return os.path.join(output_dir, FACTS_DIR, *(f'{key}={_partition_value(value)}' for key, value in partitions),
+                        FACTS_FILE)
+
+def write_fact_table(rows, output_dir, demo_id, demo_path, map_name):
+    """Write one demo's fact rows to its partition (replacing an earlier extraction); returns the path"""
+    table = pl.DataFrame(
+        [dict(row, date=demo_date(demo_path)) for row in rows], schema=FACT_SCHEMA, strict=False
+    ).sort('round_num', 'site', 'name')
+    path = fact_path(output_dir, map_name, demo_event(demo_path), demo_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp-{os.getpid()}'
+    table.write_parquet(tmp_path, statistics=True)
+    os.replace(tmp_path, path)
+    return path
+
+def _one_or_many(value):
+    return [value] if isinstance(value, (str, int, date)) else list(value)
+
+def scan_facts(output_dir):
+    """
+    Lazy frame over every demo's fact table; map, event and demo_id come from the partition directories
+    Columns added since a table was written (e.g. trajectory) read as null
+    """
+    return pl.scan_parquet(
+        os.path.join(output_dir, FACTS_DIR, '**', FACTS_FILE),
+        hive_partitioning=True,
+        schema=FACT_SCHEMA,
+        hive_schema={'map': pl.String, 'event': pl.String, 'demo_id': pl.String},
+        missing_columns='insert'
+    )
+
+def query_facts(output_dir, players=None, buy_types=None, sites=None, sides=None, start_date=None, end_date=None,
+                maps=None, events=None, demos=None, columns=None):
+    """
+    Fact rows matching every given filter (each a value or a list of values; dates are inclusive)
+    columns defaults to every column but the trajectory vectors.
+    Map, event and demo filters only read the matching partitions; the rest are pushed down to the
+    Parquet reader, which skips row groups by their statistics
+    """
+    # Partition values are stored directory-safe
+    partitions = [(col, [_partition_value(value) for value in _one_or_many(values)])
+                  for col, values in [('map', maps), ('event', events), ('demo_id', demos)] if values is not None]
+    filters = partitions + [
+        (col, _one_or_many(values))
+        for col, values in [('name', players), ('buy_type', buy_types), ('site', sites), ('side', sides)]
+        if values is not None
+    ]
+    facts = scan_facts(output_dir)
+    for col, values in filters:
+        facts = facts.filter(pl.col(col).is_in(values))
+    if start_date is not None:
+        facts = facts.filter(pl.col('date') >= start_date)
+    if end_date is not None:
+        facts = facts.filter(pl.col('date') <= end_date)
+    if columns is None:
+        columns = [column for column in facts.collect_schema().names() if column != 'trajectory']
+    facts = facts.select(columns)
+    return facts.collect()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the player-round fact tables of an output directory")
+    parser.add_argument('output_dir', help="extractor output directory (the one holding facts/)")
+    parser.add_argument('--player', nargs='+')
+    parser.add_argument('--buy-type', nargs='+', choices=['pistol', 'eco', 'light_buy', 'full_buy'])
+    parser.add_argument('--site', nargs='+')
+    parser.add_argument('--side', nargs='+', choices=['ct', 't'])
+    parser.add_argument('--map', nargs='+')
+    parser.add_argument('--event', nargs='+')
+    parser.add_argument('--demo', nargs='+', help="demo ids")
+    parser.add_argument('--from', dest='start_date', type=date.fromisoformat, help="first demo date (YYYY-MM-DD)")
+    parser.add_argument('--to', dest='end_date', type=date.fromisoformat, help="last demo date (YYYY-MM-DD)")
+    parser.add_argument('--output', help="write the matching rows to this .parquet or .csv file")
+    args = parser.parse_args(argv)
+
+    facts = query_facts(args.output_dir, players=args.player, buy_types=args.buy_type, sites=args.site,
+                        sides=args.side, start_date=args.start_date, end_date=args.end_date, maps=args.map,
+                        events=args.event, demos=args.demo)
+    if args.output:
+        if args.output.endswith('.csv'):
+            facts.write_csv(args.output)
+        else:
+            facts.write_parquet(args.output)
+        print(f"💾 {len(facts)} rows saved to: {args.output}")
+    else:
+        with pl.Config(tbl_rows=20):
+            print(facts)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
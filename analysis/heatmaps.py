@@ -0,0 +1,82 @@
+"""
+Position heatmaps
+Every alive tick is binned into a fixed grid laid over the map's radar image (see "radar" in
+analysis/maps/<map>.json) and counted per (side, site, buy type). Counts are whole ticks kept as sparse
+{cell: ticks} maps, so heatmaps of rounds, demos and corpora are summed by adding counts, and the
+front end always draws the same cells x cells grid however many rounds went into it.
+Cells are numbered row by row from the radar's top-left corner: cell = row * cells + col.
+"""
+
+import numpy as np
+import polars as pl
+
+from transitions import coordinate_columns, TICKRATE
+
+# Cells per side of the radar grid (the extractor counts heatmaps on this grid, see COUNT_HEATMAPS)
+HEATMAP_CELLS = 128
+
+def radar_cells(x, y, radar, cells=HEATMAP_CELLS):
+    """Grid cell of each world position and whether it lies on the radar image"""
+    cell_size = radar['size'] / cells
+    col = np.floor((np.asarray(x, dtype=np.float64) - radar['pos_x']) / radar['scale'] / cell_size).astype(np.int64)
+    row = np.floor((radar['pos_y'] - np.asarray(y, dtype=np.float64)) / radar['scale'] / cell_size).astype(np.int64)
+    on_radar = (col >= 0) & (col < cells) & (row >= 0) & (row < cells)
+    return row * cells + col, on_radar
+
+def heatmap_grid(zone_map, cells=HEATMAP_CELLS, tickrate=TICKRATE):
+    """
+    Description of the grid stored with the counts; counts on different grids cannot be added
+    The tickrate is part of the grid: a tick of a 128 tick demo is half the time of one of a 64 tick demo.
+    """
+    return {'map': zone_map.map_name, 'cells': cells, 'radar': zone_map.radar, 'tickrate': tickrate}
+
+def occupancy_counts(ticks_df, buy_types, zone_map, sites, cells=HEATMAP_CELLS):
+    """
+    Ticks spent in every grid cell by every (side, site, buy type)
+    ticks_df holds the alive ticks of the extracted players (side in a '_side' column), buy_types one
+    (round_num, name, buy_type) row per player-round; players without a buy type are not counted.
+    Only positions inside one of `sites` are counted. Returns {(side, site, buy_type): {cell: ticks}}
+    """
+    x_col, y_col, z_col = coordinate_columns(ticks_df.columns)
+    ticks = (
+        ticks_df.lazy()
+        .filter(pl.col('health') > 0)
+        # Same coordinate validation as the journeys (not 0,0,0)
+        .filter(~((pl.col(x_col) == 0) & (pl.col(y_col) == 0) & (pl.col(z_col) == 0)))
+        # Lean ticks keep names as categoricals
+        .join(buy_types.lazy().select('round_num', pl.col('name').cast(ticks_df.schema['name']), 'buy_type'),
+              on=['round_num', 'name'], how='inner')
+        .select('_side', 'buy_type', x_col, y_col)
+        .collect()
+    )
+    x, y = ticks[x_col].to_numpy(), ticks[y_col].to_numpy()
+    site_names = list(zone_map.sites)
+    site_codes = zone_map.site_codes(x, y)
+    cell, on_radar = radar_cells(x, y, zone_map.radar, cells)
+    keep = on_radar & np.isin(site_codes, [site_names.index(site) + 1 for site in sites])
+    counts = (
+        ticks.select('_side', 'buy_type')
+        .with_columns(site=pl.Series(site_codes), cell=pl.Series(cell))
+        .filter(pl.Series(keep))
+        .group_by('_side', 'site', 'buy_type', 'cell')
+        .len()
+        .sort('cell')
+    )
+    heatmaps = {}
+    for side, site, buy_type, cell, ticks_in_cell in counts.iter_rows():
+        heatmaps.setdefault((side, site_names[site - 1], buy_type), {})[cell] = ticks_in_cell
+    return heatmaps
+
+def add_counts(target, counts):
+    """Add {cell: ticks} counts into target in place"""
+    for cell, ticks in counts.items():
+        target[cell] = target.get(cell, 0) + ticks
+    return target
+
+def to_sparse(counts):
+    """{cell: ticks} as parallel sorted 'cells' / 'ticks' lists (the stored form)"""
+    cells = sorted(counts)
+    return {'cells': cells, 'ticks': [counts[cell] for cell in cells]}
+
+def from_sparse(sparse):
+    return dict(zip(sparse['cells'], sparse['ticks']))
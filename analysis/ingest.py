@@ -0,0 +1,394 @@
+"""
+CS2 Demo Analysis - Ingestion Daemon
+Watches a demos directory and extracts every new (or replaced) .dem file shortly after it lands:
+- a file is only picked up once its size and modification time have not changed for --settle seconds,
+  so demos that are still being copied or downloaded are left alone
+- settled demos go onto a bounded asyncio queue served by --workers extraction processes (batch.process_demo)
+- every demo is extracted into a staging directory inside the output directory and then published with
+  atomic renames (shards first, manifest last), followed by the corpus state, index.json and aggregate.json,
+  so the Next.js pages never read a half-written file
+- a demo that fails is retried RETRIES times with a doubling delay (RETRY_SECONDS, then twice that, ...);
+  after that only a change to its file brings it back
+- a demo whose id another file in the watched directory would also get (see batch.find_demos) is reported as
+  failed and left alone until the clash is gone; a file that was already being tracked keeps its id
+- on SIGINT/SIGTERM queued demos are dropped (the next start picks them up again) while the demos
+  already being extracted are finished and published before the daemon exits
+Queue depth, in-flight demos and per-demo latency (first seen -> published, split into settle, queue,
+extract and publish time) are written to <output_dir>/ingest.metrics.json on every scan.
+
+Usage:
+    python analysis/ingest.py Notebooks_Demos/demos --output-dir web_app/public/data --workers 2
+    python analysis/ingest.py Notebooks_Demos/demos --once    # extract what is there, then exit
+"""
+
+import os
+import sys
+import time
+import shutil
+import signal
+import asyncio
+import argparse
+import functools
+import multiprocessing
+from collections import deque
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
+from batch import find_demos, find_demo_paths, demo_id_clashes, process_demo, corpus_state_paths, add_extraction_arguments, extraction_options, \
+    write_aggregate
+from aggregates import load_state, save_state, update_corpus, rebuild_corpus
+from shards import MANIFEST_FILE, update_index, write_json
+
+STAGING_DIR = '.ingest-staging'
+METRICS_FILE = 'ingest.metrics.json'
+
+POLL_INTERVAL = 2.0     # seconds between directory scans
+SETTLE_SECONDS = 10.0   # a demo must be unchanged this long before it is extracted
+QUEUE_SIZE = 16         # settled demos waiting for a worker; the rest wait in the watcher
+RECENT_DEMOS = 50       # per-demo latencies kept in the metrics file
+RETRIES = 3             # extra attempts for a demo that failed, as long as its file does not change
+RETRY_SECONDS = 30.0    # delay before the first retry; doubled for every further one
+
+def file_signature(path):
+    """(size, mtime) of a file, or None when it is gone"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+def publish(staging_dir, output_dir):
+    """
+    Move a staged extraction into the output directory; returns the number of files published
+    Every file is renamed into place on its own (atomic within one filesystem). Manifests go last, so a
+    manifest only ever references shards that are already there; shards of a demo's previous extraction
+    that the new one does not have are removed afterwards.
+    """
+    files = []
+    for root, _, names in os.walk(staging_dir):
+        files.extend(os.path.relpath(os.path.join(root, name), staging_dir) for name in names)
+    files.sort(key=lambda rel: (os.path.basename(rel) == MANIFEST_FILE, rel))
+    for rel in files:
+        target = os.path.join(output_dir, rel)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(os.path.join(staging_dir, rel), target)
+
+    published = set(files)
+    demo_dirs = {rel.split(os.sep)[0] for rel in files if rel.split(os.sep)[1:] == [MANIFEST_FILE]}
+    for demo_dir in demo_dirs:
+        for root, _, names in os.walk(os.path.join(output_dir, demo_dir)):
+            for name in names:
+                path = os.path.join(root, name)
+                if os.path.relpath(path, output_dir) not in published:
+                    os.remove(path)
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    return len(files)
+
+def _timestamp(seconds):
+    return datetime.fromtimestamp(seconds, timezone.utc).isoformat(timespec='seconds')
+
+class Ingestor:
+    """Watcher, queue and workers of the ingestion daemon, and the metrics they report"""
+
+    def __init__(self, watch_dir, output_dir, cache_dir, workers, extract_options=None, corpus_path=None,
+                 settle=SETTLE_SECONDS, poll_interval=POLL_INTERVAL, queue_size=QUEUE_SIZE, once=False, force=False):
+        self.watch_dir = watch_dir
+        self.output_dir = output_dir
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.extract_options = extract_options or {}
+        self.corpus_path = corpus_path or os.path.join(output_dir, 'corpus.stats.json')
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self.once = once
+
+        # Demos (ids) already in the corpus are only extracted again when their file changes
+        self.known = set(load_state(self.corpus_path)['demos'])
+        self.skip_known = not force
+        self.seen = {}        # path -> signature of the file when it was queued
+        self.pending = {}     # path -> settling (or waiting for queue room) file
+        self.jobs = {}        # path -> queued or running demo
+        self.failures = {}    # path -> last failure of a demo that has not succeeded since
+        self.recent = deque(maxlen=RECENT_DEMOS)
+        self.processed = 0
+        self.failed = 0
+        self.started = time.time()
+        self.queue = None
+        self.publish_lock = None
+        self.stopping = None
+
+    def scan(self, now):
+        """Track new and changed demos; returns the paths that have settled"""
+        ready = []
+        demos = dict(find_demo_paths([self.watch_dir]))
+        clashing = self.check_clashes(demos)
+        for path, demo_id in demos.items():
+            if path in clashing:
+                continue
+            failure = self.failures.get(path)
+            if failure and failure['retry_at'] is not None and now >= failure['retry_at']:
+                # Due for a retry: settles again like a new file
+                failure['retry_at'] = None
+                self.seen.pop(path, None)
+            signature = file_signature(path)
+            if signature is None or signature[0] == 0 or self.seen.get(path) == signature or path in self.jobs:
+                continue
+            if self.skip_known and path not in self.seen and path not in self.failures and demo_id in self.known:
+                # Extracted by an earlier run; only a change to the file brings it back
+                self.seen[path] = signature
+                continue
+            pending = self.pending.get(path)
+            if pending is None or pending['signature'] != signature:
+                self.pending[path] = {
+                    'demo_id': demo_id,
+                    'signature': signature,
+                    'seen': pending['seen'] if pending else now,
+                    'seen_at': pending['seen_at'] if pending else time.time(),
+                    'changed': now
+                }
+            elif now - pending['changed'] >= self.settle:
+                ready.append(path)
+        for path in set(self.pending) - set(demos):
+            del self.pending[path]
+        return ready
+
+    def check_clashes(self, demos):
+        """
+        Record the demos that would share an id with another file as failures; returns their paths
+        A tracked (queued, running or already extracted) demo keeps its id and only the newcomers are refused.
+        A refused demo is picked up like a new file once the clash is gone.
+        """
+        clashing = set()
+        for demo_id, paths in demo_id_clashes(demos.items()).items():
+            tracked = [path for path in paths if path in self.seen or path in self.jobs]
+            for path in paths:
+                if path in tracked:
+                    continue
+                clashing.add(path)
+                self.pending.pop(path, None)
+                if self.failures.get(path, {}).get('clash') == demo_id:
+                    continue
+                others = ', '.join(other for other in paths if other != path)
+                self.failures[path] = {
+                    'demo': path,
+                    'error': f"ValueError: {others} would also get the demo id '{demo_id}'",
+                    'signature': None,
+                    'attempts': 0,
+                    'retry_at': None,
+                    'clash': demo_id
+                }
+                print(f"❌ {path}: {others} would also get the demo id '{demo_id}'; rename one of them")
+        for path in [path for path, failure in self.failures.items() if failure.get('clash') and path not in clashing]:
+            del self.failures[path]
+        return clashing
+
+    def enqueue(self, paths, now):
+        """Queue settled demos while there is room; the others are retried on the next scan"""
+        for path in paths:
+            pending = self.pending[path]
+            job = {'demo': path, 'demo_id': pending['demo_id'], 'seen': pending['seen'], 'seen_at': pending['seen_at'],
+                   'queued': now, 'signature': pending['signature']}
+            try:
+                self.queue.put_nowait(job)
+            except asyncio.QueueFull:
+                break
+            del self.pending[path]
+            self.seen[path] = pending['signature']
+            self.jobs[path] = job
+
+    def drop_queued(self):
+        """Forget demos that are queued but not started, so the next scan (or start) finds them again"""
+        while not self.queue.empty():
+            job = self.queue.get_nowait()
+            del self.jobs[job['demo']]
+            self.seen.pop(job['demo'], None)
+            self.queue.task_done()
+
+    async def worker(self, executor):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self.queue.get()
+            try:
+                await self.process(loop, executor, job)
+            finally:
+                del self.jobs[job['demo']]
+                self.queue.task_done()
+
+    async def process(self, loop, executor, job):
+        """Extract one demo into its staging directory on the process pool, then publish it"""
+        path, name = job['demo'], job['demo_id']
+        staging_dir = os.path.join(self.output_dir, STAGING_DIR, name)
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        job['started'] = time.monotonic()
+        try:
+            result = await loop.run_in_executor(executor, functools.partial(
+                process_demo, path, staging_dir, self.cache_dir, demo_id=name, **self.extract_options
+            ))
+            job['extracted'] = time.monotonic()
+            async with self.publish_lock:
+                await asyncio.to_thread(self.publish_result, result, staging_dir)
+        except Exception as e:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            self.failed += 1
+            previous = self.failures.get(path)
+            # Attempts count again from one once the file has changed
+            attempts = previous['attempts'] + 1 if previous and previous['signature'] == job['signature'] else 1
+            retry_in = RETRY_SECONDS * 2 ** (attempts - 1) if attempts <= RETRIES else None
+            self.failures[path] = {
+                'demo': path,
+                'error': f"{type(e).__name__}: {e}",
+                'signature': job['signature'],
+                'attempts': attempts,
+                'retry_at': time.monotonic() + retry_in if retry_in is not None else None
+            }
+            self.record(job, 'failed', error=self.failures[path]['error'], attempts=attempts, retry_in_seconds=retry_in)
+            retry = f"retrying in {retry_in:g}s" if retry_in is not None else "not retried until the file changes"
+            print(f"❌ {name}: {type(e).__name__}: {e} ({retry})")
+            return
+        self.processed += 1
+        self.failures.pop(path, None)
+        latency = self.record(job, 'published', rounds=result['total_rounds'])
+        print(f"✅ {name}: {result['total_rounds']} rounds, published {latency['total_seconds']}s after it appeared")
+
+    def publish_result(self, result, staging_dir):
+        """Publish a staged demo, then merge it into the corpus and rewrite index.json and aggregate.json"""
+        publish(staging_dir, self.output_dir)
+        demo_id = result['demo_id']
+        if demo_id in self.known:
+            # A re-extracted demo replaces its old counts, so rebuild the corpus from every per-demo state
+            corpus = rebuild_corpus(corpus_state_paths(self.output_dir, self.corpus_path))
+            save_state(corpus, self.corpus_path)
+        else:
+            corpus = update_corpus(self.corpus_path, [result['aggregate_state']])
+            self.known.add(demo_id)
+        update_index(self.output_dir, [result['index_entry']])
+        write_aggregate(corpus, list(self.failures.values()), self.output_dir)
+
+    def record(self, job, status, **fields):
+        """Per-demo latency entry for the metrics"""
+        now = time.monotonic()
+        started = job.get('started', now)
+        extracted = job.get('extracted', now)
+        entry = {
+            'demo_id': job['demo_id'],
+            'status': status,
+            'seen_at': _timestamp(job['seen_at']),
+            'finished_at': _timestamp(time.time()),
+            'total_seconds': round(now - job['seen'], 2),
+            'settle_seconds': round(job['queued'] - job['seen'], 2),
+            'queue_seconds': round(started - job['queued'], 2),
+            'extract_seconds': round(extracted - started, 2),
+            'publish_seconds': round(now - extracted, 2),
+            **fields
+        }
+        self.recent.appendleft(entry)
+        return entry
+
+    def metrics(self, now):
+        latencies = sorted(entry['total_seconds'] for entry in self.recent if entry['status'] == 'published')
+        running = [job for job in self.jobs.values() if 'started' in job]
+        return {
+            'updated_at': _timestamp(time.time()),
+            'started_at': _timestamp(self.started),
+            'watch_dir': os.path.abspath(self.watch_dir),
+            'workers': self.workers,
+            'queue_depth': self.queue.qsize(),
+            'settling': len(self.pending),
+            'in_flight': [{'demo_id': job['demo_id'],
+                           'running_seconds': round(now - job['started'], 2)} for job in running],
+            'processed': self.processed,
+            'failed': self.failed,
+            'latency_seconds': {
+                'demos': len(latencies),
+                'median': latencies[len(latencies) // 2] if latencies else None,
+                'max': latencies[-1] if latencies else None
+            },
+            'recent': list(self.recent)
+        }
+
+    def write_metrics(self, now):
+        write_json(self.metrics(now), os.path.join(self.output_dir, METRICS_FILE))
+
+    async def run(self):
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self.publish_lock = asyncio.Lock()
+        self.stopping = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                asyncio.get_running_loop().add_signal_handler(sig, self.stopping.set)
+            except (NotImplementedError, RuntimeError):
+                # Windows: Ctrl+C still ends the run through KeyboardInterrupt
+                pass
+        # Left over from an interrupted run
+        shutil.rmtree(os.path.join(self.output_dir, STAGING_DIR), ignore_errors=True)
+        # Give every worker its own slice of the machine instead of N full-size Polars thread pools
+        os.environ['POLARS_MAX_THREADS'] = str(max(1, (os.cpu_count() or 1) // self.workers))
+        # Spawned (not forked) workers: forking after Polars has started its thread pool can deadlock
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as executor:
+            workers = [asyncio.create_task(self.worker(executor)) for _ in range(self.workers)]
+            try:
+                while True:
+                    now = time.monotonic()
+                    self.enqueue(self.scan(now), now)
+                    self.write_metrics(now)
+                    if self.once and not self.pending and not self.jobs:
+                        break
+                    try:
+                        await asyncio.wait_for(self.stopping.wait(), self.poll_interval)
+                    except asyncio.TimeoutError:
+                        continue
+                    self.drop_queued()
+                    print(f"\nStopping: waiting for {len(self.jobs)} demos being extracted to be published; "
+                          f"queued demos are picked up again on the next start")
+                    await self.queue.join()
+                    break
+            finally:
+                for task in workers:
+                    task.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+        return 1 if self.failures else 0
+
+def main(argv=None):
+    from demo_cache import CACHE_DIR
+
+    parser = argparse.ArgumentParser(description="Watch a demos directory and extract new demos as they arrive")
+    parser.add_argument('watch_dir', help="directory watched (recursively) for .dem files")
+    parser.add_argument('--output-dir', default=os.path.join('web_app', 'public', 'data'),
+                        help="directory for index.json, per-demo shards, aggregate.json and ingest.metrics.json")
+    parser.add_argument('--workers', type=int, default=2, help="extraction processes")
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help="parsed-demo Parquet cache directory")
+    parser.add_argument('--settle', type=float, default=SETTLE_SECONDS,
+                        help="seconds a demo must stay unchanged before it is extracted")
+    parser.add_argument('--poll-interval', type=float, default=POLL_INTERVAL, help="seconds between scans")
+    parser.add_argument('--queue-size', type=int, default=QUEUE_SIZE, help="settled demos waiting for a worker")
+    parser.add_argument('--corpus', help="corpus aggregate state (default: <output-dir>/corpus.stats.json)")
+    parser.add_argument('--force', action='store_true', help="re-extract demos already in the corpus on startup")
+    parser.add_argument('--once', action='store_true', help="exit once the demos already there are published")
+    add_extraction_arguments(parser)
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.watch_dir):
+        print(f"Not a directory: {args.watch_dir}")
+        return 1
+    os.makedirs(args.output_dir, exist_ok=True)
+    ingestor = Ingestor(args.watch_dir, args.output_dir, args.cache_dir, max(1, args.workers),
+                        extract_options=extraction_options(args), corpus_path=args.corpus, settle=args.settle,
+                        poll_interval=args.poll_interval, queue_size=max(1, args.queue_size), once=args.once,
+                        force=args.force)
+    try:
+        # Checked once up front; later clashes are reported by the running daemon (see Ingestor.check_clashes)
+        find_demos([args.watch_dir])
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    print(f"👀 Watching {os.path.abspath(args.watch_dir)} with {ingestor.workers} workers "
+          f"(metrics: {os.path.join(args.output_dir, METRICS_FILE)})")
+    try:
+        return asyncio.run(ingestor.run())
+    except KeyboardInterrupt:
+        print("\nStopped")
+        return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+"""
+Pipeline instrumentation
+Stage spans record wall time, row counts and the change in resident memory per pipeline stage; repeated
+spans of the same stage (e.g. once per round) are summed; spans of rounds processed in parallel overlap,
+so their seconds (and memory changes) can add up to more than the run's. Peak memory is a process-wide
+high-water mark that never goes down, so it is reported once per run rather than per stage.
+Diagnostics that used to be printed are kept as notes, and everything is written as a JSON run report.
+An optional cProfile/pyinstrument profiler can be attached. A disabled Instrumentation hands out one
+shared no-op span, so the hooks cost next to nothing.
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+from datetime import datetime, timezone
+
+PROFILERS = ['cprofile', 'pyinstrument']
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None where it cannot be read)"""
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        memory = psutil.Process().memory_info()
+        return round(getattr(memory, 'peak_wset', memory.rss) / 2**20, 1)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return round(peak / (2**20 if sys.platform == 'darwin' else 2**10), 1)
+
+def current_rss_mb():
+    """Current resident set size of this process in MB (None where it cannot be read)"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf('SC_PAGE_SIZE') / 2**20, 1)
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return round(psutil.Process().memory_info().rss / 2**20, 1)
+
+class _NullSpan:
+    """Shared no-op span handed out when instrumentation is disabled; setting rows is ignored"""
+
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+NULL_SPAN = _NullSpan()
+
+class _Span:
+    """Times one execution of a stage and adds it to the stage totals on exit"""
+
+    __slots__ = ('instrumentation', 'name', 'rows', 'start', 'start_rss')
+
+    def __init__(self, instrumentation, name):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.rows = None
+
+    def __enter__(self):
+        self.start_rss = current_rss_mb()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        rss = current_rss_mb()
+        # Spans may end on several threads at once
+        with self.instrumentation.lock:
+            stage = self.instrumentation.stages.setdefault(self.name, {
+                'calls': 0, 'seconds': 0.0, 'rows': None, 'rss_mb': None, 'rss_change_mb': 0.0
+            })
+            stage['calls'] += 1
+            stage['seconds'] += seconds
+            if self.rows is not None:
+                stage['rows'] = (stage['rows'] or 0) + self.rows
+            if rss is not None and self.start_rss is not None:
+                # Largest resident size seen at the end of the stage, and what the stage kept (or freed)
+                stage['rss_mb'] = max(stage['rss_mb'] or 0, rss)
+                stage['rss_change_mb'] += rss - self.start_rss
+        return False
+
+class Instrumentation:
+    """Collects stage spans, notes and warnings for one run"""
+
+    def __init__(self, enabled=True, profiler=None):
+        if profiler is not None and profiler not in PROFILERS:
+            raise ValueError(f"Unknown profiler {profiler!r}, expected one of {PROFILERS}")
+        self.enabled = enabled
+        self.profiler = profiler if enabled else None
+        self.stages = {}
+        self.notes = {}
+        self.warnings = []
+        self.lock = threading.Lock()
+        self.started_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        self._start = time.perf_counter()
+        self._profiler = None
+
+    def span(self, name):
+        """Context manager timing one execution of a pipeline stage; set `.rows` on it to count rows"""
+        if not self.enabled:
+            return NULL_SPAN
+        return _Span(self, name)
+
+    def note(self, key, value):
+        """Keep a diagnostic value (columns found, filter used, ...) for the run report"""
+        if self.enabled:
+            self.notes[key] = value
+
+    def warn(self, message):
+        """Warnings are always printed, and kept for the report"""
+        print(f"Warning: {message}")
+        if self.enabled:
+            self.warnings.append(message)
+
+    def start_profiler(self):
+        if self.profiler == 'cprofile':
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        elif self.profiler == 'pyinstrument':
+            from pyinstrument import Profiler
+            self._profiler = Profiler()
+            self._profiler.start()
+
+    def stop_profiler(self, base_path):
+        """Stop the profiler and save its output as <base_path>.prof or <base_path>.html; returns the path"""
+        if self._profiler is None:
+            return None
+        if self.profiler == 'cprofile':
+            self._profiler.disable()
+            path = f'{base_path}.prof'
+            self._profiler.dump_stats(path)
+        else:
+            self._profiler.stop()
+            path = f'{base_path}.html'
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(self._profiler.output_html())
+        self._profiler = None
+        return path
+
+    def report(self, metadata=None):
+        """The run report as a JSON-serializable dict"""
+        total = time.perf_counter() - self._start
+        stages = {}
+        for name, stage in self.stages.items():
+            stages[name] = dict(
+                stage,
+                seconds=round(stage['seconds'], 6),
+                share=round(stage['seconds'] / total, 4) if total > 0 else None,
+                rss_change_mb=round(stage['rss_change_mb'], 1),
+                rows_per_sec=round(stage['rows'] / stage['seconds']) if stage['rows'] and stage['seconds'] > 0 else None
+            )
+        return {
+            'started_at': self.started_at,
+            'total_seconds': round(total, 6),
+            'peak_rss_mb': peak_rss_mb(),
+            'metadata': metadata or {},
+            'stages': stages,
+            'notes': self.notes,
+            'warnings': self.warnings
+        }
+
+    def write_report(self, path, metadata=None):
+        """Stop the profiler (its output goes next to the report) and write the JSON run report"""
+        base_path = path[:-len('.json')] if path.endswith('.json') else path
+        profile_path = self.stop_profiler(base_path)
+        report = self.report(metadata)
+        report['profile'] = profile_path
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+        return path
+
+NULL_INSTRUMENTATION = Instrumentation(enabled=False)
@@ -0,0 +1,107 @@
+"""
+Columnar binary journeys
+Journey points are stored per round as typed columns instead of JSON objects, so the front end can
+view them directly as Int32Array/Float32Array/Uint8Array without parsing every point.
+
+Layout of rounds/<round>.journeys.bin (all numbers little-endian):
+    bytes 0-3    magic b'CSJ1'
+    bytes 4-7    uint32 header length H
+    bytes 8-8+H  UTF-8 JSON header, space padded so the data section starts on an 8 byte boundary
+    data         tick   int32[N]    game tick of each point
+                 x      float32[N]
+                 y      float32[N]
+                 z      float32[N]
+                 area   uint8[N]    index into the demo's area dictionary (manifest 'journey_areas')
+
+Header: {"version", "tick_rate", "count": N, "players": [{"name", "site", "start", "count"}],
+"columns": {name: byte offset}}
+Header players are in the order of the round shard's players (a player can appear once per site).
+The points of a player are rows start..start+count of every column, in tick order. Offsets are
+relative to the data section. The first point of each player is the entry point (is_entry);
+time is tick / tick_rate.
+"""
+
+import json
+import struct
+import numpy as np
+
+MAGIC = b'CSJ1'
+FORMAT_VERSION = 1
+TICK_RATE = 64
+
+# Column order and dtypes in the data section; 4 byte columns first keeps every view aligned
+COLUMNS = [('tick', '<i4'), ('x', '<f4'), ('y', '<f4'), ('z', '<f4'), ('area', 'u1')]
+
+class AreaDictionary:
+    """Append-only area name -> uint8 code mapping shared by all rounds of a demo"""
+
+    def __init__(self, areas=None):
+        self.areas = list(areas or [])
+        self._codes = {area: code for code, area in enumerate(self.areas)}
+
+    def code(self, area):
+        if area not in self._codes:
+            if len(self.areas) > 255:
+                raise ValueError("More than 256 distinct journey areas do not fit a uint8 code")
+            self._codes[area] = len(self.areas)
+            self.areas.append(area)
+        return self._codes[area]
+
+def encode_round(players, areas):
+    """Encode the journeys of one round's players; returns the file contents as bytes"""
+    header_players, columns = [], {name: [] for name, _ in COLUMNS}
+    start = 0
+    for player in players:
+        journey = player['journey']
+        header_players.append({'name': player['name'], 'site': player.get('site'), 'start': start,
+                               'count': len(journey)})
+        start += len(journey)
+        for point in journey:
+            columns['tick'].append(point['tick'])
+            columns['x'].append(point['x'])
+            columns['y'].append(point['y'])
+            columns['z'].append(point['z'])
+            columns['area'].append(areas.code(point['area']))
+
+    offsets, blobs, offset = {}, [], 0
+    for name, dtype in COLUMNS:
+        blob = np.asarray(columns[name], dtype=dtype).tobytes()
+        offsets[name] = offset
+        blobs.append(blob)
+        offset += len(blob)
+
+    header = json.dumps({
+        'version': FORMAT_VERSION,
+        'tick_rate': TICK_RATE,
+        'count': start,
+        'players': header_players,
+        'columns': offsets
+    }, separators=(',', ':')).encode()
+    header += b' ' * (-(len(MAGIC) + 4 + len(header)) % 8)
+    return MAGIC + struct.pack('<I', len(header)) + header + b''.join(blobs)
+
+def decode_round(data, areas):
+    """Decode a journeys file back into a list of journey points (the JSON shape), in shard player order"""
+    if data[:4] != MAGIC:
+        raise ValueError("Not a journeys file")
+    (header_len,) = struct.unpack_from('<I', data, 4)
+    header = json.loads(data[8:8 + header_len])
+    base, count = 8 + header_len, header['count']
+    columns = {
+        name: np.frombuffer(data, dtype=dtype, count=count, offset=base + header['columns'][name])
+        for name, dtype in COLUMNS
+    }
+
+    journeys = []
+    for player in header['players']:
+        rows = range(player['start'], player['start'] + player['count'])
+        journeys.append([{
+            'tick': int(columns['tick'][i]),
+            'time': round(int(columns['tick'][i]) / header['tick_rate'], 2),
+            'x': round(float(columns['x'][i]), 1),
+            'y': round(float(columns['y'][i]), 1),
+            'z': round(float(columns['z'][i]), 1),
+            'area': areas[columns['area'][i]],
+            'is_entry': i == player['start']
+        } for i in rows])
+    return journeys
@@ -0,0 +1,426 @@
+"""
+Local query server
+Serves an extractor output directory over HTTP so pages fetch only the slice they render:
+    /data/<path>                    - the output files as written (index.json, manifests, round shards,
+                                      binary journeys); point the web app's NEXT_PUBLIC_DATA_ROOT here
+    /api/demos?map=                 - demos in index.json
+    /api/rounds/<demo_id>/<round>?site=&side=&buy_type=&player=
+                                    - one round's players, filtered
+    /api/aggregate?demo=&side=&site=&area=&buy_type=&entry_point=&player=
+                                    - position stats of the corpus (or one demo) for any filter combination,
+                                      summed from the precomputed filter cube
+    /api/heatmap?demo=&side=&site=&buy_type=
+                                    - a position heatmap (buy types summed unless one is given)
+    /api/facts?player=&buy_type=&site=&side=&map=&event=&demo=&from=&to=&columns=&limit=
+                                    - player-round fact rows, read from the columnar Parquet tables
+                                      (partition pruning and predicate pushdown, see facts.py)
+    /api/similar/<demo_id>/<round>/<player>?site=&k=&buy_type=&side=&player=
+                                    - the k journeys through the same site most like the given one
+                                      (nearest trajectories, see trajectories.py), filtered
+    /api/stats                      - result cache statistics
+List filters take comma-separated values. Responses are cached in a byte-bounded LRU keyed by the
+request and the version of the files behind it (so newly published demos are picked up without a
+restart), carry a content ETag (If-None-Match gets a 304) and are gzipped for clients that accept it.
+
+Usage:
+    python analysis/query_server.py web_app/public/data --port 8765 --cache-mb 128
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import hashlib
+import argparse
+import threading
+import traceback
+from collections import OrderedDict
+from datetime import date
+from http import HTTPStatus
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs, unquote
+from aggregates import cube_position_stats
+from heatmaps import add_counts, to_sparse, from_sparse
+from facts import query_facts, FACT_SCHEMA
+from trajectories import TrajectoryIndex
+from shards import INDEX_FILE
+
+CACHE_MB = 64
+GZIP_MIN_BYTES = 1024
+CONTENT_TYPES = {'.json': 'application/json', '.bin': 'application/octet-stream'}
+
+class QueryError(Exception):
+    """A request that cannot be answered; carries the HTTP status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class ResultCache:
+    """Thread-safe LRU of encoded responses, evicting the least recently used once max_bytes is exceeded"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = self.misses = self.evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        size = entry_size(entry)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self.entries:
+                self.size -= entry_size(self.entries.pop(key))
+            self.entries[key] = entry
+            self.size += size
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= entry_size(evicted)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self.entries), 'bytes': self.size, 'max_bytes': self.max_bytes,
+                    'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+def entry_size(entry):
+    return len(entry['body']) + len(entry['gzip'] or b'')
+
+def encode_response(body, content_type):
+    """Cache entry of a response body: the body, its gzipped form (when worth it) and a content ETag"""
+    return {
+        'body': body,
+        'gzip': gzip.compress(body, compresslevel=6) if len(body) >= GZIP_MIN_BYTES else None,
+        'etag': f'"{hashlib.blake2b(body, digest_size=12).hexdigest()}"',
+        'content_type': content_type
+    }
+
+def _json_default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Not JSON serializable: {type(value).__name__}")
+
+def json_body(obj):
+    return json.dumps(obj, separators=(',', ':'), default=_json_default).encode()
+
+def accepts_gzip(accept_encoding):
+    """Whether an Accept-Encoding header allows gzip: listed as gzip (or *, when gzip is not listed) with q > 0"""
+    qualities = {}
+    for coding in accept_encoding.split(','):
+        name, *params = [part.strip() for part in coding.split(';')]
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name:
+            qualities[name.lower()] = q
+    return qualities.get('gzip', qualities.get('*', 0.0)) > 0
+
+def file_version(path):
+    """(size, mtime) of a file, or None when it does not exist; part of the cache key of results read from it"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+def _values(query, name):
+    """Comma-separated values of a query parameter, or None when it is absent or 'all'"""
+    values = [value for raw in query.get(name, []) for value in raw.split(',') if value]
+    return None if not values or values == ['all'] else values
+
+class QueryService:
+    """Answers requests over one output directory; every answer goes through the result cache"""
+
+    def __init__(self, data_dir, cache_bytes=CACHE_MB << 20):
+        self.data_dir = os.path.abspath(data_dir)
+        self.cache = ResultCache(cache_bytes)
+        self.routes = {
+            'demos': self.demos,
+            'rounds': self.round_players,
+            'aggregate': self.aggregate,
+            'heatmap': self.heatmap,
+            'facts': self.facts,
+            'similar': self.similar
+        }
+        # The trajectory index of the current data version, loaded on first use
+        self._trajectories = (None, None)
+        self._trajectories_lock = threading.Lock()
+
+    def data_path(self, rel):
+        """
+        Path of a file inside the output directory; requests cannot leave it or read dot-prefixed files
+        and directories (e.g. the ingestion daemon's .ingest-staging)
+        """
+        path = os.path.abspath(os.path.join(self.data_dir, unquote(rel)))
+        hidden = any(part.startswith('.') for part in os.path.relpath(path, self.data_dir).split(os.sep))
+        if os.path.commonpath([path, self.data_dir]) != self.data_dir or hidden or not os.path.isfile(path):
+            raise QueryError(HTTPStatus.NOT_FOUND, f"No such file: {rel}")
+        return path
+
+    def data_version(self):
+        # Every publish (extract_data, batch, ingest) rewrites index.json
+        return file_version(os.path.join(self.data_dir, INDEX_FILE)), \
+            file_version(os.path.join(self.data_dir, 'aggregate.json'))
+
+    def respond(self, path, query):
+        """Cache entry answering a request path and its parsed query"""
+        parts = [part for part in path.split('/') if part]
+        if parts[:1] == ['data'] and len(parts) > 1:
+            rel = '/'.join(parts[1:])
+            content_type = CONTENT_TYPES.get(os.path.splitext(rel)[1])
+            if content_type is None:
+                raise QueryError(HTTPStatus.NOT_FOUND, f"No such file: {rel}")
+            file_path = self.data_path(rel)
+            key = ('data', rel, file_version(file_path))
+            entry = self.cache.get(key)
+            if entry is None:
+                with open(file_path, 'rb') as f:
+                    entry = encode_response(f.read(), content_type)
+                self.cache.put(key, entry)
+            return entry
+        if parts == ['api', 'stats']:
+            return encode_response(json_body(self.cache.stats()), CONTENT_TYPES['.json'])
+        if len(parts) < 2 or parts[0] != 'api' or parts[1] not in self.routes:
+            raise QueryError(HTTPStatus.NOT_FOUND, f"Unknown endpoint: {path}")
+
+        key = (tuple(parts), tuple(sorted((name, tuple(values)) for name, values in query.items())),
+               self.data_version())
+        entry = self.cache.get(key)
+        if entry is None:
+            entry = encode_response(json_body(self.routes[parts[1]](parts[2:], query)), CONTENT_TYPES['.json'])
+            self.cache.put(key, entry)
+        return entry
+
+    def _load(self, rel):
+        with open(self.data_path(rel)) as f:
+            return json.load(f)
+
+    def _manifest(self, demo_id):
+        entry = next((d for d in self._load(INDEX_FILE)['demos'] if d['demo_id'] == demo_id), None)
+        if entry is None:
+            raise QueryError(HTTPStatus.NOT_FOUND, f"Unknown demo: {demo_id}")
+        return self._load(entry['manifest'])
+
+    def _aggregate(self, query):
+        """The corpus aggregate, or one demo's aggregate with ?demo="""
+        demo = _values(query, 'demo')
+        if demo is None:
+            return self._load('aggregate.json')
+        if len(demo) != 1:
+            raise QueryError(HTTPStatus.BAD_REQUEST, "demo takes a single demo id")
+        return self._manifest(demo[0])['aggregate']
+
+    def demos(self, args, query):
+        maps = _values(query, 'map')
+        return [d for d in self._load(INDEX_FILE)['demos'] if maps is None or d['map'] in maps]
+
+    def round_players(self, args, query):
+        if len(args) != 2 or not args[1].isdigit():
+            raise QueryError(HTTPStatus.BAD_REQUEST, "Expected /api/rounds/<demo_id>/<round>")
+        manifest = self._manifest(args[0])
+        entry = next((r for r in manifest['rounds'] if r['round_num'] == int(args[1])), None)
+        if entry is None:
+            return {'round_num': int(args[1]), 'players': []}
+        round_data = self._load(f"{args[0]}/{entry['shard']}")
+        filters = [(field, _values(query, name)) for field, name in
+                   [('site', 'site'), ('side', 'side'), ('buy_type', 'buy_type'), ('name', 'player')]]
+        # Binary journeys are matched to players by position, so their index travels with the filtered players
+        players = [dict(player, journey_index=i) if 'journeys' in round_data else player
+                   for i, player in enumerate(round_data['players'])]
+        round_data['players'] = [player for player in players
+                                 if all(values is None or player.get(field) in values for field, values in filters)]
+        return round_data
+
+    def aggregate(self, args, query):
+        aggregate = self._aggregate(query)
+        filters = {dimension: _values(query, dimension)
+                   for dimension in ['side', 'site', 'area', 'buy_type', 'entry_point', 'player']}
+        if aggregate.get('cube') is None:
+            if any(filters[dimension] is not None for dimension in ['area', 'buy_type', 'entry_point', 'player']):
+                raise QueryError(HTTPStatus.BAD_REQUEST, "This aggregate has no filter cube; re-extract to filter it")
+            position_stats = [stat for stat in aggregate['position_stats']
+                              if all(filters[field] is None or stat.get(field) in filters[field]
+                                     for field in ['side', 'site'])]
+        else:
+            position_stats = cube_position_stats(aggregate['cube'], aggregate['total_rounds'], filters)
+        return {'total_rounds': aggregate['total_rounds'], 'position_stats': position_stats}
+
+    def heatmap(self, args, query):
+        heatmaps = self._aggregate(query).get('heatmaps')
+        if heatmaps is None:
+            raise QueryError(HTTPStatus.NOT_FOUND, "No heatmaps in this aggregate")
+        sides, sites, buy_types = (_values(query, name) for name in ['side', 'site', 'buy_type'])
+        counts = {}
+        for side, by_site in heatmaps['maps'].items():
+            for site, by_buy_type in by_site.items():
+                for buy_type, sparse in by_buy_type.items():
+                    if all(values is None or value in values
+                           for value, values in [(side, sides), (site, sites), (buy_type, buy_types)]):
+                        add_counts(counts, from_sparse(sparse))
+        return {'grid': heatmaps['grid'], **to_sparse(counts)}
+
+    def facts(self, args, query):
+        dates = {}
+        for name in ['from', 'to']:
+            value = _values(query, name)
+            try:
+                dates[name] = date.fromisoformat(value[0]) if value else None
+            except ValueError:
+                raise QueryError(HTTPStatus.BAD_REQUEST, f"{name} must be a YYYY-MM-DD date")
+        columns = _values(query, 'columns')
+        unknown = set(columns or []) - set(FACT_SCHEMA) - {'map', 'event', 'demo_id'}
+        if unknown:
+            raise QueryError(HTTPStatus.BAD_REQUEST, f"Unknown columns: {sorted(unknown)}")
+        limit = _values(query, 'limit')
+        if limit and not limit[0].isdigit():
+            raise QueryError(HTTPStatus.BAD_REQUEST, "limit must be a number")
+        if not os.path.isdir(os.path.join(self.data_dir, 'facts')):
+            return []
+        facts = query_facts(self.data_dir, players=_values(query, 'player'), buy_types=_values(query, 'buy_type'),
+                            sites=_values(query, 'site'), sides=_values(query, 'side'), start_date=dates['from'],
+                            end_date=dates['to'], maps=_values(query, 'map'), events=_values(query, 'event'),
+                            demos=_values(query, 'demo'), columns=columns)
+        if limit:
+            facts = facts.head(int(limit[0]))
+        return facts.to_dicts()
+
+    def trajectory_index(self):
+        version = self.data_version()
+        with self._trajectories_lock:
+            if self._trajectories[0] != version:
+                index = TrajectoryIndex.load(self.data_dir) if os.path.isdir(os.path.join(self.data_dir, 'facts')) \
+                    else None
+                self._trajectories = (version, index)
+            return self._trajectories[1]
+
+    def similar(self, args, query):
+        if len(args) != 3 or not args[1].isdigit():
+            raise QueryError(HTTPStatus.BAD_REQUEST, "Expected /api/similar/<demo_id>/<round>/<player>")
+        k = _values(query, 'k') or ['10']
+        if not k[0].isdigit():
+            raise QueryError(HTTPStatus.BAD_REQUEST, "k must be a number")
+        site = _values(query, 'site')
+        index = self.trajectory_index()
+        if index is None:
+            raise QueryError(HTTPStatus.NOT_FOUND, "No fact tables in this output directory")
+        try:
+            return index.similar(args[0], int(args[1]), unquote(args[2]), site[0] if site else None, int(k[0]),
+                                 buy_type=_values(query, 'buy_type'), side=_values(query, 'side'),
+                                 name=_values(query, 'player'))
+        except KeyError as e:
+            raise QueryError(HTTPStatus.NOT_FOUND, e.args[0])
+
+class QueryHandler(BaseHTTPRequestHandler):
+    service = None
+    server_version = 'CSDemoQuery/1.0'
+
+    def do_GET(self):
+        self.handle_request(send_body=True)
+
+    def do_HEAD(self):
+        self.handle_request(send_body=False)
+
+    def handle_request(self, send_body):
+        url = urlsplit(self.path)
+        start = time.perf_counter()
+        try:
+            entry = self.service.respond(url.path, parse_qs(url.query))
+        except QueryError as e:
+            return self.send_json_error(e.status, str(e))
+        except Exception as e:
+            # e.g. an unreadable file or a Polars error from a fact table; the client still gets an answer
+            traceback.print_exc()
+            return self.send_json_error(HTTPStatus.INTERNAL_SERVER_ERROR, f"{type(e).__name__}: {e}")
+
+        if entry['etag'] in (tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_common_headers(entry)
+            self.end_headers()
+            return
+        body = entry['body']
+        use_gzip = entry['gzip'] is not None and accepts_gzip(self.headers.get('Accept-Encoding', ''))
+        if use_gzip:
+            body = entry['gzip']
+        self.send_response(HTTPStatus.OK)
+        self.send_common_headers(entry)
+        self.send_header('Content-Type', entry['content_type'])
+        self.send_header('Content-Length', str(len(body)))
+        if use_gzip:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Server-Timing', f'query;dur={(time.perf_counter() - start) * 1000:.1f}')
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def send_common_headers(self, entry):
+        self.send_header('ETag', entry['etag'])
+        # Clients keep responses but revalidate them, which costs a 304 when nothing changed
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Expose-Headers', 'ETag, Server-Timing')
+
+    def send_json_error(self, status, message):
+        body = json_body({'error': message})
+        self.send_response(status)
+        self.send_header('Content-Type', CONTENT_TYPES['.json'])
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+def make_server(data_dir, host='127.0.0.1', port=8765, cache_bytes=CACHE_MB << 20, verbose=False):
+    handler = type('Handler', (QueryHandler,), {'service': QueryService(data_dir, cache_bytes)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.verbose = verbose
+    return server
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve queries over an extractor output directory")
+    parser.add_argument('data_dir', nargs='?', default=os.path.join('web_app', 'public', 'data'),
+                        help="extractor output directory (the one holding index.json)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--cache-mb', type=float, default=CACHE_MB, help="result cache size in MB")
+    parser.add_argument('--verbose', action='store_true', help="log every request")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(os.path.join(args.data_dir, INDEX_FILE)):
+        print(f"No {INDEX_FILE} in {args.data_dir}")
+        return 1
+    server = make_server(args.data_dir, args.host, args.port, int(args.cache_mb * (1 << 20)), args.verbose)
+    print(f"🔎 Serving {os.path.abspath(args.data_dir)} on http://{args.host}:{args.port} "
+          f"({args.cache_mb:g} MB result cache)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopped")
+    finally:
+        server.server_close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""
+Team setup fingerprints
+A setup is where a whole side stood at fixed offsets after freeze end (SETUP_OFFSETS): the multiset of
+zones of its players at each offset (dead players count as "Dead"). Each setup is reduced to a 53-bit
+integer hash of the sorted zone labels, so identical setups across any number of demos are grouped by
+adding counts per fingerprint (see aggregates.py) instead of comparing rounds pairwise. Labels rather
+than zone codes are hashed, so fingerprints stay comparable when zones are added to the map config.
+"""
+
+import hashlib
+import polars as pl
+from transitions import coordinate_columns, TICKRATE
+
+SETUP_OFFSETS = [10, 20, 30]    # seconds after freeze end
+DEAD = 'Dead'
+
+# Fingerprints fit in a JavaScript number (2^53)
+FINGERPRINT_BITS = 53
+
+def setup_fingerprint(zones, offsets=SETUP_OFFSETS):
+    """Hash of a setup: per offset, the zones of the side's players (order does not matter)"""
+    key = ';'.join(f"{offset}:{'|'.join(sorted(offset_zones))}" for offset, offset_zones in zip(offsets, zones))
+    digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') & ((1 << FINGERPRINT_BITS) - 1)
+
+def build_setups(player_ticks, round_info, buy_types, zone_map, offsets=SETUP_OFFSETS, tickrate=TICKRATE):
+    """
+    Setup of every side in every round
+    player_ticks: alive ticks with a '_side' column; round_info: (round_num, freeze_end, winner) with the
+    winner as 'ct' / 't' (null when unknown); buy_types: (round_num, name, buy_type) per player-round.
+    Offsets are turned into ticks with the demo's tickrate, so setups of 64 and 128 tick demos are taken at
+    the same moments. A player counts as dead at an offset without an alive tick in the second before it.
+    Positions are looked up at exact ticks rather than sampled like journeys, so lean extraction
+    (which only drops dead and out-of-round rows) gives the same setups.
+    Returns (round_num, side, fingerprint, zones, buy_type, won) rows; zones holds the sorted zones per offset
+    and buy_type is the one most of the side had.
+    """
+    x_col, y_col, _ = coordinate_columns(player_ticks.columns)
+    roster = player_ticks.lazy().select('round_num', 'name', pl.col('_side').alias('side')).unique()
+    targets = (
+        roster.join(round_info.lazy().select('round_num', 'freeze_end').drop_nulls(), on='round_num')
+        .join(pl.LazyFrame({'offset': offsets}), how='cross')
+        .with_columns(target_tick=(pl.col('freeze_end') + pl.col('offset') * tickrate).cast(pl.Int64))
+        .sort('target_tick')
+        .collect()
+    )
+    positions = targets.join_asof(
+        player_ticks.select('round_num', 'name', pl.col('tick').cast(pl.Int64), x_col, y_col).sort('tick'),
+        left_on='target_tick', right_on='tick', by=['round_num', 'name'], strategy='backward', tolerance=tickrate,
+        check_sortedness=False  # both sides are sorted by tick above
+    )
+    x, y = positions[x_col].fill_null(0).to_numpy(), positions[y_col].fill_null(0).to_numpy()
+    labels = pl.Series(zone_map.codes(x, y)).replace_strict(
+        list(range(len(zone_map.labels))), zone_map.labels, return_dtype=pl.String
+    )
+    positions = positions.with_columns(
+        zone=pl.when(pl.col('tick').is_null()).then(pl.lit(DEAD)).otherwise(labels)
+    )
+
+    team_buy_types = (
+        roster.join(buy_types.lazy().select('round_num', pl.col('name').cast(player_ticks.schema['name']), 'buy_type'),
+                    on=['round_num', 'name'])
+        .group_by('round_num', 'side', 'buy_type')
+        .len()
+        # Most of the side; a tie goes to the buy type first in alphabetical order
+        .sort('len', 'buy_type', descending=[True, False])
+        .group_by('round_num', 'side', maintain_order=True)
+        .agg(pl.col('buy_type').first())
+    )
+    setups = (
+        positions.lazy()
+        .group_by('round_num', 'side', 'offset')
+        .agg(pl.col('zone').sort())
+        .group_by('round_num', 'side')
+        .agg(zones=pl.col('zone').sort_by('offset'))
+        .join(team_buy_types, on=['round_num', 'side'], how='left')
+        .join(round_info.lazy().select('round_num', 'winner'), on='round_num', how='left')
+        .with_columns(won=pl.when(pl.col('winner').is_not_null()).then(pl.col('winner') == pl.col('side')))
+        .drop('winner')
+        .sort('round_num', 'side')
+        .collect()
+    )
+    return setups.with_columns(fingerprint=pl.Series(
+        [setup_fingerprint(zones, offsets) for zones in setups['zones'].to_list()], dtype=pl.Int64
+    )).select('round_num', 'side', 'fingerprint', 'zones', 'buy_type', 'won')
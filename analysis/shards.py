@@ -0,0 +1,134 @@
+"""
+Sharded output writer
+Instead of one monolithic data.json the extractor writes, under the output directory:
+    index.json                      - every extracted demo with its manifest path
+    <demo_id>/manifest.json         - metadata, aggregate stats, utility summary and a per-round index
+    <demo_id>/rounds/<round>.json   - the players of one round (one entry per player and site, with its side)
+                                      and their rotations between sites
+Files are compact JSON written with a streaming encoder, so pages only download what they render.
+With binary journeys the points of a round go to rounds/<round>.journeys.bin instead (see journey_binary.py).
+"""
+
+import os
+import re
+import json
+from collections import Counter
+from journey_binary import AreaDictionary, encode_round
+
+INDEX_FILE = 'index.json'
+MANIFEST_FILE = 'manifest.json'
+
+_ENCODER = json.JSONEncoder(separators=(',', ':'))
+
+def write_json(obj, path):
+    """
+    Stream compact JSON to disk chunk by chunk instead of building the whole string in memory
+    The file is written next to its destination and renamed into place, so readers never see half of it
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f'{path}.tmp-{os.getpid()}'
+    with open(tmp_path, 'w') as f:
+        for chunk in _ENCODER.iterencode(obj):
+            f.write(chunk)
+    os.replace(tmp_path, path)
+
+def demo_id_for(demo_path, root=None):
+    """
+    URL-safe id of a demo, derived from its path relative to root without the extension
+    (just its file name without a root), so demos with the same file name in different folders stay apart
+    """
+    relative = os.path.relpath(demo_path, root) if root is not None else os.path.basename(demo_path)
+    stem = os.path.splitext(relative)[0]
+    return re.sub(r'[^A-Za-z0-9_.-]+', '-', stem)
+
+class ShardWriter:
+    """Writes one demo's round shards as they are produced, then its manifest"""
+
+    def __init__(self, output_dir, demo_id, binary_journeys=False):
+        self.output_dir = output_dir
+        self.demo_id = demo_id
+        self.demo_dir = os.path.join(output_dir, demo_id)
+        self.binary_journeys = binary_journeys
+        self.journey_areas = AreaDictionary()
+        self.rounds_index = []
+        self.utility = {}
+        self.utility_by_side = {}
+
+    def write_round(self, round_data):
+        """Write one round shard and record it in the manifest's round index"""
+        shard = f"rounds/{round_data['round_num']}.json"
+        players = round_data['players']
+        if self.binary_journeys:
+            journeys = f"rounds/{round_data['round_num']}.journeys.bin"
+            os.makedirs(os.path.join(self.demo_dir, 'rounds'), exist_ok=True)
+            journeys_path = os.path.join(self.demo_dir, journeys)
+            with open(f'{journeys_path}.tmp-{os.getpid()}', 'wb') as f:
+                f.write(encode_round(players, self.journey_areas))
+            os.replace(f'{journeys_path}.tmp-{os.getpid()}', journeys_path)
+            round_data = dict(round_data, journeys=journeys, players=[
+                {key: value for key, value in player.items() if key != 'journey'} for player in players
+            ])
+        write_json(round_data, os.path.join(self.demo_dir, shard))
+
+        self.rounds_index.append({
+            'round_num': round_data['round_num'],
+            'player_count': len(players),
+            'buy_types': sorted({player['buy_type'] for player in players}),
+            'sites': sorted({player['site'] for player in players}),
+            'sides': sorted({player['side'] for player in players}),
+            'shard': shard
+        })
+        for player in players:
+            for throw in player['utility_throws']:
+                by_site = self.utility_by_side.setdefault(player['side'], {}).setdefault(player['site'], {})
+                for utility in (self.utility, by_site):
+                    by_type = utility.setdefault(throw['area'], {})
+                    by_type[throw['type']] = by_type.get(throw['type'], 0) + 1
+
+    def finish(self, metadata, aggregate):
+        """
+        Write the manifest and return the demo's index entry
+        The index itself is updated by the caller (one process) so parallel workers never race on it
+        """
+        manifest = {
+            'demo_id': self.demo_id,
+            'metadata': metadata,
+            'rounds': sorted(self.rounds_index, key=lambda r: r['round_num']),
+            'aggregate': aggregate,
+            'utility': self.utility,
+            'utility_by_side': self.utility_by_side,
+            'journey_format': 'binary' if self.binary_journeys else 'json'
+        }
+        if self.binary_journeys:
+            manifest['journey_areas'] = self.journey_areas.areas
+        write_json(manifest, os.path.join(self.demo_dir, MANIFEST_FILE))
+        return {
+            'demo_id': self.demo_id,
+            'demo_file': metadata['demo_file'],
+            'map': metadata['map'],
+            'total_rounds': metadata['total_rounds'],
+            'manifest': f'{self.demo_id}/{MANIFEST_FILE}'
+        }
+
+def update_index(output_dir, entries):
+    """Add or replace demo entries in index.json; two new entries with the same demo id are an error"""
+    new_ids = [entry['demo_id'] for entry in entries]
+    duplicates = sorted(demo_id for demo_id, count in Counter(new_ids).items() if count > 1)
+    if duplicates:
+        raise ValueError(f"Duplicate demo ids in index update: {duplicates}")
+    index_path = os.path.join(output_dir, INDEX_FILE)
+    index = {'demos': []}
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            index = json.load(f)
+    replaced = set(new_ids)
+    index['demos'] = [d for d in index['demos'] if d['demo_id'] not in replaced] + list(entries)
+    index['demos'].sort(key=lambda d: d['demo_id'])
+    write_json(index, index_path)
+
+def write_sharded_output(output_data, output_dir, demo_id, binary_journeys=False):
+    """Write a full extraction result as a manifest plus per-round shards; returns the index entry"""
+    writer = ShardWriter(output_dir, demo_id, binary_journeys)
+    for round_data in output_data['rounds']:
+        writer.write_round(round_data)
+    return writer.finish(output_data['metadata'], output_data['aggregate'])
@@ -0,0 +1,256 @@
+"""
+Synthetic demo generator
+Builds seeded, realistic-looking awpy tables (ticks, rounds, buys, grenades) for de_dust2 at a
+configurable scale, so the pipeline can be benchmarked and exercised without a private .dem file.
+Positions follow spawn -> site routes with noise (spawn and A/Mid destinations are approximate);
+the economy, buys and deaths are simulated per team and round.
+"""
+
+import numpy as np
+import polars as pl
+from zones import load_zone_map
+
+ROUNDS_PER_HALF = 12
+OVERTIME_HALF = 3
+
+FREEZE_TIME = 15.0      # seconds
+ROUND_RESTART = 7.0     # seconds between round end and the next round start
+RUN_SPEED = 215.0       # units per second, a loaded-out player running
+
+# Approximate dust2 spawn points and destinations; B uses the configured site bounds
+SPAWNS = {'ct': (250.0, 2150.0), 't': (-350.0, -800.0)}
+DESTINATION_WEIGHTS = {'ct': {'B': 0.45, 'A': 0.4, 'Mid': 0.15}, 't': {'B': 0.4, 'A': 0.4, 'Mid': 0.2}}
+DESTINATIONS = {'A': (1200.0, 2500.0), 'Mid': (-400.0, 1000.0)}
+
+LOADOUTS = {
+    'ct': {'pistol': ['usp_silencer', 'hkp2000'], 'eco': ['usp_silencer', 'p250'], 'light_buy': ['mp9', 'ump45', 'famas'],
+           'full_buy': ['m4a1_silencer', 'm4a1', 'awp']},
+    't': {'pistol': ['glock'], 'eco': ['glock', 'p250', 'tec9'], 'light_buy': ['mac10', 'galilar', 'ump45'],
+          'full_buy': ['ak47', 'ak47', 'awp']},
+}
+GRENADE_TYPES = ['Smoke Grenade', 'Flashbang', 'HE Grenade', 'Molotov', 'Incendiary Grenade']
+GRENADE_ITEMS = {'Smoke Grenade': 'smokegrenade', 'Flashbang': 'flashbang', 'HE Grenade': 'hegrenade',
+                 'Molotov': 'molotov', 'Incendiary Grenade': 'incgrenade'}
+
+class SyntheticDemo:
+    """Stands in for a parsed awpy Demo: .ticks, .rounds, .buys, .grenades and .header"""
+
+    def __init__(self, ticks, rounds, buys, grenades, header):
+        self.ticks = ticks
+        self.rounds = rounds
+        self.buys = buys
+        self.grenades = grenades
+        self.header = header
+
+def round_sides(total_rounds):
+    """Side of team 0 in every round: MR12 halves, then MR3 overtime halves"""
+    sides = []
+    for round_num in range(1, total_rounds + 1):
+        if round_num <= 2 * ROUNDS_PER_HALF:
+            half = (round_num - 1) // ROUNDS_PER_HALF
+        else:
+            half = (round_num - 2 * ROUNDS_PER_HALF - 1) // OVERTIME_HALF + 1
+        sides.append('ct' if half % 2 == 0 else 't')
+    return sides
+
+def _buy(rng, money, is_pistol_round):
+    """Pick a buy type for one player and return (buy_type, cost)"""
+    if is_pistol_round:
+        return 'pistol', min(money, int(rng.choice([0, 200, 300, 650])))
+    if money >= 4500:
+        return 'full_buy', int(rng.integers(3700, min(money, 6000) + 1))
+    if money >= 2500:
+        return 'light_buy', int(rng.integers(1800, money + 1))
+    return 'eco', min(money, int(rng.choice([0, 0, 200, 500])))
+
+def _concat(parts, dtype):
+    return np.concatenate(parts).astype(dtype) if parts else np.zeros(0, dtype=dtype)
+
+def _is_ct(sides, teams, round_nums, players):
+    """Whether each (round, player) pair was on CT"""
+    team0_ct = np.array([side == 'ct' for side in sides])
+    return team0_ct[round_nums - 1] == (teams[players] == 0)
+
+def generate_demo(rounds=24, players=10, tickrate=64, overtime=0, seed=0):
+    """
+    Generate a synthetic demo
+    rounds: regulation rounds played (MR12, so at most 24); overtime: extra overtime periods of 6 rounds
+    """
+    rng = np.random.default_rng(seed)
+    zones = load_zone_map('de_dust2')
+    b_site = zones.site_bounds('B')
+    destinations = dict(DESTINATIONS, B=((b_site['min_x'] + b_site['max_x']) / 2, (b_site['min_y'] + b_site['max_y']) / 2))
+
+    total_rounds = rounds + 2 * OVERTIME_HALF * overtime
+    per_team = players // 2
+    names = [f'team{team}_player{i}' for team in (0, 1) for i in range(per_team + (players % 2 if team else 0))]
+    teams = np.array([0] * per_team + [1] * (players - per_team))
+    steamids = 76561198000000000 + np.arange(players, dtype=np.int64)
+    money = np.full(players, 800)
+    loss_streak = np.zeros(2, dtype=int)
+
+    tick_columns = {key: [] for key in ['tick', 'round_num', 'player', 'X', 'Y', 'Z', 'health', 'armor_value',
+                                        'has_helmet', 'balance', 'weapon', 'is_ct', 'pitch', 'yaw']}
+    weapon_names = []
+    round_rows, buy_rows, grenade_columns = [], [], {key: [] for key in ['entity_id', 'round_num', 'tick', 'player',
+                                                                           'grenade_type', 'X', 'Y', 'Z']}
+    entity_id = 1000
+    start = 64
+    sides = round_sides(total_rounds)
+
+    for round_num, team0_side in enumerate(sides, start=1):
+        side = np.where(teams == 0, team0_side, 'ct' if team0_side == 't' else 't')
+        is_pistol_round = round_num in (1, ROUNDS_PER_HALF + 1)
+        if round_num > 2 * ROUNDS_PER_HALF and (round_num - 2 * ROUNDS_PER_HALF - 1) % OVERTIME_HALF == 0:
+            money[:] = 10000
+        elif is_pistol_round:
+            money[:] = 800
+
+        freeze_end = start + int(FREEZE_TIME * tickrate)
+        end = freeze_end + int(rng.uniform(30, 115) * tickrate)
+        n = end - start
+        ticks = np.arange(start, end, dtype=np.int64)
+        elapsed = np.clip(ticks - freeze_end, 0, None) / tickrate
+
+        # Economy and buys during freeze time
+        weapons = []
+        armor = np.zeros(players, dtype=int)
+        helmet = np.zeros(players, dtype=bool)
+        for p in range(players):
+            buy_type, cost = _buy(rng, int(money[p]), is_pistol_round)
+            money[p] -= cost
+            weapon = str(rng.choice(LOADOUTS[side[p]][buy_type]))
+            weapons.append(weapon)
+            bought = [] if buy_type in ('pistol', 'eco') and cost < 500 else [weapon]
+            if buy_type in ('full_buy', 'light_buy') or cost >= 650:
+                armor[p], helmet[p] = 100, buy_type == 'full_buy'
+                bought.append('vesthelm' if helmet[p] else 'vest')
+            for grenade in rng.choice(GRENADE_TYPES, size=int(rng.integers(0, 4)) if buy_type != 'eco' else 0):
+                bought.append(GRENADE_ITEMS[grenade])
+            for item in bought:
+                buy_rows.append({'tick': int(rng.integers(start, freeze_end)), 'round_num': round_num,
+                                 'steamid': int(steamids[p]), 'player_name': names[p], 'side': side[p], 'weapon': item})
+
+        # Movement: run from spawn towards a destination, then hold around it, with a random walk on top
+        positions = np.empty((players, n, 3))
+        for p in range(players):
+            spawn = np.array(SPAWNS[side[p]]) + rng.normal(0, 80, 2)
+            weights = DESTINATION_WEIGHTS[side[p]]
+            target = np.array(destinations[rng.choice(list(weights), p=list(weights.values()))]) + rng.normal(0, 250, 2)
+            distance = max(np.linalg.norm(target - spawn), 1.0)
+            progress = np.clip(elapsed * RUN_SPEED / distance, 0, 1)[:, None]
+            walk = np.cumsum(rng.normal(0, 1.5 * 64 / tickrate, (n, 2)), axis=0)
+            positions[p, :, :2] = spawn + progress * (target - spawn) + walk
+            positions[p, :, 2] = rng.normal(100, 20) + np.cumsum(rng.normal(0, 0.2, n))
+
+        # Damage and deaths
+        health = np.full((players, n), 100)
+        for p in range(players):
+            if rng.random() < 0.6:
+                hit = int(rng.integers(freeze_end - start, n))
+                health[p, hit:] = int(rng.integers(1, 100))
+                if rng.random() < 0.8:
+                    health[p, min(n - 1, hit + int(rng.integers(0, 5 * tickrate))):] = 0
+
+        # Occasional all-zero positions, as seen in real parses
+        positions[rng.random((players, n)) < 0.002] = 0
+
+        # Grenade trajectories thrown from the player's position
+        for p in range(players):
+            alive_until = int(np.argmax(health[p] == 0)) if (health[p] == 0).any() else n
+            first = freeze_end - start + 2 * tickrate
+            if alive_until - tickrate <= first:
+                continue
+            for _ in range(min(int(rng.poisson(1.2)), 4)):
+                thrown = int(rng.integers(first, alive_until - tickrate))
+                origin = positions[p, thrown]
+                angle = rng.uniform(0, 2 * np.pi)
+                reach = rng.uniform(300, 1200)
+                flight = int(rng.uniform(1.0, 2.5) * tickrate)
+                t = np.linspace(0, 1, flight)
+                grenade_columns['entity_id'].append(np.full(flight, entity_id))
+                grenade_columns['round_num'].append(np.full(flight, round_num))
+                grenade_columns['tick'].append(start + thrown + np.arange(flight))
+                grenade_columns['player'].append(np.full(flight, p))
+                grenade_columns['grenade_type'].append(np.full(flight, rng.choice(GRENADE_TYPES)))
+                grenade_columns['X'].append(origin[0] + np.cos(angle) * reach * t)
+                grenade_columns['Y'].append(origin[1] + np.sin(angle) * reach * t)
+                grenade_columns['Z'].append(origin[2] + 4 * 150 * t * (1 - t))
+                entity_id += 1
+
+        # awpy orders ticks by tick, then player
+        tick_columns['tick'].append(np.repeat(ticks, players))
+        tick_columns['round_num'].append(np.full(n * players, round_num))
+        tick_columns['player'].append(np.tile(np.arange(players), n))
+        for axis, column in enumerate(['X', 'Y', 'Z']):
+            tick_columns[column].append(positions[:, :, axis].T.ravel())
+        tick_columns['health'].append(health.T.ravel())
+        tick_columns['armor_value'].append(np.where(health.T > 0, armor, 0).ravel())
+        tick_columns['has_helmet'].append(np.tile(helmet, n))
+        tick_columns['balance'].append(np.tile(money.copy(), n))
+        tick_columns['weapon'].append(np.tile(np.arange(players) + len(weapon_names), n))
+        tick_columns['is_ct'].append(np.tile(side == 'ct', n))
+        tick_columns['pitch'].append(rng.uniform(-10, 10, n * players))
+        tick_columns['yaw'].append(rng.uniform(-180, 180, n * players))
+        weapon_names.extend(weapons)
+
+        # Round result and economy for the next round
+        ct_team = 0 if team0_side == 'ct' else 1
+        winner_team = int(rng.random() < 0.5)
+        winner = 'ct' if winner_team == ct_team else 't'
+        loss_streak[winner_team] = 0
+        loss_streak[1 - winner_team] = min(loss_streak[1 - winner_team] + 1, 5)
+        money[teams == winner_team] += 3250
+        money[teams != winner_team] += 1400 + 500 * (loss_streak[1 - winner_team] - 1)
+        np.minimum(money, 16000, out=money)
+        round_rows.append({'round_num': round_num, 'start': start, 'freeze_end': freeze_end, 'end': end,
+                           'official_end': end + int(ROUND_RESTART * tickrate), 'winner': winner,
+                           'reason': str(rng.choice(['ct_killed', 't_killed', 'bomb_exploded', 'bomb_defused']))})
+        start = end + int(ROUND_RESTART * tickrate)
+
+    player = np.concatenate(tick_columns.pop('player'))
+    weapon = np.concatenate(tick_columns.pop('weapon'))
+    is_ct = np.concatenate(tick_columns.pop('is_ct'))
+    ticks_df = pl.DataFrame({
+        'tick': np.concatenate(tick_columns['tick']),
+        'round_num': np.concatenate(tick_columns['round_num']),
+        'name': np.array(names, dtype=object)[player],
+        'steamid': steamids[player],
+        'side': np.where(is_ct, 'ct', 't'),
+        'team_num': np.where(is_ct, 3, 2),
+        'X': np.concatenate(tick_columns['X']),
+        'Y': np.concatenate(tick_columns['Y']),
+        'Z': np.concatenate(tick_columns['Z']),
+        'health': np.concatenate(tick_columns['health']),
+        'armor_value': np.concatenate(tick_columns['armor_value']),
+        'has_helmet': np.concatenate(tick_columns['has_helmet']),
+        'balance': np.concatenate(tick_columns['balance']),
+        'active_weapon_name': np.array(weapon_names, dtype=object)[weapon],
+        'active_weapon': (weapon + 16777216).astype(str),
+        'pitch': np.concatenate(tick_columns['pitch']),
+        'yaw': np.concatenate(tick_columns['yaw']),
+    })
+
+    grenade_player = _concat(grenade_columns.pop('player'), np.int64)
+    grenade_rounds = _concat(grenade_columns['round_num'], np.int64)
+    grenade_is_ct = _is_ct(sides, teams, grenade_rounds, grenade_player)
+    grenades_df = pl.DataFrame({
+        'entity_id': _concat(grenade_columns['entity_id'], np.int64),
+        'round_num': grenade_rounds,
+        'tick': _concat(grenade_columns['tick'], np.int64),
+        'thrower_steamid': steamids[grenade_player],
+        'thrower_name': np.array(names, dtype=object)[grenade_player],
+        'thrower_side': np.where(grenade_is_ct, 'ct', 't'),
+        'grenade_type': _concat(grenade_columns['grenade_type'], object),
+        'X': _concat(grenade_columns['X'], np.float64),
+        'Y': _concat(grenade_columns['Y'], np.float64),
+        'Z': _concat(grenade_columns['Z'], np.float64),
+    })
+
+    return SyntheticDemo(
+        ticks=ticks_df,
+        rounds=pl.DataFrame(round_rows),
+        buys=pl.DataFrame(buy_rows),
+        grenades=grenades_df,
+        header={'map_name': 'de_dust2', 'tickrate': tickrate, 'synthetic': True, 'seed': seed},
+    )
@@ -0,0 +1,148 @@
+"""
+Trajectory similarity index
+Every (round, player, site) journey is resampled to TRAJECTORY_POINTS points spaced evenly along its
+path and flattened to a fixed-length vector [x0, y0, x1, y1, ...] in world units, which is stored in
+the fact table's 'trajectory' column (see facts.py). Journeys that took the same route through a site
+end up close together whatever their sampling, speed or duration.
+TrajectoryIndex loads the vectors of a whole corpus once and answers top-k nearest-trajectory queries
+with a brute-force NumPy batch search: squared norms are precomputed, so a query is one matrix-vector
+product plus a partial sort. Distances are the root mean square distance between corresponding points.
+
+Usage:
+    python analysis/trajectories.py web_app/public/data --demo g2-vs-spirit-m3-dust2 --round 7 --player s1mple
+    python analysis/trajectories.py web_app/public/data --demo g2-vs-spirit-m3-dust2 --round 7 --player s1mple \\
+        --site B --buy-type full_buy --same-player -k 20
+"""
+
+import sys
+import argparse
+import numpy as np
+import polars as pl
+
+TRAJECTORY_POINTS = 16
+
+TRAJECTORY_COLUMNS = ['map', 'event', 'demo_id', 'date', 'round_num', 'name', 'side', 'site', 'buy_type',
+                      'entry_point', 'primary_position']
+
+def trajectory_vector(journey, points=TRAJECTORY_POINTS):
+    """Journey points resampled evenly along the path, flattened to [x0, y0, x1, y1, ...] (None for no points)"""
+    if not journey:
+        return None
+    xy = np.array([(point['x'], point['y']) for point in journey], dtype=np.float64)
+    distance = np.concatenate([[0.0], np.cumsum(np.hypot(*np.diff(xy, axis=0).T))])
+    targets = np.linspace(0.0, distance[-1], points)
+    resampled = np.column_stack([np.interp(targets, distance, xy[:, 0]), np.interp(targets, distance, xy[:, 1])])
+    return resampled.astype(np.float32).ravel().tolist()
+
+class TrajectoryIndex:
+    """Trajectory vectors of a corpus with their fact columns, searchable by nearest trajectory"""
+
+    def __init__(self, rows, vectors):
+        self.rows = rows
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.sq_norms = np.einsum('ij,ij->i', self.vectors, self.vectors)
+        self.points = self.vectors.shape[1] // 2 if self.vectors.ndim == 2 else TRAJECTORY_POINTS
+
+    @classmethod
+    def load(cls, output_dir):
+        """Index of every trajectory in an output directory's fact tables"""
+        # facts.py imports this module for trajectory_vector
+        from facts import scan_facts
+
+        facts = (
+            scan_facts(output_dir)
+            .filter(pl.col('trajectory').is_not_null())
+            .select(TRAJECTORY_COLUMNS + ['trajectory'])
+            .collect()
+        )
+        vectors = facts['trajectory'].to_numpy() if len(facts) else np.empty((0, 2 * TRAJECTORY_POINTS))
+        return cls(facts.drop('trajectory'), vectors)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def find(self, demo_id, round_num, player, site=None):
+        """Row number of one journey; a player in several sites that round needs the site"""
+        match = (pl.col('demo_id') == demo_id) & (pl.col('round_num') == round_num) & (pl.col('name') == player)
+        if site is not None:
+            match &= pl.col('site') == site
+        found = self.rows.with_row_index('_row').filter(match)['_row'].to_list()
+        if not found:
+            raise KeyError(f"No trajectory for {player} in round {round_num} of {demo_id}" +
+                           (f" at {site}" if site else ""))
+        if len(found) > 1:
+            sites = self.rows[found, 'site'].to_list()
+            raise KeyError(f"{player} was in several sites in round {round_num} of {demo_id} ({sites}); pick a site")
+        return found[0]
+
+    def mask(self, **filters):
+        """Rows matching every filter (a column name mapped to a value or a list of values; None for any)"""
+        conditions = [pl.col(column).is_in([values] if isinstance(values, (str, int)) else list(values))
+                      for column, values in filters.items() if values is not None]
+        if not conditions:
+            return None
+        return self.rows.select(pl.all_horizontal(conditions)).to_series().to_numpy()
+
+    def nearest(self, vector, k=10, exclude=None, **filters):
+        """
+        The k trajectories closest to `vector` among the rows matching `filters` (see mask), nearest first,
+        as fact rows with a 'distance' (RMS distance between corresponding points, world units)
+        exclude: row numbers left out (e.g. the query journey itself)
+        """
+        query = np.asarray(vector, dtype=np.float32)
+        # |v - q|^2 = |v|^2 - 2 v.q + |q|^2 with the |v|^2 precomputed
+        sq_distances = self.sq_norms - 2.0 * (self.vectors @ query) + float(query @ query)
+        mask = self.mask(**filters)
+        if exclude is not None:
+            mask = np.ones(len(self), dtype=bool) if mask is None else mask.copy()
+            mask[list(exclude)] = False
+        candidates = np.arange(len(self)) if mask is None else np.flatnonzero(mask)
+        if len(candidates) == 0 or k <= 0:
+            return []
+        candidate_distances = sq_distances[candidates]
+        if len(candidates) > k:
+            top = np.argpartition(candidate_distances, k - 1)[:k]
+        else:
+            top = np.arange(len(candidates))
+        top = top[np.argsort(candidate_distances[top], kind='stable')]
+        distances = np.sqrt(np.maximum(candidate_distances[top], 0.0).astype(np.float64) / self.points)
+        rows = self.rows[candidates[top].tolist()].with_columns(distance=pl.Series(distances.round(1)))
+        return rows.to_dicts()
+
+    def similar(self, demo_id, round_num, player, site=None, k=10, **filters):
+        """
+        Journeys most like one player's journey in one round (which is left out), within the same site
+        filters narrow the candidates further, e.g. buy_type='full_buy' or name='s1mple'
+        """
+        row = self.find(demo_id, round_num, player, site)
+        filters['site'] = self.rows[row, 'site']
+        return self.nearest(self.vectors[row], k, exclude=[row], **filters)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find the rounds where players took a path most like a given one")
+    parser.add_argument('output_dir', help="extractor output directory (the one holding facts/)")
+    parser.add_argument('--demo', required=True, help="demo id of the reference journey")
+    parser.add_argument('--round', type=int, required=True, help="round of the reference journey")
+    parser.add_argument('--player', required=True, help="player of the reference journey")
+    parser.add_argument('--site', help="site of the reference journey, when the player was in several")
+    parser.add_argument('-k', type=int, default=10, help="number of journeys to return")
+    parser.add_argument('--buy-type', nargs='+', choices=['pistol', 'eco', 'light_buy', 'full_buy'])
+    parser.add_argument('--same-player', action='store_true', help="only journeys of the same player")
+    args = parser.parse_args(argv)
+
+    index = TrajectoryIndex.load(args.output_dir)
+    try:
+        matches = index.similar(args.demo, args.round, args.player, args.site, args.k, buy_type=args.buy_type,
+                                name=args.player if args.same_player else None)
+    except KeyError as e:
+        print(e.args[0])
+        return 1
+    print(f"{len(matches)} journeys like {args.player}'s in round {args.round} of {args.demo} "
+          f"(out of {len(index)} trajectories):")
+    with pl.Config(tbl_rows=args.k, tbl_cols=-1):
+        print(pl.DataFrame(matches).select('distance', 'demo_id', 'round_num', 'name', 'buy_type', 'entry_point',
+                                           'primary_position') if matches else "none")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
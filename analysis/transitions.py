@@ -0,0 +1,153 @@
+"""
+Zone transition table
+Every alive tick of every player is classified against the map's zones and run-length encoded into
+one row per stay in a zone: (round_num, name, side, site, zone, enter_tick, exit_tick, ticks).
+Rows scale with zone changes rather than ticks, and per-site stats (primary position, time in site,
+entry point) and rotations between sites are cheap aggregations over the table.
+"""
+
+import polars as pl
+
+TICKRATE = 64
+
+TRANSITION_KEYS = ['round_num', 'name']
+
+def coordinate_columns(columns):
+    """Resolve the X/Y/Z column names once (awpy uses X, Y, Z)"""
+    return tuple(axis if axis in columns else axis.lower() for axis in ('X', 'Y', 'Z'))
+
+def build_zone_transitions(ticks_df, zone_map):
+    """
+    Run-length encode every player's zone and site, tick by tick, into a transition table
+    site is the site whose bounds contain the player (null between sites); side is read from a
+    '_side' column when the ticks have one. Rows are ordered by round, player and enter_tick.
+    """
+    x_col, y_col, z_col = coordinate_columns(ticks_df.columns)
+    side = pl.col('_side') if '_side' in ticks_df.columns else pl.lit(None, dtype=pl.String)
+    ticks = (
+        ticks_df.lazy()
+        .filter(pl.col('health') > 0)
+        # Same coordinate validation as the journeys (not 0,0,0)
+        .filter(~((pl.col(x_col) == 0) & (pl.col(y_col) == 0) & (pl.col(z_col) == 0)))
+        .select(TRANSITION_KEYS + [side.alias('side'), 'tick', x_col, y_col])
+        .sort(TRANSITION_KEYS + ['tick'])
+        .collect()
+    )
+    x, y = ticks[x_col].to_numpy(), ticks[y_col].to_numpy()
+    site_names = list(zone_map.sites)
+    ticks = ticks.select(TRANSITION_KEYS + ['side', 'tick']).with_columns(
+        site=pl.Series(zone_map.site_codes(x, y)).replace_strict(
+            list(range(len(site_names) + 1)), [None] + site_names, return_dtype=pl.String
+        ),
+        zone=pl.Series(zone_map.codes(x, y))
+    )
+    return (
+        ticks.lazy()
+        # A new run starts whenever the player, their site or their zone changes
+        .with_columns(_run=pl.struct(TRANSITION_KEYS + ['site', 'zone']).rle_id())
+        .group_by('_run', maintain_order=True)
+        .agg(
+            pl.col('round_num', 'name', 'side', 'site', 'zone').first(),
+            enter_tick=pl.col('tick').first(),
+            exit_tick=pl.col('tick').last(),
+            ticks=pl.len()
+        )
+        .drop('_run')
+        .with_columns(
+            pl.col('zone').cast(pl.UInt32).replace_strict(
+                list(range(len(zone_map.labels))), zone_map.labels, return_dtype=pl.String
+            )
+        )
+        .collect()
+    )
+
+def site_visits(transitions, zone_map, sites=None, tickrate=TICKRATE):
+    """
+    Per-site stats of every player-round from the transition table
+    Returns {(round_num, name, side, site): {'primary_position', 'time_in_site', 'entry_point', 'ticks'}}:
+    the zone with the most ticks in the site, the seconds spent in the site (summed over every stay),
+    the entry zone the player came in through ("unknown" when they did not pass one of the site's entries)
+    and the number of ticks in the site
+    """
+    entries = pl.DataFrame(
+        {
+            'site': [zone_map.zone_sites[zone_map.labels.index(zone)] for zone in sorted(zone_map.entry_zones)],
+            '_entry': sorted(zone_map.entry_zones)
+        },
+        schema={'site': pl.String, '_entry': pl.String}
+    )
+    runs = transitions.lazy().with_columns(
+        # Entry zones may reach outside their site's bounds (e.g. Tunnel Exit), so the zone just
+        # before stepping into the site counts as well
+        _previous=pl.col('zone').shift(1).over(TRANSITION_KEYS)
+    ).filter(pl.col('site').is_not_null())
+    if sites is not None:
+        runs = runs.filter(pl.col('site').is_in(list(sites)))
+    keys = TRANSITION_KEYS + ['side', 'site']
+
+    primary = (
+        runs.group_by(keys + ['zone'])
+        .agg(pl.col('ticks').sum(), pl.col('enter_tick').min())
+        # Most ticks wins; on a tie the zone reached first
+        .sort('ticks', 'enter_tick', descending=[True, False])
+        .group_by(keys, maintain_order=True)
+        .agg(primary_position=pl.col('zone').first())
+    )
+    stats = (
+        runs.group_by(keys)
+        .agg(
+            ticks=pl.col('ticks').sum(),
+            _first_zone=pl.col('zone').sort_by('enter_tick').first(),
+            _previous=pl.col('_previous').sort_by('enter_tick').first()
+        )
+        .join(entries.lazy().rename({'_entry': '_first_zone'}).with_columns(_first_entry=True),
+              on=['site', '_first_zone'], how='left')
+        .join(entries.lazy().rename({'_entry': '_previous'}).with_columns(_previous_entry=True),
+              on=['site', '_previous'], how='left')
+        .with_columns(
+            time_in_site=(pl.col('ticks') / tickrate).round(2),
+            entry_point=pl.when(pl.col('_first_entry')).then(pl.col('_first_zone'))
+            .when(pl.col('_previous_entry')).then(pl.col('_previous'))
+            .otherwise(pl.lit('unknown'))
+        )
+        .join(primary, on=keys, how='left', nulls_equal=True)
+        .collect()
+    )
+    return {
+        (row['round_num'], row['name'], row['side'], row['site']): {
+            'primary_position': row['primary_position'],
+            'time_in_site': row['time_in_site'],
+            'entry_point': row['entry_point'],
+            'ticks': row['ticks']
+        }
+        for row in stats.iter_rows(named=True)
+    }
+
+def rotation_events(transitions, tickrate=TICKRATE):
+    """
+    Moves of a player from one site to another within a round, ignoring time spent between sites
+    Returns a table of (round_num, name, side, from_site, to_site, leave_tick, arrive_tick, leave_time, arrive_time)
+    """
+    return (
+        transitions.lazy()
+        .filter(pl.col('site').is_not_null())
+        # Consecutive runs in the same site (zone changes inside it) are one stay
+        .with_columns(_stay=pl.struct(TRANSITION_KEYS + ['site']).rle_id())
+        .group_by('_stay', maintain_order=True)
+        .agg(pl.col('round_num', 'name', 'side', 'site').first(),
+             pl.col('enter_tick').first(), pl.col('exit_tick').last())
+        .with_columns(
+            from_site=pl.col('site').shift(1).over(TRANSITION_KEYS),
+            leave_tick=pl.col('exit_tick').shift(1).over(TRANSITION_KEYS)
+        )
+        .filter(pl.col('from_site').is_not_null())
+        .select(
+            TRANSITION_KEYS + ['side', 'from_site', pl.col('site').alias('to_site'), 'leave_tick',
+                               pl.col('enter_tick').alias('arrive_tick')]
+        )
+        .with_columns(
+            leave_time=(pl.col('leave_tick') / tickrate).round(2),
+            arrive_time=(pl.col('arrive_tick') / tickrate).round(2)
+        )
+        .collect()
+    )
@@ -0,0 +1,190 @@
+"""
+Map zone engine
+Loads per-map callout zones (rectangles/polygons with priority) from analysis/maps/<map>.json
+and compiles them into a lookup grid so whole coordinate columns are classified in one call.
+Every zone belongs to a site (e.g. A, B, Mid), so one lookup also tells which site a point is in;
+zones marked "entry" are the ways into their site. Entries marked "approximate" have not been
+calibrated against demo data yet.
+"""
+
+import os
+import json
+import numpy as np
+import polars as pl
+
+MAPS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'maps')
+
+# Grid step (world units) used to rasterize polygon zones; rectangles are always exact
+POLYGON_RESOLUTION = 8.0
+
+# Label of points outside every site and zone
+OUTSIDE = 'Outside Zones'
+
+def _rect_bounds(rect):
+    """Config rects are [min_x, min_y, max_x, max_y]"""
+    min_x, min_y, max_x, max_y = rect
+    return {'min_x': min_x, 'max_x': max_x, 'min_y': min_y, 'max_y': max_y}
+
+def _points_in_polygon(px, py, polygon):
+    """Vectorized even-odd ray casting test of points against one polygon"""
+    inside = np.zeros(px.shape, dtype=bool)
+    vx, vy = polygon[:, 0], polygon[:, 1]
+    for i in range(len(polygon)):
+        x1, y1 = vx[i - 1], vy[i - 1]
+        x2, y2 = vx[i], vy[i]
+        crosses = (y1 > py) != (y2 > py)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x_at_y = x1 + (py - y1) * (x2 - x1) / (y2 - y1)
+        inside ^= crosses & (px < x_at_y)
+    return inside
+
+class ZoneMap:
+    """
+    Compiled zone lookup for one map
+    Every rectangle/polygon edge splits the plane into elementary cells; each cell stores the code
+    of the highest priority zone covering it, so classifying a point is two binary searches on
+    short edge arrays plus one table lookup, independent of how many zones are configured
+    """
+
+    def __init__(self, map_name, zones, sites=None, outside=OUTSIDE, resolution=POLYGON_RESOLUTION, radar=None):
+        self.map_name = map_name
+        self.outside = outside
+        self.resolution = resolution
+        # Config kept to build single-site maps (see site_map)
+        self.zone_specs = zones
+        self.site_specs = sites or {}
+        self._site_maps = {}
+        # Radar image transform (pos_x/pos_y of the top-left corner, world units per pixel, image size)
+        self.radar = radar
+        self.sites = {site: _rect_bounds(spec['rect']) for site, spec in (sites or {}).items()}
+
+        # Sites act as the broadest, lowest priority zones (e.g. "B-Site Area")
+        shapes = [
+            {'name': spec['label'], 'site': site, 'priority': float('-inf'), 'rect': spec['rect']}
+            for site, spec in (sites or {}).items()
+        ]
+        shapes += zones
+
+        self.labels = [outside]
+        self.zone_sites = [None]
+        for shape in shapes:
+            if shape['name'] not in self.labels:
+                self.labels.append(shape['name'])
+                self.zone_sites.append(shape.get('site'))
+        self.entry_zones = {shape['name'] for shape in shapes if shape.get('entry')}
+
+        self._compile(shapes, resolution)
+
+    def _compile(self, shapes, resolution):
+        """Build the edge arrays and the cell -> zone code table"""
+        x_edges, y_edges = [], []
+        for shape in shapes:
+            if 'rect' in shape:
+                min_x, min_y, max_x, max_y = shape['rect']
+                # Bounds are inclusive: x <= max_x is the same test as x < nextafter(max_x)
+                x_edges += [min_x, np.nextafter(max_x, np.inf)]
+                y_edges += [min_y, np.nextafter(max_y, np.inf)]
+            else:
+                polygon = np.asarray(shape['polygon'], dtype=np.float64)
+                lo, hi = polygon.min(axis=0), polygon.max(axis=0)
+                x_edges += list(np.arange(lo[0], hi[0] + resolution, resolution))
+                y_edges += list(np.arange(lo[1], hi[1] + resolution, resolution))
+
+        self.x_edges = np.unique(np.asarray(x_edges, dtype=np.float64))
+        self.y_edges = np.unique(np.asarray(y_edges, dtype=np.float64))
+
+        # Cell i covers [edges[i-1], edges[i]); cells 0 and len(edges) lie outside every shape
+        x_lo = np.concatenate(([-np.inf], self.x_edges))
+        y_lo = np.concatenate(([-np.inf], self.y_edges))
+        x_mid = (x_lo + np.concatenate((self.x_edges, [np.inf]))) / 2
+        y_mid = (y_lo + np.concatenate((self.y_edges, [np.inf]))) / 2
+
+        self.table = np.zeros((len(x_lo), len(y_lo)), dtype=np.int16)
+
+        # Paint from lowest to highest priority so the most specific zone wins;
+        # on equal priority the zone listed first in the config wins
+        order = sorted(range(len(shapes)), key=lambda i: (shapes[i]['priority'], -i))
+        for i in order:
+            shape = shapes[i]
+            code = self.labels.index(shape['name'])
+            if 'rect' in shape:
+                min_x, min_y, max_x, max_y = shape['rect']
+                # Every point of a cell gives the same answer as its lower corner
+                cols = (x_lo >= min_x) & (x_lo <= max_x)
+                rows = (y_lo >= min_y) & (y_lo <= max_y)
+                self.table[np.ix_(cols, rows)] = code
+            else:
+                polygon = np.asarray(shape['polygon'], dtype=np.float64)
+                gx, gy = np.meshgrid(x_mid, y_mid, indexing='ij')
+                self.table[_points_in_polygon(gx, gy, polygon)] = code
+
+    def codes(self, x, y):
+        """Classify coordinate arrays, returning int16 zone codes (0 = outside)"""
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        col = np.searchsorted(self.x_edges, x, side='right')
+        row = np.searchsorted(self.y_edges, y, side='right')
+        return self.table[col, row]
+
+    def classify(self, x, y):
+        """Classify coordinate arrays, returning an array of zone labels"""
+        return np.asarray(self.labels, dtype=object)[self.codes(x, y)]
+
+    def site_codes(self, x, y):
+        """Site of each point as int8 codes into [None] + site names (0 = outside every site)"""
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        result = np.zeros(x.shape, dtype=np.int8)
+        # Painted in reverse so the site listed first wins where bounds overlap
+        for code, bounds in reversed(list(enumerate(self.sites.values(), start=1))):
+            inside = ((x >= bounds['min_x']) & (x <= bounds['max_x']) &
+                      (y >= bounds['min_y']) & (y <= bounds['max_y']))
+            result[inside] = code
+        return result
+
+    def site_of(self, x, y):
+        """Site whose broad bounds contain each point, as an object array (None outside every site)"""
+        return np.asarray([None] + list(self.sites), dtype=object)[self.site_codes(x, y)]
+
+    def classify_point(self, x, y):
+        """Zone label of a single point"""
+        return self.labels[int(self.codes([x], [y])[0])]
+
+    def classify_series(self, x, y, name='area'):
+        """Classify Polars coordinate columns into an Enum series of zone labels"""
+        codes = pl.Series(name, self.codes(x.to_numpy(), y.to_numpy()), dtype=pl.UInt32)
+        return codes.replace_strict(
+            list(range(len(self.labels))), self.labels, return_dtype=pl.Enum(self.labels)
+        )
+
+    def site_bounds(self, site):
+        """Broad {min_x, max_x, min_y, max_y} bounds of a site"""
+        return self.sites[site]
+
+    def site_map(self, site):
+        """
+        Zone map of one site on its own (built once): points in other sites' zones are outside, so a
+        single-site classifier gives the same answers however many sites the map config has
+        """
+        if site not in self._site_maps:
+            self._site_maps[site] = ZoneMap(
+                self.map_name,
+                [zone for zone in self.zone_specs if zone.get('site') == site],
+                sites={site: self.site_specs[site]},
+                outside=self.outside,
+                resolution=self.resolution,
+                radar=self.radar
+            )
+        return self._site_maps[site]
+
+def load_zone_map(map_name, maps_dir=MAPS_DIR):
+    """Load and compile the zone config of a map (e.g. 'de_dust2')"""
+    with open(os.path.join(maps_dir, f'{map_name}.json')) as f:
+        config = json.load(f)
+    return ZoneMap(
+        config.get('map', map_name),
+        config['zones'],
+        sites=config.get('sites'),
+        outside=config.get('outside', OUTSIDE),
+        radar=config.get('radar')
+    )
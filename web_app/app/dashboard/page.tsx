@@ -1,4 +1,4 @@
-import fs from 'fs'
+import fs from 'fs/promises'
 import path from 'path'
 import { MapVisualizer } from '@/components/MapVisualizer'
 import { StatsPanel } from '@/components/StatsPanel'
@@ -7,12 +7,25 @@ import Link from 'next/link'
 import { ArrowLeft } from 'lucide-react'
 
 async function getData() {
-    const filePath = path.join(process.cwd(), 'public', 'data.json')
+    // Only the small per-demo manifest is read (asynchronously); round shards are never touched here
+    const dataDir = path.join(process.cwd(), 'public', 'data')
     try {
-        const fileContents = fs.readFileSync(filePath, 'utf8')
-        return JSON.parse(fileContents)
+        const index = JSON.parse(await fs.readFile(path.join(dataDir, 'index.json'), 'utf8'))
+        const entry = index.demos.find((d: any) => d.map === 'de_dust2')
+        const manifest = JSON.parse(await fs.readFile(path.join(dataDir, entry.manifest), 'utf8'))
+        return {
+            // Older manifests only hold CT B-Site stats and have no side/site fields
+            positions: manifest.aggregate.position_stats
+                .filter((stat: any) => (stat.side ?? 'ct') === 'ct' && (stat.site ?? 'B') === 'B')
+                .map((stat: any) => ({
+                    area: stat.area,
+                    count: stat.total_occurrences,
+                    percentage: Math.round(stat.overall_frequency * 1000) / 10
+                })),
+            utility: manifest.utility_by_side?.ct?.B ?? manifest.utility
+        }
     } catch (e) {
-        console.error("Error reading data.json", e)
+        console.error("Error reading data manifest", e)
         return { positions: [], utility: {} }
     }
 }
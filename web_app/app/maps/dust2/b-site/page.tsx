@@ -7,39 +7,37 @@ import { RoundSelector, type BuyType } from '@/components/RoundSelector'
 import { EquipmentPanel } from '@/components/EquipmentPanel'
 import { MapVisualizerV2 } from '@/components/MapVisualizerV2'
 import { AggregateStats } from '@/components/AggregateStats'
+import { PositionHeatmap } from '@/components/PositionHeatmap'
+import { SetupStats } from '@/components/SetupStats'
+import { loadIndex, loadManifest, loadRound, roundHas, positionStatsFromCube, type DemoManifest } from '@/lib/demoData'
 
-interface DemoData {
-    metadata: {
-        demo_file: string
-        total_rounds: number
-        map: string
-    }
-    rounds: Array<{
-        round_num: number
-        ct_players: any[]
-    }>
-    aggregate: {
-        total_rounds: number
-        position_stats: any[]
-    }
-}
+const SITE = 'B'
+const SIDE = 'ct'
 
 export default function Dust2BSitePage() {
-    const [data, setData] = useState<DemoData | null>(null)
+    const [data, setData] = useState<DemoManifest | null>(null)
     const [currentRound, setCurrentRound] = useState(1)
+    const [currentRoundPlayers, setCurrentRoundPlayers] = useState<any[]>([])
     const [buyTypeFilter, setBuyTypeFilter] = useState<BuyType>('all')
     const [viewMode, setViewMode] = useState<'individual' | 'aggregate'>('individual')
+    const [playerFilter, setPlayerFilter] = useState('all')
     const [loading, setLoading] = useState(true)
 
     useEffect(() => {
-        // Load data from JSON
-        fetch('/data.json')
-            .then(res => res.json())
-            .then(data => {
-                setData(data)
+        // Load the small manifest first; round data is fetched per round below
+        loadIndex()
+            .then(demos => {
+                const demo = demos.find(d => d.map === 'de_dust2')
+                if (!demo) {
+                    throw new Error('No de_dust2 demo in index.json')
+                }
+                return loadManifest(demo)
+            })
+            .then(manifest => {
+                setData(manifest)
                 setLoading(false)
                 // Set to first round with data
-                const firstRoundWithData = data.rounds.find((r: any) => r.ct_players.length > 0)
+                const firstRoundWithData = manifest.rounds.find(r => roundHas(r, SITE, SIDE))
                 if (firstRoundWithData) {
                     setCurrentRound(firstRoundWithData.round_num)
                 }
@@ -50,6 +48,23 @@ export default function Dust2BSitePage() {
             })
     }, [])
 
+    useEffect(() => {
+        if (!data) return
+        // Only fetch the round currently selected in the RoundSelector
+        let cancelled = false
+        loadRound(data, currentRound)
+            .then(round => {
+                if (!cancelled) setCurrentRoundPlayers(round.players.filter(p => p.site === SITE && p.side === SIDE))
+            })
+            .catch(err => {
+                console.error(`Error loading round ${currentRound}:`, err)
+                if (!cancelled) setCurrentRoundPlayers([])
+            })
+        return () => {
+            cancelled = true
+        }
+    }, [data, currentRound])
+
     if (loading) {
         return (
             <main className="min-h-screen bg-black text-zinc-100 p-4 md:p-8 font-sans">
@@ -64,28 +79,28 @@ export default function Dust2BSitePage() {
         return (
             <main className="min-h-screen bg-black text-zinc-100 p-4 md:p-8 font-sans">
                 <div className="max-w-7xl mx-auto flex items-center justify-center min-h-screen">
-                    <div className="text-red-400">Error loading data. Please check data.json file.</div>
+                    <div className="text-red-400">Error loading data. Please check public/data/index.json.</div>
                 </div>
             </main>
         )
     }
 
-    // Filter rounds by buy type
-    const filteredRounds = data.rounds.filter(round => {
-        if (buyTypeFilter === 'all') return true
-
-        // Check if any CT player matches the buy type filter
-        return round.ct_players.some(player => player.buy_type === buyTypeFilter)
-    })
-
     // Get rounds that have data
     const roundsWithData = data.rounds
-        .filter(r => r.ct_players.length > 0)
+        .filter(r => roundHas(r, SITE, SIDE))
         .map(r => r.round_num)
 
-    // Get current round data
-    const currentRoundData = data.rounds.find(r => r.round_num === currentRound)
-    const currentRoundPlayers = currentRoundData?.ct_players || []
+    // Aggregate stats for the current filters: a lookup in the precomputed cube (older manifests only have
+    // the unfiltered position_stats)
+    const cube = data.aggregate.cube
+    const positionStats = cube
+        ? positionStatsFromCube(
+            cube,
+            { side: SIDE, site: SITE, buy_type: buyTypeFilter, player: playerFilter },
+            data.aggregate.total_rounds
+        )
+        : data.aggregate.position_stats
+    const cubePlayers = cube?.values.player ?? []
 
     // Apply buy type filter to current round's players
     const filteredPlayers = buyTypeFilter === 'all'
@@ -181,12 +196,55 @@ export default function Dust2BSitePage() {
                 {/* Aggregate View */}
                 {viewMode === 'aggregate' && (
                     <div className="grid grid-cols-1 lg:grid-cols-2 gap-6">
+                        {cube && (
+                            <div className="lg:col-span-2 flex flex-wrap items-center gap-3 p-4 bg-zinc-900/40 rounded-lg border border-zinc-800">
+                                <span className="text-sm text-zinc-400">Buy type:</span>
+                                {(['all', 'pistol', 'eco', 'light_buy', 'full_buy'] as BuyType[]).map(type => (
+                                    <button
+                                        key={type}
+                                        onClick={() => setBuyTypeFilter(type)}
+                                        className={`px-3 py-1 rounded-md text-xs font-medium transition-all ${buyTypeFilter === type
+                                                ? 'bg-blue-600 text-white'
+                                                : 'bg-zinc-800 text-zinc-400 hover:bg-zinc-700'
+                                            }`}
+                                    >
+                                        {type === 'all' ? 'All' : type.replace('_', ' ')}
+                                    </button>
+                                ))}
+                                <span className="text-sm text-zinc-400 ml-4">Player:</span>
+                                <select
+                                    value={playerFilter}
+                                    onChange={e => setPlayerFilter(e.target.value)}
+                                    className="px-3 py-1 rounded-md text-xs bg-zinc-800 text-zinc-300 border border-zinc-700"
+                                >
+                                    <option value="all">All players</option>
+                                    {cubePlayers.map(player => (
+                                        <option key={player} value={player}>{player}</option>
+                                    ))}
+                                </select>
+                            </div>
+                        )}
+                        {data.aggregate.heatmaps && (
+                            <div className="lg:col-span-2">
+                                <PositionHeatmap
+                                    heatmaps={data.aggregate.heatmaps}
+                                    side={SIDE}
+                                    site={SITE}
+                                    buyType={buyTypeFilter}
+                                />
+                            </div>
+                        )}
                         <div className="lg:col-span-2">
                             <AggregateStats
-                                positionStats={data.aggregate.position_stats}
+                                positionStats={positionStats}
                                 totalRounds={data.aggregate.total_rounds}
                             />
                         </div>
+                        {data.aggregate.setups?.[SIDE] && (
+                            <div className="lg:col-span-2">
+                                <SetupStats setups={data.aggregate.setups[SIDE]} />
+                            </div>
+                        )}
                     </div>
                 )}
             </div>
@@ -1,27 +1,23 @@
 "use client"
 
 import React from 'react'
-
-interface JourneyPoint {
-    tick: number
-    time: number
-    x: number
-    y: number
-    area: string
-    is_entry: boolean
-}
+import type { Journey, JourneyPoint } from '@/lib/demoData'
 
 interface UtilityThrow {
-    tick: number
+    tick: number          // throw tick
     time: number
     type: string
+    land_tick?: number    // landing/detonation tick; x/y/area are the landing position
+    land_time?: number
     x: number
     y: number
+    z?: number
     area: string
+    path?: [number, number][]  // downsampled flight path when exported (GRENADE_PATH_POINTS)
 }
 
 interface JourneyPathProps {
-    journey: JourneyPoint[]
+    journey: Journey
     utilityThrows: UtilityThrow[]
     playerName: string
     color: string
@@ -55,22 +51,26 @@ export function JourneyPath({
     color,
     mapBounds
 }: JourneyPathProps) {
-    if (!journey || journey.length === 0) {
+    // Journeys come either as JSON points or as typed-array columns from a binary journeys file
+    const columns = journey && !Array.isArray(journey) ? journey : null
+    const pointCount = columns ? columns.x.length : (journey as JourneyPoint[] | undefined)?.length ?? 0
+    if (pointCount === 0) {
         return null
     }
 
     // Convert coordinates to percentages
     // For Dust 2, X needs to be inverted because B-site (negative X, west) should appear on the left side of map
     // Y needs to be inverted because in CS2 Y increases northward, but SVG/CSS Y=0 is at top
-    const points = journey.map((point) => {
+    const points = Array.from({ length: pointCount }, (_, i) => {
+        const point = columns
+            ? { x: columns.x[i], y: columns.y[i], time: columns.tick[i] / columns.tickRate }
+            : (journey as JourneyPoint[])[i]
         const xPercent = coordinateToPercent(point.x, mapBounds.minX, mapBounds.maxX, true) // Invert X: west (negative) -> left
         const yPercent = coordinateToPercent(point.y, mapBounds.minY, mapBounds.maxY, true) // Invert Y: north (positive) -> top
         return {
             x: xPercent,
             y: yPercent,
-            time: point.time,
-            area: point.area,
-            is_entry: point.is_entry
+            time: point.time
         }
     })
 
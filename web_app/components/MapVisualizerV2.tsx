@@ -3,30 +3,26 @@
 import { useState, useEffect } from 'react'
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card'
 import { JourneyPath, UtilityMarkers } from '@/components/JourneyPath'
-
-interface JourneyPoint {
-    tick: number
-    time: number
-    x: number
-    y: number
-    area: string
-    is_entry: boolean
-}
+import type { Journey } from '@/lib/demoData'
 
 interface UtilityThrow {
-    tick: number
+    tick: number          // throw tick
     time: number
     type: string
+    land_tick?: number    // landing/detonation tick; x/y/area are the landing position
+    land_time?: number
     x: number
     y: number
+    z?: number
     area: string
+    path?: [number, number][]  // downsampled flight path when exported (GRENADE_PATH_POINTS)
 }
 
 interface PlayerData {
     name: string
     buy_type: string
     equipment: any
-    journey: JourneyPoint[]
+    journey: Journey
     utility_throws: UtilityThrow[]
     entry_point: string
     primary_position: string
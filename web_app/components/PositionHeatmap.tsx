@@ -0,0 +1,72 @@
+"use client"
+
+import { useEffect, useMemo, useRef } from 'react'
+import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card'
+import { Flame } from 'lucide-react'
+import { sumHeatmap, type Heatmaps } from '@/lib/demoData'
+
+interface PositionHeatmapProps {
+    heatmaps: Heatmaps
+    side: string
+    site: string
+    buyType: string
+}
+
+// Transparent -> amber -> red as the share of the busiest cell grows
+function heatColor(value: number): [number, number, number, number] {
+    const r = 255
+    const g = Math.round(200 * (1 - value))
+    const b = Math.round(40 * (1 - value))
+    return [r, g, b, Math.round(60 + 195 * value)]
+}
+
+export function PositionHeatmap({ heatmaps, side, site, buyType }: PositionHeatmapProps) {
+    const canvasRef = useRef<HTMLCanvasElement>(null)
+    const { cells, radar, tickrate } = heatmaps.grid
+    const grid = useMemo(() => sumHeatmap(heatmaps, side, site, buyType), [heatmaps, side, site, buyType])
+    const totalSeconds = useMemo(() => grid.reduce((sum, ticks) => sum + ticks, 0) / tickrate, [grid, tickrate])
+
+    useEffect(() => {
+        const canvas = canvasRef.current
+        const context = canvas?.getContext('2d')
+        if (!canvas || !context) return
+
+        // One canvas pixel per grid cell, whatever the number of rounds behind the counts
+        const image = context.createImageData(cells, cells)
+        const max = grid.reduce((a, b) => Math.max(a, b), 0)
+        grid.forEach((ticks, cell) => {
+            if (ticks === 0 || max === 0) return
+            // Square root keeps short visits visible next to long holds
+            const [r, g, b, a] = heatColor(Math.sqrt(ticks / max))
+            image.data.set([r, g, b, a], cell * 4)
+        })
+        context.putImageData(image, 0, 0)
+    }, [grid, cells])
+
+    return (
+        <Card className="bg-zinc-900 border-zinc-800 text-zinc-100">
+            <CardHeader>
+                <CardTitle className="flex items-center gap-2">
+                    <Flame className="w-5 h-5 text-orange-500" />
+                    Position Heatmap
+                </CardTitle>
+                <p className="text-sm text-zinc-500">{totalSeconds.toFixed(0)}s of player time, every tick counted</p>
+            </CardHeader>
+            <CardContent>
+                <div className="relative w-full max-w-[600px] aspect-square mx-auto rounded-md overflow-hidden border border-zinc-800">
+                    <img
+                        src={`/maps/${radar.image}`}
+                        alt={`${heatmaps.grid.map} radar`}
+                        className="absolute inset-0 w-full h-full opacity-60"
+                    />
+                    <canvas
+                        ref={canvasRef}
+                        width={cells}
+                        height={cells}
+                        className="absolute inset-0 w-full h-full"
+                    />
+                </div>
+            </CardContent>
+        </Card>
+    )
+}
@@ -0,0 +1,88 @@
+"use client"
+
+import { Card, CardContent, CardHeader, CardTitle } from './ui/card'
+import { Users } from 'lucide-react'
+import type { TeamSetup } from '@/lib/demoData'
+
+interface SetupStatsProps {
+    setups: TeamSetup[]
+}
+
+const buyTypeLabels: Record<string, string> = {
+    pistol: 'Pistol',
+    eco: 'Eco',
+    light_buy: 'Light',
+    full_buy: 'Full Buy'
+}
+
+function formatWinRate(winRate: number | null) {
+    return winRate === null ? '–' : `${(winRate * 100).toFixed(0)}%`
+}
+
+// Zones of one offset as "2× B Site, Tunnels"
+function formatZones(zones: string[]) {
+    const counts = new Map<string, number>()
+    zones.forEach(zone => counts.set(zone, (counts.get(zone) ?? 0) + 1))
+    return Array.from(counts.entries())
+        .map(([zone, count]) => (count > 1 ? `${count}× ${zone}` : zone))
+        .join(', ')
+}
+
+export function SetupStats({ setups }: SetupStatsProps) {
+    if (!setups || setups.length === 0) return null
+
+    return (
+        <Card className="bg-zinc-900 border-zinc-800 text-zinc-100">
+            <CardHeader>
+                <CardTitle className="flex items-center gap-2">
+                    <Users className="w-5 h-5 text-blue-500" />
+                    Team Setups
+                </CardTitle>
+                <p className="text-sm text-zinc-500">Where the whole side stood after freeze time ends</p>
+            </CardHeader>
+            <CardContent className="space-y-4">
+                {setups.slice(0, 5).map(setup => (
+                    <div
+                        key={setup.fingerprint}
+                        className="p-4 bg-zinc-950/50 rounded-lg border border-zinc-800/50 space-y-3"
+                    >
+                        <div className="flex items-center justify-between">
+                            <div className="text-sm text-zinc-500">
+                                {setup.rounds} rounds ({(setup.frequency * 100).toFixed(0)}%)
+                            </div>
+                            <div className="text-right">
+                                <div className="text-2xl font-bold text-blue-400">
+                                    {formatWinRate(setup.win_rate)}
+                                </div>
+                                <div className="text-xs text-zinc-500">win rate</div>
+                            </div>
+                        </div>
+
+                        <div className="space-y-1 text-sm">
+                            {setup.offsets.map((offset, i) => (
+                                <div key={offset} className="flex gap-3">
+                                    <span className="text-zinc-500 w-10 shrink-0">+{offset}s</span>
+                                    <span className="text-zinc-300">{formatZones(setup.zones[i])}</span>
+                                </div>
+                            ))}
+                        </div>
+
+                        <div className="pt-2 border-t border-zinc-800 grid grid-cols-2 gap-2 text-sm">
+                            {Object.entries(setup.by_buy_type).map(([buyType, stats]) => (
+                                <div key={buyType} className="flex justify-between items-center">
+                                    <span className="text-zinc-400 font-medium">
+                                        {buyTypeLabels[buyType] || buyType}:
+                                    </span>
+                                    <span className="text-zinc-300">
+                                        {formatWinRate(stats.win_rate)}
+                                        <span className="text-zinc-600 ml-1">({stats.rounds})</span>
+                                    </span>
+                                </div>
+                            ))}
+                        </div>
+                    </div>
+                ))}
+            </CardContent>
+        </Card>
+    )
+}
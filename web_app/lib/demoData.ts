@@ -0,0 +1,288 @@
+// Loaders for the sharded extractor output in /public/data (see analysis/shards.py)
+
+// Static files under public/data by default; set NEXT_PUBLIC_DATA_ROOT to serve them through analysis/query_server.py
+// (e.g. http://127.0.0.1:8765/data) for gzip, ETags and a shared result cache
+export const DATA_ROOT = process.env.NEXT_PUBLIC_DATA_ROOT ?? '/data'
+
+export interface DemoIndexEntry {
+    demo_id: string
+    demo_file: string
+    map: string
+    total_rounds: number
+    manifest: string
+}
+
+export interface RoundIndexEntry {
+    round_num: number
+    player_count: number
+    buy_types: string[]
+    sites?: string[]
+    sides?: string[]
+    shard: string
+}
+
+export interface DemoManifest {
+    demo_id: string
+    metadata: {
+        demo_file: string
+        total_rounds: number
+        map: string
+    }
+    rounds: RoundIndexEntry[]
+    aggregate: {
+        total_rounds: number
+        position_stats: any[]
+        heatmaps?: Heatmaps
+        cube?: AggregateCube
+        // side -> most common setups first
+        setups?: Record<string, TeamSetup[]>
+    }
+    utility: Record<string, Record<string, number>>
+    // side -> site -> area -> grenade type -> count
+    utility_by_side?: Record<string, Record<string, Record<string, Record<string, number>>>>
+    journey_format?: 'json' | 'binary'
+    journey_areas?: string[]
+}
+
+export interface JourneyPoint {
+    tick: number
+    time: number
+    x: number
+    y: number
+    area: string
+    is_entry: boolean
+}
+
+// One player's journey as typed-array views into a binary journeys file
+// Point i is (tick[i], x[i], y[i], z[i], areas[area[i]]); point 0 is the entry point
+export interface JourneyColumns {
+    tick: Int32Array
+    x: Float32Array
+    y: Float32Array
+    z: Float32Array
+    area: Uint8Array
+    areas: string[]
+    tickRate: number
+}
+
+export type Journey = JourneyPoint[] | JourneyColumns
+
+// A player's move from one site to another within the round
+export interface Rotation {
+    name: string
+    side: string
+    from_site: string
+    to_site: string
+    leave_tick: number
+    arrive_tick: number
+    leave_time: number
+    arrive_time: number
+}
+
+// One entry per player and site they went through; older shards only had CT B-Site players (ct_players)
+export interface RoundShard {
+    round_num: number
+    players: any[]
+    rotations?: Rotation[]
+    journeys?: string
+}
+
+async function fetchJson<T>(url: string): Promise<T> {
+    const res = await fetch(url)
+    if (!res.ok) {
+        throw new Error(`Failed to load ${url}: ${res.status}`)
+    }
+    return res.json()
+}
+
+// Radar-aligned occupancy grids written by analysis/heatmaps.py: ticks per cell, cell = row * cells + col
+export interface HeatmapGrid {
+    map: string
+    cells: number
+    radar: { image: string; pos_x: number; pos_y: number; scale: number; size: number }
+    // Ticks per second of the demos behind the counts
+    tickrate: number
+}
+
+export interface SparseHeatmap {
+    cells: number[]
+    ticks: number[]
+}
+
+export interface Heatmaps {
+    grid: HeatmapGrid
+    // side -> site -> buy type -> sparse tick counts
+    maps: Record<string, Record<string, Record<string, SparseHeatmap>>>
+}
+
+// Dense ticks-per-cell grid of a side and site, summed over every buy type when buyType is 'all'
+export function sumHeatmap(heatmaps: Heatmaps, side: string, site: string, buyType: string): Float32Array {
+    const grid = new Float32Array(heatmaps.grid.cells * heatmaps.grid.cells)
+    const byBuyType = heatmaps.maps[side]?.[site] ?? {}
+    for (const [type, sparse] of Object.entries(byBuyType)) {
+        if (buyType !== 'all' && type !== buyType) continue
+        sparse.cells.forEach((cell, i) => {
+            grid[cell] += sparse.ticks[i]
+        })
+    }
+    return grid
+}
+
+// Player-site records counted per (side, site, area, buy_type, entry_point, player), see analysis/aggregates.py.
+// Every cell row holds one index into values[dimension] per dimension, then the count.
+export interface AggregateCube {
+    dimensions: string[]
+    values: Record<string, string[]>
+    cells: number[][]
+}
+
+export type CubeFilter = Partial<Record<string, string | string[]>>
+
+// Counts of the cells matching every filter (a value, or any of a list; 'all' and missing mean no filter),
+// summed per combination of the groupBy dimensions; keys are the group values joined with '|'
+export function cubeCounts(cube: AggregateCube, filter: CubeFilter, groupBy: string[]): Map<string, number> {
+    const allowed = cube.dimensions.map(dimension => {
+        const wanted = filter[dimension]
+        if (wanted === undefined || wanted === 'all') return null
+        const wantedValues = new Set(Array.isArray(wanted) ? wanted : [wanted])
+        return new Set(cube.values[dimension].flatMap((value, i) => (wantedValues.has(value) ? [i] : [])))
+    })
+    const groups = groupBy.map(dimension => cube.dimensions.indexOf(dimension))
+    const counts = new Map<string, number>()
+    for (const cell of cube.cells) {
+        if (!allowed.every((indices, d) => indices === null || indices.has(cell[d]))) continue
+        const key = groups.map(d => cube.values[cube.dimensions[d]][cell[d]]).join('|')
+        counts.set(key, (counts.get(key) ?? 0) + cell[cube.dimensions.length])
+    }
+    return counts
+}
+
+// position_stats (as written by aggregates.finalize) for any filter combination, from the cube
+export function positionStatsFromCube(cube: AggregateCube, filter: CubeFilter, totalRounds: number): any[] {
+    const byArea = cubeCounts(cube, filter, ['area'])
+    const byBuyType = cubeCounts(cube, filter, ['area', 'buy_type'])
+    const byEntry = cubeCounts(cube, filter, ['area', 'entry_point'])
+    const byPlayer = cubeCounts(cube, filter, ['area', 'player'])
+    return Array.from(byArea, ([area, total]) => {
+        const breakdown = (counts: Map<string, number>) =>
+            Array.from(counts).filter(([key]) => key.startsWith(`${area}|`)).map(([key, count]) => [key.slice(area.length + 1), count] as const)
+        return {
+            area,
+            overall_frequency: totalRounds > 0 ? Math.round((total / totalRounds) * 1000) / 1000 : 0,
+            total_occurrences: total,
+            by_buy_type: Object.fromEntries(breakdown(byBuyType).map(([buyType, count]) => [
+                buyType, { count, percentage: Math.round((count / total) * 1000) / 1000 }
+            ])),
+            entry_points: Object.fromEntries(breakdown(byEntry)),
+            unique_players: breakdown(byPlayer).length
+        }
+    }).sort((a, b) => b.overall_frequency - a.overall_frequency)
+}
+
+// Where a whole side stood at fixed seconds after freeze end, grouped across rounds by fingerprint
+// (see analysis/setups.py); win rates are null when no round had a known winner
+export interface TeamSetup {
+    fingerprint: number
+    offsets: number[]
+    zones: string[][]
+    rounds: number
+    frequency: number
+    win_rate: number | null
+    by_buy_type: Record<string, { rounds: number, win_rate: number | null }>
+}
+
+async function fetchBuffer(url: string): Promise<ArrayBuffer> {
+    const res = await fetch(url)
+    if (!res.ok) {
+        throw new Error(`Failed to load ${url}: ${res.status}`)
+    }
+    return res.arrayBuffer()
+}
+
+const JOURNEY_MAGIC = 'CSJ1'
+
+// Reads the layout written by analysis/journey_binary.py without copying the columns.
+// Typed arrays use the platform byte order, which is little-endian on every browser target.
+// Journeys come back in the order of the round shard's players.
+export function decodeJourneys(buffer: ArrayBuffer, areas: string[]): JourneyColumns[] {
+    const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4))
+    if (magic !== JOURNEY_MAGIC) {
+        throw new Error('Not a journeys file')
+    }
+    const headerLength = new DataView(buffer).getUint32(4, true)
+    const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 8, headerLength)))
+    const base = 8 + headerLength
+    const count: number = header.count
+
+    const tick = new Int32Array(buffer, base + header.columns.tick, count)
+    const x = new Float32Array(buffer, base + header.columns.x, count)
+    const y = new Float32Array(buffer, base + header.columns.y, count)
+    const z = new Float32Array(buffer, base + header.columns.z, count)
+    const area = new Uint8Array(buffer, base + header.columns.area, count)
+
+    return (header.players as { name: string; start: number; count: number }[]).map(player => {
+        const end = player.start + player.count
+        return {
+            tick: tick.subarray(player.start, end),
+            x: x.subarray(player.start, end),
+            y: y.subarray(player.start, end),
+            z: z.subarray(player.start, end),
+            area: area.subarray(player.start, end),
+            areas,
+            tickRate: header.tick_rate
+        }
+    })
+}
+
+export async function loadIndex(): Promise<DemoIndexEntry[]> {
+    const index = await fetchJson<{ demos: DemoIndexEntry[] }>(`${DATA_ROOT}/index.json`)
+    return index.demos
+}
+
+export function loadManifest(entry: DemoIndexEntry): Promise<DemoManifest> {
+    return fetchJson<DemoManifest>(`${DATA_ROOT}/${entry.manifest}`)
+}
+
+// Shards never change once written, so each one is only fetched once per page load
+const roundCache = new Map<string, Promise<RoundShard>>()
+
+export function loadRound(manifest: DemoManifest, roundNum: number): Promise<RoundShard> {
+    const entry = manifest.rounds.find(r => r.round_num === roundNum)
+    if (!entry) {
+        return Promise.resolve({ round_num: roundNum, players: [] })
+    }
+    const url = `${DATA_ROOT}/${manifest.demo_id}/${entry.shard}`
+    let shard = roundCache.get(url)
+    if (!shard) {
+        shard = fetchJson<any>(url).then(round => attachJourneys(manifest, withPlayers(round)))
+        shard.catch(() => roundCache.delete(url))
+        roundCache.set(url, shard)
+    }
+    return shard
+}
+
+function withPlayers(round: any): RoundShard {
+    if (round.players) {
+        return round
+    }
+    const { ct_players, ...rest } = round
+    return { ...rest, players: (ct_players ?? []).map((p: any) => ({ side: 'ct', site: 'B', ...p })) }
+}
+
+// Whether a round has players of a site and side (older manifests do not record sites/sides)
+export function roundHas(entry: RoundIndexEntry, site: string, side: string): boolean {
+    return entry.player_count > 0 && (entry.sites?.includes(site) ?? true) && (entry.sides?.includes(side) ?? true)
+}
+
+// Binary shards keep journeys in a separate file; put each player's columns where the JSON journey would be
+async function attachJourneys(manifest: DemoManifest, round: RoundShard): Promise<RoundShard> {
+    if (!round.journeys) {
+        return round
+    }
+    const buffer = await fetchBuffer(`${DATA_ROOT}/${manifest.demo_id}/${round.journeys}`)
+    const journeys = decodeJourneys(buffer, manifest.journey_areas ?? [])
+    return {
+        ...round,
+        players: round.players.map((player, i) => ({ ...player, journey: journeys[i] ?? [] }))
+    }
+}